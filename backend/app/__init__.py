@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
@@ -12,11 +12,28 @@ def create_app():
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-this')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 86400
     
-    CORS(app, resources={r"/*": {"origins": "*"}})
+    CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Next-Cursor', 'X-Export-Id'])
     
     jwt = JWTManager(app)
     
-    from app.routes import auth, subjects, assignments, attendance, study, ai, dashboard, export
+    from app.models.database import db, create_storage
+    
+    db.configure(create_storage(os.getenv('DB_ENGINE', 'json'), os.getenv('DB_PATH')))
+    
+    from app.models.user_cache import user_cache
+    
+    # Resolved once per request by flask_jwt_extended and exposed as
+    # current_user, so routes don't look the user up again.
+    @jwt.user_lookup_loader
+    def load_user(jwt_header, jwt_data):
+        db.refresh()
+        return user_cache.get(jwt_data['sub'])
+    
+    @jwt.user_lookup_error_loader
+    def handle_missing_user(jwt_header, jwt_data):
+        return jsonify({'error': 'User not found'}), 404
+    
+    from app.routes import auth, subjects, assignments, attendance, study, ai, dashboard, export, metrics
     
     app.register_blueprint(auth.bp)
     app.register_blueprint(subjects.bp)
@@ -26,5 +43,19 @@ def create_app():
     app.register_blueprint(ai.bp)
     app.register_blueprint(dashboard.bp)
     app.register_blueprint(export.bp)
+    app.register_blueprint(metrics.bp)
+    
+    from app.utils.pagination import PaginationError
+    from app.utils.bulk import BulkError
+    
+    @app.errorhandler(PaginationError)
+    def handle_pagination_error(error):
+        return jsonify({'error': str(error)}), 400
+    
+    @app.errorhandler(BulkError)
+    def handle_bulk_error(error):
+        if error.rows:
+            return jsonify({'error': str(error), 'rows': error.rows}), 400
+        return jsonify({'error': str(error)}), 400
     
     return app
@@ -0,0 +1,358 @@
+import bisect
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from app.models.database import db
+
+TRACKED_COLLECTIONS = ('subjects', 'marks', 'attendance', 'study_sessions', 'assignments')
+
+def _bump(buckets: Dict, key, amount, count):
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = buckets[key] = [0, 0]
+    bucket[0] += amount
+    bucket[1] += count
+    if bucket[1] <= 0:
+        del buckets[key]
+
+def _bump_day(days: List[str], buckets: Dict, day: str, amount, count):
+    # Like _bump, but also keeps days, the sorted list of bucketed days, in step.
+    if day not in buckets:
+        bisect.insort(days, day)
+    _bump(buckets, day, amount, count)
+    if day not in buckets:
+        del days[bisect.bisect_left(days, day)]
+
+def _days_between(days: List[str], start: str, end: str) -> List[str]:
+    return days[bisect.bisect_left(days, start):bisect.bisect_left(days, end)]
+
+def _period_start(day: str, period: str) -> Optional[str]:
+    if period != 'week':
+        return day
+    try:
+        start = date.fromisoformat(day)
+    except ValueError:
+        return None
+    return (start - timedelta(days=start.weekday())).isoformat()
+
+class UserAggregates:
+    def __init__(self):
+        self.subjects = {}
+        self.marks_total = 0
+        self.marks_count = 0
+        self.marks_by_subject = {}
+        self.attendance_present = 0
+        self.attendance_total = 0
+        self.attendance_by_subject = {}
+        self.attendance_days = []
+        self.attendance_by_day = {}
+        self.study_total = 0
+        self.study_sessions = 0
+        self.study_days = []
+        self.study_by_day = {}
+        self.pending_assignments = 0
+        self.completed_assignments = 0
+        self.pending_deadlines = {}
+
+    def apply(self, collection: str, doc: Dict, sign: int):
+        if collection == 'subjects':
+            if sign > 0:
+                self.subjects[doc['_id']] = doc.get('name')
+            else:
+                self.subjects.pop(doc['_id'], None)
+        elif collection == 'marks':
+            percentage = doc['percentage']
+            self.marks_total += sign * percentage
+            self.marks_count += sign
+            _bump(self.marks_by_subject, doc.get('subject_id'), sign * percentage, sign)
+        elif collection == 'attendance':
+            present = sign if doc.get('status') == 'present' else 0
+            self.attendance_present += present
+            self.attendance_total += sign
+            _bump(self.attendance_by_subject, doc.get('subject_id'), present, sign)
+            _bump_day(self.attendance_days, self.attendance_by_day, (doc.get('date') or '')[:10], present, sign)
+        elif collection == 'study_sessions':
+            self._apply_study_session(doc, sign)
+        elif collection == 'assignments':
+            if doc.get('status') == 'completed':
+                self.completed_assignments += sign
+            else:
+                self.pending_assignments += sign
+                if doc.get('deadline'):
+                    if sign > 0:
+                        self.pending_deadlines[doc['_id']] = {
+                            'title': doc.get('title'),
+                            'subject_id': doc.get('subject_id'),
+                            'deadline': doc['deadline'],
+                            'priority': doc.get('priority', 'medium')
+                        }
+                    else:
+                        self.pending_deadlines.pop(doc['_id'], None)
+
+    def replace(self, collection: str, old: Dict, new: Dict):
+        if collection == 'subjects' and old['_id'] in self.subjects:
+            # Renames keep the subject's position so chart order is stable.
+            self.subjects[old['_id']] = new.get('name')
+            return
+        self.apply(collection, old, -1)
+        self.apply(collection, new, 1)
+
+    def _apply_study_session(self, doc: Dict, sign: int):
+        duration = doc.get('duration', 0) or 0
+        date = doc.get('date') or ''
+        day = date[:10]
+        self.study_total += sign * duration
+        self.study_sessions += sign
+        bucket = self.study_by_day.get(day)
+        if bucket is None:
+            bucket = self.study_by_day[day] = [0, []]
+            bisect.insort(self.study_days, day)
+        bucket[0] += sign * duration
+        if sign > 0:
+            bisect.insort(bucket[1], date)
+        else:
+            index = bisect.bisect_left(bucket[1], date)
+            if index < len(bucket[1]) and bucket[1][index] == date:
+                del bucket[1][index]
+        if not bucket[1]:
+            del self.study_by_day[day]
+            del self.study_days[bisect.bisect_left(self.study_days, day)]
+
+    def _study_since(self, since: str) -> int:
+        start = bisect.bisect_left(self.study_days, since[:10])
+        count = 0
+        for day in self.study_days[start:]:
+            dates = self.study_by_day[day][1]
+            if day == since[:10]:
+                count += len(dates) - bisect.bisect_left(dates, since)
+            else:
+                count += len(dates)
+        return count
+
+    def study_rollup(self, start: str, end: str, period: str) -> List[Dict]:
+        # Daily buckets for days in [start, end), summed per week when asked.
+        rollup = {}
+        for day in _days_between(self.study_days, start, end):
+            minutes, dates = self.study_by_day[day]
+            key = _period_start(day, period)
+            if key is None:
+                continue
+            bucket = rollup.setdefault(key, [0, 0])
+            bucket[0] += minutes
+            bucket[1] += len(dates)
+        return [{'date': day, 'minutes': minutes, 'sessions': sessions}
+                for day, (minutes, sessions) in rollup.items()]
+
+    def attendance_rollup(self, start: str, end: str, period: str) -> List[Dict]:
+        rollup = {}
+        for day in _days_between(self.attendance_days, start, end):
+            present, total = self.attendance_by_day[day]
+            key = _period_start(day, period)
+            if key is None:
+                continue
+            bucket = rollup.setdefault(key, [0, 0])
+            bucket[0] += present
+            bucket[1] += total
+        return [{'date': day, 'present': present, 'total': total,
+                 'percentage': round(present / total * 100, 2)}
+                for day, (present, total) in rollup.items()]
+
+    def dashboard_stats(self, user: Dict, now: datetime) -> Dict:
+        if self.marks_count:
+            average_percentage = self.marks_total / self.marks_count
+            gpa = (average_percentage / 100) * 10
+        else:
+            average_percentage = 0
+            gpa = 0
+
+        if self.attendance_total:
+            attendance_percentage = (self.attendance_present / self.attendance_total) * 100
+        else:
+            attendance_percentage = 0
+
+        upcoming_deadlines = []
+        for assignment in self.pending_deadlines.values():
+            deadline = datetime.fromisoformat(assignment['deadline'].replace('Z', '+00:00'))
+            if deadline > now:
+                upcoming_deadlines.append({
+                    'assignment': assignment['title'],
+                    'subject': self.subjects.get(assignment['subject_id'], 'Unknown'),
+                    'deadline': assignment['deadline'],
+                    'priority': assignment['priority']
+                })
+        upcoming_deadlines.sort(key=lambda x: x['deadline'])
+
+        today_bucket = self.study_by_day.get(now.date().isoformat())
+
+        return {
+            'total_subjects': len(self.subjects),
+            'average_percentage': round(average_percentage, 2),
+            'gpa': round(gpa, 2),
+            'cgpa': round(gpa, 2),
+            'pending_assignments': self.pending_assignments,
+            'completed_assignments': self.completed_assignments,
+            'attendance_percentage': round(attendance_percentage, 2),
+            'total_study_time': self.study_total,
+            'today_study_time': today_bucket[0] if today_bucket else 0,
+            'upcoming_deadlines': upcoming_deadlines[:5],
+            'xp': user.get('xp', 0),
+            'level': user.get('level', 1),
+            'streak': user.get('streak', 0)
+        }
+
+    def performance_chart(self):
+        chart_data = []
+        for subject_id, name in self.subjects.items():
+            bucket = self.marks_by_subject.get(subject_id)
+            if bucket:
+                chart_data.append({
+                    'subject': name,
+                    'average': round(bucket[0] / bucket[1], 2)
+                })
+        return chart_data
+
+    def attendance_chart(self):
+        chart_data = []
+        for subject_id, name in self.subjects.items():
+            bucket = self.attendance_by_subject.get(subject_id)
+            if bucket:
+                chart_data.append({
+                    'subject': name,
+                    'percentage': round((bucket[0] / bucket[1]) * 100, 2)
+                })
+        return chart_data
+
+    def attendance_stats(self, subject_id: str) -> Dict:
+        present, total = self.attendance_by_subject.get(subject_id, (0, 0))
+        percentage = (present / total * 100) if total > 0 else 0
+        return {
+            'total': total,
+            'present': present,
+            'absent': total - present,
+            'percentage': round(percentage, 2)
+        }
+
+    def study_stats(self, now: datetime) -> Dict:
+        today_bucket = self.study_by_day.get(now.date().isoformat())
+        week_ago = (now - timedelta(days=7)).isoformat()
+        return {
+            'total_time': self.study_total,
+            'total_sessions': self.study_sessions,
+            'today_time': today_bucket[0] if today_bucket else 0,
+            'today_sessions': len(today_bucket[1]) if today_bucket else 0,
+            'week_sessions': self._study_since(week_ago)
+        }
+
+class AggregateStore:
+    def __init__(self, database):
+        self.db = database
+        self._states: Dict[str, UserAggregates] = {}
+        self._versions: Dict[str, int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        database.subscribe(self.on_change)
+
+    def on_change(self, op, collection, old, new):
+        if op == 'reset':
+            with self._lock:
+                self._states.clear()
+                self._generation += 1
+            return
+        if collection not in TRACKED_COLLECTIONS:
+            return
+        with self._lock:
+            if op == 'update':
+                for old_doc, new_doc in zip(old, new):
+                    if old_doc.get('user_id') == new_doc.get('user_id'):
+                        self._apply(old_doc.get('user_id'), lambda state: state.replace(collection, old_doc, new_doc))
+                    else:
+                        self._apply(old_doc.get('user_id'), lambda state: state.apply(collection, old_doc, -1))
+                        self._apply(new_doc.get('user_id'), lambda state: state.apply(collection, new_doc, 1))
+                return
+            for doc in old:
+                self._apply(doc.get('user_id'), lambda state: state.apply(collection, doc, -1))
+            for doc in new:
+                self._apply(doc.get('user_id'), lambda state: state.apply(collection, doc, 1))
+
+    def _apply(self, user_id, change):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        state = self._states.get(user_id)
+        if state is None:
+            return
+        try:
+            change(state)
+        except (KeyError, TypeError, ValueError):
+            # Malformed row: forget the user and rebuild from raw data on the next read.
+            del self._states[user_id]
+
+    def _build(self, user_id) -> UserAggregates:
+        state = UserAggregates()
+        for collection in TRACKED_COLLECTIONS:
+            for doc in self.db.find(collection, {'user_id': user_id}):
+                state.apply(collection, doc, 1)
+        return state
+
+    def _state(self, user_id) -> UserAggregates:
+        self.db.refresh()
+        for _ in range(3):
+            with self._lock:
+                state = self._states.get(user_id)
+                if state is not None:
+                    return state
+                version = self._versions.get(user_id, 0)
+                generation = self._generation
+            state = self._build(user_id)
+            with self._lock:
+                # Only keep the build if no write for this user landed while
+                # it was reading; otherwise it may have seen half of it.
+                if self._versions.get(user_id, 0) == version and self._generation == generation:
+                    self._states[user_id] = state
+                    return state
+        return state
+
+    def rebuild(self, user_id: Optional[str] = None):
+        with self._lock:
+            if user_id is None:
+                self._states.clear()
+                self._generation += 1
+                return
+            self._states.pop(user_id, None)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self._state(user_id)
+
+    def dashboard_stats(self, user_id: str, user: Dict, now: Optional[datetime] = None) -> Dict:
+        state = self._state(user_id)
+        with self._lock:
+            return state.dashboard_stats(user, now or datetime.now())
+
+    def performance_chart(self, user_id: str):
+        state = self._state(user_id)
+        with self._lock:
+            return state.performance_chart()
+
+    def attendance_chart(self, user_id: str):
+        state = self._state(user_id)
+        with self._lock:
+            return state.attendance_chart()
+
+    def attendance_stats(self, user_id: str, subject_id: str) -> Dict:
+        state = self._state(user_id)
+        with self._lock:
+            return state.attendance_stats(subject_id)
+
+    def study_stats(self, user_id: str, now: Optional[datetime] = None) -> Dict:
+        state = self._state(user_id)
+        with self._lock:
+            return state.study_stats(now or datetime.now())
+
+    def study_rollup(self, user_id: str, start: str, end: str, period: str = 'day') -> List[Dict]:
+        state = self._state(user_id)
+        with self._lock:
+            return state.study_rollup(start, end, period)
+
+    def attendance_rollup(self, user_id: str, start: str, end: str, period: str = 'day') -> List[Dict]:
+        state = self._state(user_id)
+        with self._lock:
+            return state.attendance_rollup(start, end, period)
+
+aggregates = AggregateStore(db)
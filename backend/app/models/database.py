@@ -1,86 +1,118 @@
-import json
 import os
-from typing import Dict, List, Optional
-from datetime import datetime
-import uuid
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from app.models.storage import StorageBackend
+from app.models.json_storage import JSONStorage
+from app.models.sqlite_storage import SQLiteStorage
+
+ENGINES = {
+    'json': JSONStorage,
+    'sqlite': SQLiteStorage
+}
+
+DEFAULT_PATHS = {
+    'json': 'database.json',
+    'sqlite': 'database.sqlite3'
+}
+
+def create_storage(engine: str = 'json', path: Optional[str] = None) -> StorageBackend:
+    engine = engine.lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown database engine '{engine}'. Expected one of: {', '.join(ENGINES)}")
+    path = path or DEFAULT_PATHS[engine]
+    if engine == 'json':
+        return JSONStorage(path, journal=os.getenv('DB_JOURNAL', '1') != '0')
+    return SQLiteStorage(path, change_log=int(os.getenv('DB_CHANGE_LOG', 1000)))
 
 class Database:
-    def __init__(self, db_file='database.json'):
-        self.db_file = db_file
-        self.data = self._load_db()
-    
-    def _load_db(self) -> Dict:
-        if os.path.exists(self.db_file):
-            with open(self.db_file, 'r') as f:
-                return json.load(f)
-        return {
-            'users': [],
-            'subjects': [],
-            'marks': [],
-            'assignments': [],
-            'attendance': [],
-            'study_sessions': [],
-            'notifications': [],
-            'gamification': []
-        }
-    
-    def _save_db(self):
-        with open(self.db_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
-    
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self._backend = backend
+        self._listeners: List[Callable] = []
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> StorageBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    backend = create_storage(os.getenv('DB_ENGINE', 'json'), os.getenv('DB_PATH'))
+                    for callback in self._listeners:
+                        backend.add_listener(callback)
+                    self._backend = backend
+        return self._backend
+
+    def configure(self, backend: StorageBackend):
+        for callback in self._listeners:
+            backend.add_listener(callback)
+        with self._lock:
+            previous, self._backend = self._backend, backend
+        if previous is not None and previous is not backend:
+            previous.close()
+        backend._emit('reset', None, [], [])
+
+    def subscribe(self, callback: Callable):
+        with self._lock:
+            self._listeners.append(callback)
+            backend = self._backend
+        if backend is not None:
+            backend.add_listener(callback)
+
     def insert(self, collection: str, document: Dict) -> Dict:
-        if '_id' not in document:
-            document['_id'] = str(uuid.uuid4())
-        document['created_at'] = datetime.now().isoformat()
-        document['updated_at'] = datetime.now().isoformat()
-        self.data[collection].append(document)
-        self._save_db()
-        return document
-    
-    def find(self, collection: str, query: Dict) -> List[Dict]:
-        results = []
-        for doc in self.data[collection]:
-            match = True
-            for key, value in query.items():
-                if key not in doc or doc[key] != value:
-                    match = False
-                    break
-            if match:
-                results.append(doc)
-        return results
-    
+        return self.backend.insert(collection, document)
+
+    def insert_many(self, collection: str, documents: List[Dict]) -> List[Dict]:
+        return self.backend.insert_many(collection, documents)
+
+    def upsert_many(self, collection: str, documents: List[Dict],
+                    key: Tuple[str, ...]) -> Tuple[List[Dict], List[Dict]]:
+        return self.backend.upsert_many(collection, documents, key)
+
+    def find(self, collection: str, query: Dict, sort: Optional[str] = None, limit: Optional[int] = None,
+             after: Optional[Tuple[Any, str]] = None, projection: Optional[List[str]] = None) -> List[Dict]:
+        return self.backend.find(collection, query, sort=sort, limit=limit, after=after, projection=projection)
+
+    def iter_find(self, collection: str, query: Dict, sort: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[Tuple[Any, str]] = None, projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        return self.backend.iter_find(collection, query, sort=sort, limit=limit, after=after, projection=projection)
+
+    def find_range(self, collection: str, query: Dict, field: str, start: Any = None, end: Any = None,
+                   limit: Optional[int] = None, after: Optional[Tuple[Any, str]] = None,
+                   projection: Optional[List[str]] = None) -> List[Dict]:
+        return self.backend.find_range(collection, query, field, start=start, end=end, limit=limit,
+                                       after=after, projection=projection)
+
+    def iter_find_range(self, collection: str, query: Dict, field: str, start: Any = None, end: Any = None,
+                        limit: Optional[int] = None, after: Optional[Tuple[Any, str]] = None,
+                        projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        return self.backend.iter_find_range(collection, query, field, start=start, end=end, limit=limit,
+                                            after=after, projection=projection)
+
     def find_one(self, collection: str, query: Dict) -> Optional[Dict]:
-        results = self.find(collection, query)
-        return results[0] if results else None
-    
+        return self.backend.find_one(collection, query)
+
     def update(self, collection: str, query: Dict, update: Dict) -> int:
-        count = 0
-        for doc in self.data[collection]:
-            match = True
-            for key, value in query.items():
-                if key not in doc or doc[key] != value:
-                    match = False
-                    break
-            if match:
-                doc.update(update)
-                doc['updated_at'] = datetime.now().isoformat()
-                count += 1
-        if count > 0:
-            self._save_db()
-        return count
-    
+        return self.backend.update(collection, query, update)
+
+    def increment(self, collection: str, query: Dict, deltas: Dict[str, float],
+                  defaults: Optional[Dict] = None, derive: Optional[Callable[[Dict], Dict]] = None) -> Optional[Dict]:
+        return self.backend.increment(collection, query, deltas, defaults, derive)
+
     def delete(self, collection: str, query: Dict) -> int:
-        initial_len = len(self.data[collection])
-        self.data[collection] = [
-            doc for doc in self.data[collection]
-            if not all(doc.get(k) == v for k, v in query.items())
-        ]
-        count = initial_len - len(self.data[collection])
-        if count > 0:
-            self._save_db()
-        return count
-    
+        return self.backend.delete(collection, query)
+
+    def delete_cascade(self, collection: str, query: Dict) -> Dict[str, int]:
+        return self.backend.delete_cascade(collection, query)
+
     def get_all(self, collection: str) -> List[Dict]:
-        return self.data[collection]
+        return self.backend.get_all(collection)
+
+    def create_index(self, collection: str, fields: Tuple[str, ...]):
+        return self.backend.create_index(collection, fields)
+
+    def refresh(self):
+        self.backend.refresh()
+
+    def version(self) -> str:
+        return self.backend.version()
 
 db = Database()
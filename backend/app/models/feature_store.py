@@ -0,0 +1,305 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.models.database import db
+from app.models.locking import FileLock
+from app.utils.ai_helpers import FINAL_EXAM_FEATURES, final_exam_features
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_FEATURE_DIR = os.path.join(BACKEND_DIR, 'ml', 'features')
+
+COLUMNS = FINAL_EXAM_FEATURES + ('final_exam', 'marks_count', 'attendance_total')
+KEY_COLUMNS = ('user_id', 'subject_id')
+
+def _is_final(exam_type) -> bool:
+    return 'final' in (exam_type or '').lower()
+
+class SubjectState:
+    def __init__(self):
+        self.marks: Dict[str, Tuple[Optional[str], float]] = {}
+        self.attendance: Dict[str, bool] = {}
+
+    def row(self) -> List[float]:
+        # Features come from the marks before the final exam, and the final
+        # (if recorded) is the training label, so rows mean the same thing
+        # to the trainer and to the online predictor.
+        others = [{'exam_type': t, 'percentage': p} for t, p in self.marks.values() if not _is_final(t)]
+        finals = [p for t, p in self.marks.values() if _is_final(t)]
+        total = len(self.attendance)
+        attendance_pct = sum(self.attendance.values()) / total * 100 if total else None
+        features = final_exam_features(others, attendance_pct) or [np.nan] * len(FINAL_EXAM_FEATURES)
+        return features + [finals[-1] if finals else np.nan, len(others), total]
+
+class FeatureStore:
+    def __init__(self, database, directory: Optional[str] = DEFAULT_FEATURE_DIR, flush_interval: float = 30.0):
+        self.db = database
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._states: Dict[Tuple[str, str], SubjectState] = {}
+        self._index: Dict[Tuple[str, str], int] = {}
+        self._keys: List[Tuple[str, str]] = []
+        self._matrix = np.empty((0, len(COLUMNS)))
+        self._built = False
+        self._buffer: Optional[List] = None
+        # Before the first full build (flush/columns), states are loaded per
+        # user on demand; _loading holds the writes that land meanwhile.
+        self._users = set()
+        self._loading: Dict[str, Tuple[threading.Event, List]] = {}
+        self._generation = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+        database.subscribe(self.on_change)
+
+    def on_change(self, op, collection, old, new):
+        with self._lock:
+            if op == 'reset':
+                self._reset()
+                return
+            if collection not in ('marks', 'attendance'):
+                return
+            if self._built:
+                self._apply(collection, old, new)
+                return
+            if self._buffer is not None:
+                self._buffer.append((collection, old, new))
+            for user_id in {doc.get('user_id') for doc in old + new}:
+                if user_id in self._users or user_id in self._loading:
+                    user_old = [doc for doc in old if doc.get('user_id') == user_id]
+                    user_new = [doc for doc in new if doc.get('user_id') == user_id]
+                    if user_id in self._users:
+                        self._apply(collection, user_old, user_new)
+                    else:
+                        self._loading[user_id][1].append((collection, user_old, user_new))
+
+    def _reset(self):
+        self._states = {}
+        self._index = {}
+        self._keys = []
+        self._matrix = np.empty((0, len(COLUMNS)))
+        self._built = False
+        self._buffer = None
+        self._users = set()
+        for done, _ in self._loading.values():
+            done.set()
+        self._loading = {}
+        self._generation += 1
+
+    def _apply(self, collection, old, new):
+        touched = set()
+        moved = {doc['_id']: (doc.get('user_id'), doc.get('subject_id')) for doc in new}
+        for doc in old:
+            key = (doc.get('user_id'), doc.get('subject_id'))
+            state = self._states.get(key)
+            # Updates that stay under the same key are overwritten in place
+            # below so the mark keeps its position (midterm1 vs midterm2).
+            if state is not None and moved.get(doc['_id']) != key:
+                (state.marks if collection == 'marks' else state.attendance).pop(doc['_id'], None)
+                touched.add(key)
+        for doc in new:
+            key = (doc.get('user_id'), doc.get('subject_id'))
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = SubjectState()
+            if collection == 'marks':
+                state.marks[doc['_id']] = (doc.get('exam_type'), float(doc.get('percentage') or 0))
+            else:
+                state.attendance[doc['_id']] = doc.get('status') == 'present'
+            touched.add(key)
+        for key in touched:
+            self._write_row(key)
+
+    def _write_row(self, key):
+        row = self._index.get(key)
+        if row is None:
+            row = len(self._keys)
+            if row == len(self._matrix):
+                grown = np.empty((max(64, 2 * len(self._matrix)), len(COLUMNS)))
+                grown[:row] = self._matrix[:row]
+                self._matrix = grown
+            self._index[key] = row
+            self._keys.append(key)
+        self._matrix[row] = self._states[key].row()
+        self._dirty = True
+
+    def _ensure_built(self):
+        self.db.refresh()
+        if self._built:
+            return
+        with self._build_lock:
+            while not self._built:
+                with self._lock:
+                    # Writes that land while the collections are being read
+                    # are queued and replayed afterwards. Replaying is
+                    # idempotent (documents are keyed by _id), so it does not
+                    # matter whether the read already saw them.
+                    self._buffer = []
+                    generation = self._generation
+                marks = self.db.find('marks', {})
+                attendance = self.db.find('attendance', {})
+                with self._lock:
+                    if self._generation != generation:
+                        continue
+                    self._apply('marks', [], marks)
+                    self._apply('attendance', [], attendance)
+                    for collection, old, new in self._buffer:
+                        self._apply(collection, old, new)
+                    self._buffer = None
+                    self._built = True
+        self._ensure_flusher()
+
+    def _ensure_user(self, user_id: str):
+        # Loads one student's rows through the user_id indexes, so a
+        # prediction never waits on a read of the whole database.
+        self.db.refresh()
+        while True:
+            with self._lock:
+                if self._built or user_id in self._users:
+                    return
+                loading = self._loading.get(user_id)
+                if loading is None:
+                    loading = self._loading[user_id] = (threading.Event(), [])
+                    owner = True
+                else:
+                    owner = False
+                generation = self._generation
+            if not owner:
+                loading[0].wait()
+                continue
+            try:
+                marks = self.db.find('marks', {'user_id': user_id})
+                attendance = self.db.find('attendance', {'user_id': user_id})
+                with self._lock:
+                    if self._generation != generation:
+                        continue
+                    # As in _ensure_built, replaying writes the read may
+                    # already have seen is harmless.
+                    self._apply('marks', [], marks)
+                    self._apply('attendance', [], attendance)
+                    for collection, old, new in loading[1]:
+                        self._apply(collection, old, new)
+                    self._users.add(user_id)
+            finally:
+                with self._lock:
+                    if self._loading.get(user_id) is loading:
+                        del self._loading[user_id]
+                loading[0].set()
+
+    def rows(self, user_id: str, subject_ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        # Feature rows for the subjects that have marks to predict from.
+        self._ensure_user(user_id)
+        self._ensure_flusher()
+        with self._lock:
+            found = []
+            indexes = []
+            for subject_id in subject_ids:
+                row = self._index.get((user_id, subject_id))
+                if row is not None and self._matrix[row, COLUMNS.index('marks_count')] > 0:
+                    found.append(subject_id)
+                    indexes.append(row)
+            return found, self._matrix[indexes, :len(FINAL_EXAM_FEATURES)]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        # The snapshot covers every student, so this is the one place that
+        # reads the full collections.
+        self._ensure_built()
+        with self._lock:
+            count = len(self._keys)
+            data = {name: self._matrix[:count, i].copy() for i, name in enumerate(COLUMNS)}
+            data['user_id'] = np.array([key[0] or '' for key in self._keys], dtype=str)
+            data['subject_id'] = np.array([key[1] or '' for key in self._keys], dtype=str)
+        return data
+
+    def flush(self):
+        if self.directory is None:
+            return None
+        self._dirty = False
+        try:
+            return self._publish(self.columns())
+        except Exception:
+            self._dirty = True
+            raise
+
+    def _publish(self, data: Dict[str, np.ndarray]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        version = f'{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        target = os.path.join(self.directory, version)
+        tmp = target + '.tmp'
+        os.makedirs(tmp)
+        for name, column in data.items():
+            np.save(os.path.join(tmp, f'{name}.npy'), column)
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump({'version': version, 'rows': len(data['user_id']),
+                       'columns': list(COLUMNS), 'keys': list(KEY_COLUMNS)}, f)
+        os.rename(tmp, target)
+        # Every worker process flushes the same directory; the file lock keeps
+        # one from publishing an older snapshot over, or deleting, another's.
+        with FileLock(os.path.join(self.directory, 'CURRENT.lock')).exclusive():
+            current = _current_version(self.directory)
+            if current is not None and current > version:
+                shutil.rmtree(target, ignore_errors=True)
+                return os.path.join(self.directory, current)
+            pointer = os.path.join(self.directory, f'CURRENT.{version}')
+            with open(pointer, 'w') as f:
+                f.write(version)
+            os.replace(pointer, os.path.join(self.directory, 'CURRENT'))
+            # Readers resolve CURRENT once and keep their open memory maps, so
+            # older versions can be removed as soon as the pointer moves.
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name < version and os.path.isdir(path) and not name.endswith('.tmp'):
+                    shutil.rmtree(path, ignore_errors=True)
+        return target
+
+    def _ensure_flusher(self):
+        if not self.directory or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher_pid == os.getpid():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='feature-store-flush', daemon=True)
+            self._flusher_pid = os.getpid()
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('Feature store flush failed')
+
+def _current_version(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def read_columns(directory: str = DEFAULT_FEATURE_DIR, columns: Optional[List[str]] = None,
+                 mmap: bool = True) -> Dict[str, np.ndarray]:
+    # Zero-copy view of the latest flushed snapshot: each column is a
+    # read-only memory map over its .npy file.
+    version = _current_version(directory)
+    if version is None:
+        raise FileNotFoundError(f'No feature snapshot in {directory}')
+    path = os.path.join(directory, version)
+    names = columns or list(COLUMNS) + list(KEY_COLUMNS)
+    return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None) for name in names}
+
+feature_store = FeatureStore(
+    db,
+    directory=os.getenv('FEATURE_STORE_DIR', DEFAULT_FEATURE_DIR),
+    flush_interval=float(os.getenv('FEATURE_STORE_FLUSH_INTERVAL', 30))
+)
@@ -0,0 +1,241 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from app.models.database import db
+
+logger = logging.getLogger(__name__)
+
+XP_PER_LEVEL = 100
+COUNTERS = ('xp', 'study_sessions', 'study_minutes', 'marks_added', 'assignments_completed')
+
+# (badge, counter, threshold): earned once the counter reaches the threshold.
+BADGES = [
+    ('first_study_session', 'study_sessions', 1),
+    ('focused_learner', 'study_minutes', 600),
+    ('marks_tracker', 'marks_added', 10),
+    ('task_finisher', 'assignments_completed', 5),
+    ('week_streak', 'best_streak', 7),
+    ('month_streak', 'best_streak', 30),
+    ('xp_1000', 'xp', 1000)
+]
+
+def level_for(xp: float) -> int:
+    return int(xp // XP_PER_LEVEL) + 1
+
+def extend_streak(state: Dict, day: str):
+    # Activity on consecutive days extends the streak; a gap restarts it.
+    last = state.get('last_active')
+    if last is not None and day <= last:
+        return
+    yesterday = (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+    state['streak'] = state.get('streak', 0) + 1 if last == yesterday else 1
+    state['best_streak'] = max(state.get('best_streak', 0), state['streak'])
+    state['last_active'] = day
+
+def earned_badges(state: Dict) -> List[str]:
+    badges = list(state.get('badges') or [])
+    for badge, counter, threshold in BADGES:
+        if badge not in badges and (state.get(counter) or 0) >= threshold:
+            badges.append(badge)
+    return badges
+
+class GamificationEngine:
+    def __init__(self, database, flush_interval: float = 2.0, max_entries: int = 10000):
+        self.db = database
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self._pending: Dict[str, Dict] = {}
+        self._flushing: Dict[str, Dict] = {}
+        # Stored state of the most recently used users.
+        self._states: "OrderedDict[str, Dict]" = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+        self.awards = 0
+        self.flushes = 0
+        self.flushed_users = 0
+        database.subscribe(self.on_change)
+        atexit.register(self._flush_quietly)
+
+    def on_change(self, op, collection, old, new):
+        with self._lock:
+            if op == 'reset':
+                self._states.clear()
+            elif collection == 'gamification':
+                for doc in old:
+                    self._states.pop(doc.get('user_id'), None)
+                for doc in new:
+                    self._remember(doc.get('user_id'), doc)
+                    # Our own increment: the deltas are now part of the stored
+                    # state, so drop them from the overlay in the same step.
+                    if getattr(self._local, 'persisting', None) == doc.get('user_id'):
+                        self._flushing.pop(doc.get('user_id'), None)
+            elif collection == 'users' and op == 'delete':
+                for doc in old:
+                    self._states.pop(doc['_id'], None)
+                    self._pending.pop(doc['_id'], None)
+
+    def award(self, user_id: str, xp: float = 0, activity: bool = True, **counters):
+        # Counted in memory and written in one atomic increment per user on
+        # the next flush, instead of a read-modify-write of the user per award.
+        with self._lock:
+            pending = self._pending.setdefault(user_id, {'deltas': {}, 'days': []})
+            for counter, value in dict(counters, xp=xp).items():
+                if value:
+                    pending['deltas'][counter] = pending['deltas'].get(counter, 0) + value
+            if activity:
+                today = date.today().isoformat()
+                if today not in pending['days']:
+                    pending['days'].append(today)
+            self.awards += 1
+        if self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def _remember(self, user_id: str, state: Dict):
+        # Called with the lock held.
+        self._states[user_id] = state
+        self._states.move_to_end(user_id)
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+
+    def _stored_state(self, user_id: str, user: Optional[Dict] = None) -> Dict:
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is not None:
+                self._states.move_to_end(user_id)
+                return state
+        state = self.db.find_one('gamification', {'user_id': user_id})
+        if state is None:
+            # Nothing recorded yet: start from what the user document holds.
+            user = user or self.db.find_one('users', {'_id': user_id}) or {}
+            state = {'xp': user.get('xp', 0), 'streak': user.get('streak', 0),
+                     'badges': list(user.get('badges') or [])}
+        with self._lock:
+            # A write that landed during the read has already been recorded.
+            if user_id in self._states:
+                return self._states[user_id]
+            self._remember(user_id, state)
+        return state
+
+    def profile(self, user: Dict) -> Dict:
+        state = dict(self._stored_state(user['_id'], user))
+        with self._lock:
+            for changes in (self._flushing.get(user['_id']), self._pending.get(user['_id'])):
+                if changes is not None:
+                    for counter, value in changes['deltas'].items():
+                        state[counter] = (state.get(counter) or 0) + value
+                    for day in changes['days']:
+                        extend_streak(state, day)
+        streak = state.get('streak', 0)
+        # A streak only counts while it is still alive (active today or yesterday).
+        if (state.get('last_active') or '') < (date.today() - timedelta(days=1)).isoformat():
+            streak = 0
+        return {
+            'xp': state.get('xp', 0),
+            'level': level_for(state.get('xp', 0)),
+            'streak': streak,
+            'badges': earned_badges(state)
+        }
+
+    def merged(self, user: Dict) -> Dict:
+        return dict(user, **self.profile(user))
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushing.update(pending)
+            failed = None
+            for user_id, changes in pending.items():
+                try:
+                    self._persist(user_id, changes)
+                except Exception as e:
+                    failed = e
+                    with self._lock:
+                        # Not written: hand the changes back to the next flush.
+                        if self._flushing.pop(user_id, None) is not None:
+                            current = self._pending.setdefault(user_id, {'deltas': {}, 'days': []})
+                            for counter, value in changes['deltas'].items():
+                                current['deltas'][counter] = current['deltas'].get(counter, 0) + value
+                            current['days'] = sorted(set(changes['days'] + current['days']))
+            with self._lock:
+                self.flushes += 1
+                self.flushed_users += len(pending)
+            if failed is not None:
+                raise failed
+
+    def _persist(self, user_id: str, changes: Dict):
+        user = self.db.find_one('users', {'_id': user_id})
+        if user is None:
+            with self._lock:
+                self._flushing.pop(user_id, None)
+            return
+        # Only used for a user's first award: carry over what the user
+        # document already holds.
+        defaults = {'user_id': user_id, 'xp': user.get('xp', 0), 'streak': user.get('streak', 0),
+                    'best_streak': user.get('streak', 0), 'badges': list(user.get('badges') or [])}
+        deltas = {counter: changes['deltas'].get(counter, 0) for counter in COUNTERS}
+
+        def derive(state):
+            # Runs inside the increment's write, on the totals it produced, so
+            # processes flushing the same user can't overwrite each other's
+            # streak or badges.
+            for day in changes['days']:
+                extend_streak(state, day)
+            return {
+                'level': level_for(state['xp']),
+                'streak': state.get('streak', 0),
+                'best_streak': state.get('best_streak', 0),
+                'last_active': state.get('last_active'),
+                'badges': earned_badges(state)
+            }
+
+        self._local.persisting = user_id
+        try:
+            self.db.increment('gamification', {'user_id': user_id}, deltas, defaults, derive)
+        finally:
+            self._local.persisting = None
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Gamification flush failed')
+
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._flusher is not None and self._flusher_pid == os.getpid():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='gamification-flush', daemon=True)
+            self._flusher_pid = os.getpid()
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._pending:
+                self._flush_quietly()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'flush_interval': self.flush_interval,
+                'pending_users': len(self._pending),
+                'cached_users': len(self._states),
+                'awards': self.awards,
+                'flushes': self.flushes,
+                'flushed_users': self.flushed_users,
+                'writes_saved': max(0, self.awards - self.flushed_users)
+            }
+
+gamification = GamificationEngine(db, flush_interval=float(os.getenv('GAMIFICATION_FLUSH_INTERVAL', 2)),
+                                  max_entries=int(os.getenv('GAMIFICATION_CACHE_SIZE', 10000)))
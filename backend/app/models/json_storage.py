@@ -0,0 +1,695 @@
+import bisect
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
+import uuid
+from app.models.locking import FileLock, RWLock
+from app.models.storage import DEFAULT_INDEXES, COLLECTIONS, SORTED_INDEXES, StorageBackend, collect_dependents, iter_project, parse_sort, project, sort_key
+
+class HashIndex:
+    def __init__(self, fields: Tuple[str, ...]):
+        self.fields = tuple(fields)
+        self.buckets: Dict[Tuple, Dict[str, Dict]] = {}
+
+    def key_for(self, doc: Dict) -> Optional[Tuple]:
+        values = []
+        for field in self.fields:
+            if field not in doc:
+                return None
+            values.append(doc[field])
+        key = tuple(values)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def add(self, doc: Dict):
+        key = self.key_for(doc)
+        if key is not None:
+            self.buckets.setdefault(key, {})[doc['_id']] = doc
+
+    def remove(self, doc: Dict, key: Optional[Tuple]):
+        if key is None:
+            return
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            bucket.pop(doc['_id'], None)
+            if not bucket:
+                del self.buckets[key]
+
+    def lookup(self, query: Dict) -> Optional[Iterable[Dict]]:
+        key = tuple(query[field] for field in self.fields)
+        try:
+            bucket = self.buckets.get(key)
+        except TypeError:
+            return None
+        return bucket.values() if bucket else ()
+
+class SortedIndex:
+    def __init__(self, fields: Tuple[str, ...], field: str):
+        self.fields = tuple(fields)
+        self.field = field
+        # group -> ([(sort_key(value), _id)] in order, {_id: doc})
+        self.groups: Dict[Tuple, Tuple[List[Tuple], Dict[str, Dict]]] = {}
+
+    def key_for(self, doc: Dict) -> Optional[Tuple]:
+        if doc.get(self.field) is None:
+            return None
+        group = HashIndex.key_for(self, doc)
+        if group is None:
+            return None
+        return group, sort_key(doc[self.field])
+
+    def add(self, doc: Dict):
+        key = self.key_for(doc)
+        if key is None:
+            return
+        entries, docs = self.groups.setdefault(key[0], ([], {}))
+        if doc['_id'] not in docs:
+            bisect.insort(entries, (key[1], doc['_id']))
+        docs[doc['_id']] = doc
+
+    def remove(self, doc: Dict, key: Optional[Tuple]):
+        if key is None:
+            return
+        group = self.groups.get(key[0])
+        if group is None:
+            return
+        entries, docs = group
+        position = bisect.bisect_left(entries, (key[1], doc['_id']))
+        if position < len(entries) and entries[position][1] == doc['_id']:
+            del entries[position]
+            docs.pop(doc['_id'], None)
+        if not entries:
+            del self.groups[key[0]]
+
+    def range(self, query: Dict, start: Any, end: Any, after: Optional[Tuple[Any, str]]) -> Optional[Iterator[Dict]]:
+        try:
+            group = self.groups.get(tuple(query[field] for field in self.fields))
+        except TypeError:
+            return None
+        if group is None:
+            return iter(())
+        entries, docs = group
+        # (value,) sorts before every (value, _id), so bisecting on it finds
+        # the first entry with that value.
+        low = 0 if start is None else bisect.bisect_left(entries, (sort_key(start),))
+        if after is not None:
+            low = max(low, bisect.bisect_right(entries, (sort_key(after[0]), after[1])))
+        high = len(entries) if end is None else bisect.bisect_left(entries, (sort_key(end),))
+        # Lazy, so a limit stops the walk early; consume under the read lock.
+        return (docs[entries[position][1]] for position in range(low, high))
+
+class JSONStorage(StorageBackend):
+    def __init__(self, db_file='database.json', indexes: Optional[Dict[str, List[Tuple[str, ...]]]] = None,
+                 journal: bool = True, compact_threshold: int = 1000, compact_interval: float = 30.0,
+                 fetch_size: int = 1000):
+        super().__init__()
+        self.db_file = db_file
+        self.journal_file = db_file + '.wal'
+        self.journal = journal
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+        self.fetch_size = fetch_size
+        self._rwlock = RWLock()
+        self._file_lock = FileLock(db_file + '.lock')
+        self._journal_handle = None
+        self._journal_signature = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._snapshot_signature = None
+        self._compactor = None
+        self._compactor_pid = None
+        self._closed = False
+        self._loading = False
+        self._deferred = None
+        self._index_fields: Dict[str, List[Tuple[str, ...]]] = {}
+        for collection, index_list in DEFAULT_INDEXES.items():
+            self._index_fields[collection] = list(index_list)
+        for collection, index_list in (indexes or {}).items():
+            self._index_fields.setdefault(collection, []).extend(tuple(fields) for fields in index_list)
+        with self._rwlock.write(), self._file_lock.exclusive():
+            self._reload()
+            self._truncate_journal_tail()
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _load_db(self) -> Dict[str, Dict[str, Dict]]:
+        raw = {}
+        if os.path.exists(self.db_file):
+            with open(self.db_file, 'r') as f:
+                raw = json.load(f)
+        data = {name: {} for name in COLLECTIONS}
+        for collection, docs in raw.items():
+            store = data.setdefault(collection, {})
+            for doc in docs:
+                if '_id' not in doc:
+                    doc['_id'] = str(uuid.uuid4())
+                store[doc['_id']] = doc
+        return data
+
+    def _save_db(self):
+        tmp_file = self.db_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({name: list(docs.values()) for name, docs in self.data.items()}, f, indent=2)
+        os.replace(tmp_file, self.db_file)
+        self._snapshot_signature = self._signature(self.db_file)
+
+    def _reload(self):
+        self._loading = True
+        try:
+            self._load_state()
+        finally:
+            self._loading = False
+        self._emit('reset', None, [], [])
+
+    def _load_state(self):
+        self._snapshot_signature = self._signature(self.db_file)
+        self.data = self._load_db()
+        self.indexes: Dict[str, Dict[Tuple[str, ...], HashIndex]] = {name: {} for name in self.data}
+        self.sorted_indexes: Dict[str, List[SortedIndex]] = {name: [] for name in self.data}
+        self._journal_offset = 0
+        self._journal_entries = 0
+        if self.journal:
+            self._open_journal()
+            self._replay_journal()
+        for collection, index_list in self._index_fields.items():
+            for fields in index_list:
+                self._build_index(collection, fields)
+        for collection, index_list in SORTED_INDEXES.items():
+            for fields, field in index_list:
+                index = SortedIndex(fields, field)
+                for doc in self.data.setdefault(collection, {}).values():
+                    index.add(doc)
+                self.sorted_indexes.setdefault(collection, []).append(index)
+
+    def _open_journal(self):
+        if self._journal_handle is not None:
+            self._journal_handle.close()
+        self._journal_handle = open(self.journal_file, 'ab')
+        self._journal_signature = self._signature(self.journal_file)
+
+    def _replay_journal(self):
+        with open(self.journal_file, 'rb') as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(entry)
+                self._journal_offset += len(line)
+                self._journal_entries += 1
+
+    def _truncate_journal_tail(self):
+        # Only called under the exclusive file lock, so anything past the last
+        # complete record is a torn write from a crashed process, not one in
+        # flight. Drop it so the next append starts on a clean line.
+        if self.journal and os.path.getsize(self.journal_file) > self._journal_offset:
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(self._journal_offset)
+
+    def _stale(self) -> bool:
+        if self.journal:
+            signature = self._signature(self.journal_file)
+            return signature is None or signature[0] != self._journal_signature[0] or signature[1] != self._journal_offset
+        return self._signature(self.db_file) != self._snapshot_signature
+
+    def _sync(self):
+        if self.journal:
+            signature = self._signature(self.journal_file)
+            if signature is None or signature[0] != self._journal_signature[0]:
+                # Another process compacted: the snapshot and journal were both replaced.
+                self._reload()
+            elif signature[1] > self._journal_offset:
+                self._replay_journal()
+        elif self._signature(self.db_file) != self._snapshot_signature:
+            self._reload()
+
+    def _emit(self, op: str, collection: Optional[str], old: List[Dict], new: List[Dict]):
+        if self._deferred is not None:
+            self._deferred.append((op, collection, old, new))
+        else:
+            super()._emit(op, collection, old, new)
+
+    @contextmanager
+    def _deferring(self):
+        # Change events wait until the write has reached the journal (or the
+        # snapshot), then go out labelled with the version it produced.
+        self._deferred = events = []
+        try:
+            yield
+        except BaseException:
+            self._deferred = None
+            if events:
+                # Memory may be ahead of the files now.
+                self._emit('reset', None, [], [])
+            raise
+        self._deferred = None
+        if events:
+            self._emit_at(self._state_version(), events)
+
+    def _state_version(self) -> str:
+        snapshot = self._snapshot_signature or (0, 0, 0)
+        if self.journal:
+            return f'{snapshot[2]:x}.{self._journal_signature[0]:x}.{self._journal_offset}'
+        return f'{snapshot[2]:x}.{snapshot[0]:x}.{snapshot[1]}'
+
+    @contextmanager
+    def _reading(self):
+        if self._stale():
+            with self._rwlock.write(), self._file_lock.shared(), self._deferring():
+                self._sync()
+        with self._rwlock.read():
+            yield
+
+    @contextmanager
+    def _writing(self):
+        with self._rwlock.write(), self._file_lock.exclusive(), self._deferring():
+            self._sync()
+            self._truncate_journal_tail()
+            yield
+
+    def _apply(self, entry: Dict):
+        collection = entry['collection']
+        store = self.data.setdefault(collection, {})
+        self.indexes.setdefault(collection, {})
+        self.sorted_indexes.setdefault(collection, [])
+        if entry['op'] == 'insert':
+            self._apply_insert(collection, entry['doc'])
+        elif entry['op'] == 'update':
+            docs = [store[doc_id] for doc_id in entry['ids'] if doc_id in store]
+            self._apply_update(collection, docs, entry['set'])
+        elif entry['op'] == 'delete':
+            docs = [store[doc_id] for doc_id in entry['ids'] if doc_id in store]
+            self._apply_delete(collection, docs)
+        elif entry['op'] == 'put':
+            self._apply_put(collection, entry['docs'])
+        elif entry['op'] == 'delete_many':
+            for name, ids in entry['ids'].items():
+                store = self.data.setdefault(name, {})
+                self.indexes.setdefault(name, {})
+                self.sorted_indexes.setdefault(name, [])
+                self._apply_delete(name, [store[doc_id] for doc_id in ids if doc_id in store])
+
+    def _apply_insert(self, collection: str, document: Dict):
+        existing = self.data[collection].get(document['_id'])
+        if existing is not None:
+            self._index_replace(collection, existing, document)
+        else:
+            self._index_add(collection, document)
+        self.data[collection][document['_id']] = document
+        if not self._loading:
+            self._emit('insert', collection, [existing] if existing is not None else [], [document])
+
+    def _apply_put(self, collection: str, documents: List[Dict]):
+        # Stores whole documents by _id, inserting new ones and replacing
+        # existing ones; listeners get one insert and one update per batch.
+        store = self.data[collection]
+        inserted = []
+        old_docs = []
+        new_docs = []
+        for document in documents:
+            existing = store.get(document['_id'])
+            if existing is not None:
+                self._index_replace(collection, existing, document)
+                old_docs.append(existing)
+                new_docs.append(document)
+            else:
+                inserted.append(document)
+                self._index_add(collection, document)
+            store[document['_id']] = document
+        if not self._loading:
+            if inserted:
+                self._emit('insert', collection, [], inserted)
+            if new_docs:
+                self._emit('update', collection, old_docs, new_docs)
+
+    def _apply_update(self, collection: str, docs: List[Dict], update: Dict):
+        # Copy-on-write: stored documents are never mutated in place, so a
+        # reader that took references under the read lock (e.g. a streaming
+        # response) keeps seeing a consistent version after it lets go.
+        store = self.data[collection]
+        new_docs = []
+        for doc in docs:
+            new_doc = dict(doc)
+            new_doc.update(update)
+            self._index_replace(collection, doc, new_doc)
+            store[doc['_id']] = new_doc
+            new_docs.append(new_doc)
+        if docs and not self._loading:
+            self._emit('update', collection, docs, new_docs)
+
+    def _apply_delete(self, collection: str, docs: List[Dict]):
+        for doc in docs:
+            self._index_remove(collection, doc)
+            del self.data[collection][doc['_id']]
+        if docs and not self._loading:
+            self._emit('delete', collection, docs, [])
+
+    def _commit(self, entry: Dict):
+        if not self.journal:
+            self._save_db()
+            return
+        line = json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._journal_handle.write(line)
+        self._journal_handle.flush()
+        self._journal_offset += len(line)
+        self._journal_entries += 1
+        self._ensure_compactor()
+
+    def _ensure_compactor(self):
+        if self._compactor is not None and self._compactor_pid == os.getpid() and self._compactor.is_alive():
+            return
+        self._compactor_pid = os.getpid()
+        self._compactor = threading.Thread(target=self._compact_loop, name='db-compactor', daemon=True)
+        self._compactor.start()
+
+    def _compact_loop(self):
+        while not self._closed:
+            time.sleep(self.compact_interval)
+            if not self._closed and self._journal_entries >= self.compact_threshold:
+                self.compact()
+
+    def refresh(self):
+        with self._reading():
+            pass
+
+    def close(self):
+        with self._rwlock.write():
+            self._closed = True
+            if self._journal_handle is not None:
+                self._journal_handle.close()
+                self._journal_handle = None
+
+    def compact(self):
+        if not self.journal:
+            return
+        with self._writing():
+            tmp_file = self.db_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump({name: list(docs.values()) for name, docs in self.data.items()}, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.db_file)
+            # Swap in a fresh journal file (new inode) so other processes notice
+            # the compaction. Replaying the old journal over the new snapshot is
+            # harmless, so a crash between the two replaces loses nothing.
+            open(self.journal_file + '.tmp', 'wb').close()
+            os.replace(self.journal_file + '.tmp', self.journal_file)
+            self._snapshot_signature = self._signature(self.db_file)
+            self._open_journal()
+            self._journal_offset = 0
+            self._journal_entries = 0
+
+    def create_index(self, collection: str, fields: Tuple[str, ...]) -> HashIndex:
+        fields = tuple(fields)
+        with self._rwlock.write():
+            if fields not in self._index_fields.setdefault(collection, []):
+                self._index_fields[collection].append(fields)
+            return self._build_index(collection, fields)
+
+    def _build_index(self, collection: str, fields: Tuple[str, ...]) -> HashIndex:
+        collection_indexes = self.indexes.setdefault(collection, {})
+        self.data.setdefault(collection, {})
+        self.sorted_indexes.setdefault(collection, [])
+        if fields in collection_indexes:
+            return collection_indexes[fields]
+        index = HashIndex(fields)
+        for doc in self.data[collection].values():
+            index.add(doc)
+        collection_indexes[fields] = index
+        return index
+
+    def _index_add(self, collection: str, doc: Dict):
+        for index in self.indexes[collection].values():
+            index.add(doc)
+        for index in self.sorted_indexes[collection]:
+            index.add(doc)
+
+    def _index_replace(self, collection: str, old: Dict, new: Dict):
+        # A document whose key is unchanged is swapped in place, so it keeps
+        # its position in the bucket (and results keep insertion order).
+        for index in self.indexes[collection].values():
+            old_key = index.key_for(old)
+            if index.key_for(new) != old_key:
+                index.remove(old, old_key)
+            index.add(new)
+        for index in self.sorted_indexes[collection]:
+            index.remove(old, index.key_for(old))
+            index.add(new)
+
+    def _index_remove(self, collection: str, doc: Dict):
+        for index in self.indexes[collection].values():
+            index.remove(doc, index.key_for(doc))
+        for index in self.sorted_indexes[collection]:
+            index.remove(doc, index.key_for(doc))
+
+    def _candidates(self, collection: str, query: Dict) -> Iterable[Dict]:
+        docs = self.data[collection]
+        if '_id' in query:
+            try:
+                doc = docs.get(query['_id'])
+            except TypeError:
+                return docs.values()
+            return [doc] if doc is not None else []
+        best = None
+        for fields, index in self.indexes[collection].items():
+            if all(field in query for field in fields) and (best is None or len(fields) > len(best.fields)):
+                best = index
+        if best is not None:
+            candidates = best.lookup(query)
+            if candidates is not None:
+                return candidates
+        return docs.values()
+
+    @staticmethod
+    def _matches(doc: Dict, query: Dict) -> bool:
+        for key, value in query.items():
+            if key not in doc or doc[key] != value:
+                return False
+        return True
+
+    def _find(self, collection: str, query: Dict) -> List[Dict]:
+        return [doc for doc in self._candidates(collection, query) if self._matches(doc, query)]
+
+    def insert(self, collection: str, document: Dict) -> Dict:
+        with self._writing():
+            if '_id' not in document:
+                document['_id'] = str(uuid.uuid4())
+            document['created_at'] = datetime.now().isoformat()
+            document['updated_at'] = datetime.now().isoformat()
+            self._apply_insert(collection, document)
+            self._commit({'op': 'insert', 'collection': collection, 'doc': document})
+            return document
+
+    def insert_many(self, collection: str, documents: List[Dict]) -> List[Dict]:
+        with self._writing():
+            now = datetime.now().isoformat()
+            for document in documents:
+                if '_id' not in document:
+                    document['_id'] = str(uuid.uuid4())
+                document['created_at'] = now
+                document['updated_at'] = now
+            if documents:
+                self._apply_put(collection, documents)
+                self._commit({'op': 'put', 'collection': collection, 'docs': documents})
+            return documents
+
+    def upsert_many(self, collection: str, documents: List[Dict],
+                    key: Tuple[str, ...]) -> Tuple[List[Dict], List[Dict]]:
+        with self._writing():
+            now = datetime.now().isoformat()
+            batch = {}
+            inserted_keys = set()
+            for document in documents:
+                values = tuple(document.get(field) for field in key)
+                current = batch.get(values)
+                if current is None:
+                    matched = self._find(collection, dict(zip(key, values)))
+                    current = matched[0] if matched else None
+                if current is None:
+                    current = {'_id': str(uuid.uuid4()), 'created_at': now}
+                    inserted_keys.add(values)
+                merged = dict(current)
+                merged.update({k: v for k, v in document.items() if k not in ('_id', 'created_at')})
+                merged['updated_at'] = now
+                batch[values] = merged
+            docs = list(batch.values())
+            if docs:
+                self._apply_put(collection, docs)
+                self._commit({'op': 'put', 'collection': collection, 'docs': docs})
+            return ([doc for values, doc in batch.items() if values in inserted_keys],
+                    [doc for values, doc in batch.items() if values not in inserted_keys])
+
+    def _select(self, collection: str, query: Dict, sort: Optional[str], limit: Optional[int],
+                after: Optional[Tuple[Any, str]]) -> List[Dict]:
+        if after is not None and sort is None:
+            raise ValueError('after requires sort')
+        if sort is None:
+            with self._reading():
+                docs = self._find(collection, query)
+            return docs if limit is None else docs[:limit]
+        field, descending = parse_sort(sort)
+        key = lambda doc: (sort_key(doc.get(field)), doc['_id'])
+        with self._reading():
+            docs = (doc for doc in self._candidates(collection, query) if self._matches(doc, query))
+            if after is not None:
+                bound = (sort_key(after[0]), after[1])
+                if descending:
+                    docs = (doc for doc in docs if key(doc) < bound)
+                else:
+                    docs = (doc for doc in docs if key(doc) > bound)
+            if limit is not None:
+                # A page keeps only its own documents: one pass over the
+                # matches instead of sorting all of them.
+                return (heapq.nlargest if descending else heapq.nsmallest)(limit, docs, key=key)
+            docs = list(docs)
+        docs.sort(key=key, reverse=descending)
+        return docs
+
+    def _paged(self, fetch, field: str, after: Optional[Tuple[Any, str]], limit: Optional[int]) -> Iterator[Dict]:
+        # Reads fetch_size documents at a time, each page under its own read
+        # lock, resuming just past the last one. Only one page is held at
+        # once and writers are not shut out while the consumer works.
+        while limit is None or limit > 0:
+            size = self.fetch_size if limit is None else min(self.fetch_size, limit)
+            page = fetch(size, after)
+            yield from page
+            if len(page) < size:
+                return
+            if limit is not None:
+                limit -= len(page)
+            after = (page[-1].get(field), page[-1]['_id'])
+
+    def find(self, collection: str, query: Dict, sort: Optional[str] = None, limit: Optional[int] = None,
+             after: Optional[Tuple[Any, str]] = None, projection: Optional[List[str]] = None) -> List[Dict]:
+        return project(self._select(collection, query, sort, limit, after), projection)
+
+    def iter_find(self, collection: str, query: Dict, sort: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[Tuple[Any, str]] = None, projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        # Without a sort there is no key to resume from, so the matching
+        # references are collected up front; projected copies are still made
+        # one at a time as the consumer pulls them.
+        if sort is None:
+            return iter_project(self._select(collection, query, sort, limit, after), projection)
+        fetch = lambda size, after: self._select(collection, query, sort, size, after)
+        return iter_project(self._paged(fetch, parse_sort(sort)[0], after, limit), projection)
+
+    def find_range(self, collection: str, query: Dict, field: str, start: Any = None, end: Any = None,
+                   limit: Optional[int] = None, after: Optional[Tuple[Any, str]] = None,
+                   projection: Optional[List[str]] = None) -> List[Dict]:
+        with self._reading():
+            docs = None
+            for index in self.sorted_indexes.get(collection, ()):
+                if index.field == field and all(f in query for f in index.fields):
+                    docs = index.range(query, start, end, after)
+                    if docs is not None:
+                        break
+            if docs is None:
+                key = lambda doc: (sort_key(doc.get(field)), doc['_id'])
+                docs = (doc for doc in self._find(collection, query) if doc.get(field) is not None
+                        and (start is None or sort_key(doc[field]) >= sort_key(start))
+                        and (end is None or sort_key(doc[field]) < sort_key(end)))
+                if after is not None:
+                    bound = (sort_key(after[0]), after[1])
+                    docs = (doc for doc in docs if key(doc) > bound)
+                docs = sorted(docs, key=key) if limit is None else heapq.nsmallest(limit, docs, key=key)
+            else:
+                docs = list(itertools.islice((doc for doc in docs if self._matches(doc, query)), limit))
+        return project(docs, projection)
+
+    def iter_find_range(self, collection: str, query: Dict, field: str, start: Any = None, end: Any = None,
+                        limit: Optional[int] = None, after: Optional[Tuple[Any, str]] = None,
+                        projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        fetch = lambda size, after: self.find_range(collection, query, field, start, end, limit=size, after=after)
+        return iter_project(self._paged(fetch, field, after, limit), projection)
+
+    def find_one(self, collection: str, query: Dict) -> Optional[Dict]:
+        with self._reading():
+            for doc in self._candidates(collection, query):
+                if self._matches(doc, query):
+                    return doc
+            return None
+
+    def update(self, collection: str, query: Dict, update: Dict) -> int:
+        with self._writing():
+            update = {k: v for k, v in update.items() if k != '_id'}
+            update['updated_at'] = datetime.now().isoformat()
+            matched = self._find(collection, query)
+            if matched:
+                self._apply_update(collection, matched, update)
+                self._commit({'op': 'update', 'collection': collection,
+                              'ids': [doc['_id'] for doc in matched], 'set': update})
+            return len(matched)
+
+    def increment(self, collection: str, query: Dict, deltas: Dict[str, float],
+                  defaults: Optional[Dict] = None, derive: Optional[Callable[[Dict], Dict]] = None) -> Optional[Dict]:
+        with self._writing():
+            matched = self._find(collection, query)
+            if matched:
+                doc = matched[0]
+                # The journal records the resulting values, computed under
+                # the exclusive file lock, so replaying it is deterministic.
+                update = {k: (doc.get(k) or 0) + v for k, v in deltas.items()}
+                if derive is not None:
+                    update.update(derive(dict(doc, **update)))
+                update['updated_at'] = datetime.now().isoformat()
+                self._apply_update(collection, [doc], update)
+                self._commit({'op': 'update', 'collection': collection, 'ids': [doc['_id']], 'set': update})
+                return self.data[collection][doc['_id']]
+            if defaults is None:
+                return None
+            document = dict(defaults)
+            for k, v in deltas.items():
+                document[k] = (document.get(k) or 0) + v
+            if derive is not None:
+                document.update(derive(dict(document)))
+            document.setdefault('_id', str(uuid.uuid4()))
+            document['created_at'] = datetime.now().isoformat()
+            document['updated_at'] = datetime.now().isoformat()
+            self._apply_insert(collection, document)
+            self._commit({'op': 'insert', 'collection': collection, 'doc': document})
+            return document
+
+    def delete(self, collection: str, query: Dict) -> int:
+        with self._writing():
+            matched = self._find(collection, query)
+            if matched:
+                self._apply_delete(collection, matched)
+                self._commit({'op': 'delete', 'collection': collection,
+                              'ids': [doc['_id'] for doc in matched]})
+            return len(matched)
+
+    def delete_cascade(self, collection: str, query: Dict) -> Dict[str, int]:
+        with self._writing():
+            parents = self._find(collection, query)
+            if not parents:
+                return {}
+            # Child lookups go through the hash indexes on the reference fields.
+            lookup = lambda child, field, ids: [doc for doc_id in ids for doc in self._find(child, {field: doc_id})]
+            doomed = collect_dependents(collection, parents, lookup)
+            for name, docs in doomed.items():
+                self._apply_delete(name, docs)
+            self._commit({'op': 'delete_many', 'collection': collection,
+                          'ids': {name: [doc['_id'] for doc in docs] for name, docs in doomed.items()}})
+            return {name: len(docs) for name, docs in doomed.items()}
+
+    def get_all(self, collection: str) -> List[Dict]:
+        with self._reading():
+            return list(self.data[collection].values())
@@ -0,0 +1,113 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class RWLock:
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            if self._writer == threading.get_ident():
+                self._writer_depth -= 1
+                return
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+class FileLock:
+    # Advisory flock(2) lock shared by every process using the same path.
+    # Callers serialize access within a process (Database only touches it
+    # while holding its RWLock for writing), so no thread lock is needed here.
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._pid = None
+        self._depth = 0
+
+    def _acquire(self, mode):
+        if self._depth:
+            self._depth += 1
+            return
+        if fcntl is not None:
+            if self._fd is None or self._pid != os.getpid():
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, mode)
+        self._depth = 1
+
+    def _release(self):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def shared(self):
+        self._acquire(fcntl.LOCK_SH if fcntl is not None else None)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextmanager
+    def exclusive(self):
+        self._acquire(fcntl.LOCK_EX if fcntl is not None else None)
+        try:
+            yield
+        finally:
+            self._release()
@@ -0,0 +1,473 @@
+import json
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from app.models.locking import RWLock
+from app.models.storage import COLLECTIONS, DEFAULT_INDEXES, SORTED_INDEXES, StorageBackend, collect_dependents, iter_project, parse_sort, project
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def _identifier(name: str) -> str:
+    if not IDENTIFIER.match(name):
+        raise ValueError(f'Invalid field or collection name: {name!r}')
+    return name
+
+def _field_expr(field: str) -> str:
+    if field == '_id':
+        return '_id'
+    # Must be spelled exactly like the indexed expression for SQLite to use
+    # the expression index, so the path is inlined rather than bound.
+    return f"json_extract(doc, '$.{_identifier(field)}')"
+
+class SQLiteStorage(StorageBackend):
+    def __init__(self, db_file='database.sqlite3', indexes: Optional[Dict[str, List[Tuple[str, ...]]]] = None,
+                 timeout: float = 30.0, fetch_size: int = 256, change_log: int = 1000):
+        super().__init__()
+        self.db_file = db_file
+        self.change_log = change_log
+        self.timeout = timeout
+        self.fetch_size = fetch_size
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        # Serializes in-process writers against readers so change events,
+        # which fire just before COMMIT, are never observed out of step with
+        # the rows they describe.
+        self._rwlock = RWLock()
+        self._tables = set()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS _meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute("INSERT OR IGNORE INTO _meta (key, value) VALUES ('version', 0)")
+        # The change events of the last change_log commits, so other
+        # processes can replay them instead of dropping all derived state.
+        conn.execute('CREATE TABLE IF NOT EXISTS _changes (version INTEGER PRIMARY KEY, events TEXT NOT NULL)')
+        self._seen_version = self._read_version(conn)
+        for collection in COLLECTIONS:
+            self._ensure_collection(collection)
+        for collection, index_list in DEFAULT_INDEXES.items():
+            for fields in index_list:
+                self.create_index(collection, fields)
+        for collection, index_list in SORTED_INDEXES.items():
+            for fields, field in index_list:
+                self.create_index(collection, tuple(fields) + (field,))
+        for collection, index_list in (indexes or {}).items():
+            for fields in index_list:
+                self.create_index(collection, fields)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @staticmethod
+    def _read_version(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM _meta WHERE key = 'version'").fetchone()[0]
+
+    def _missed_changes(self, conn: sqlite3.Connection, version: int) -> Optional[List]:
+        # Events committed by other processes after _seen_version up to
+        # version, or None if the log no longer reaches back that far.
+        seen = self._seen_version
+        if version <= seen:
+            return []
+        rows = conn.execute('SELECT events FROM _changes WHERE version > ? AND version <= ? ORDER BY version',
+                            (seen, version)).fetchall()
+        if len(rows) != version - seen:
+            return None
+        return [event for (raw,) in rows for event in json.loads(raw)]
+
+    def _publish(self, events: Optional[List], version: int):
+        # Marked seen first: a listener that reads back from the store must
+        # not try to replay these same events under _version_lock.
+        self._seen_version = max(self._seen_version, version)
+        self._emit_at(str(version), [('reset', None, [], [])] if events is None else events)
+
+    def _state_version(self) -> str:
+        return str(self._read_version(self._conn()))
+
+    @contextmanager
+    def _reading(self):
+        with self._rwlock.read():
+            conn = self._conn()
+            if self._listeners:
+                version = self._read_version(conn)
+                if version != self._seen_version:
+                    with self._version_lock:
+                        # Another process committed since we last looked.
+                        if version > self._seen_version:
+                            self._publish(self._missed_changes(conn, version), version)
+            yield conn
+
+    @contextmanager
+    def _transaction(self):
+        with self._rwlock.write():
+            conn = self._conn()
+            conn.execute('BEGIN IMMEDIATE')
+            events = []
+            try:
+                yield conn, events
+                if events:
+                    conn.execute("UPDATE _meta SET value = value + 1 WHERE key = 'version'")
+                    version = self._read_version(conn)
+                    conn.execute('INSERT INTO _changes (version, events) VALUES (?, ?)',
+                                 (version, json.dumps(events, separators=(',', ':'))))
+                    if version % 100 == 0:
+                        conn.execute('DELETE FROM _changes WHERE version <= ?', (version - self.change_log,))
+                    with self._version_lock:
+                        missed = self._missed_changes(conn, version - 1)
+                conn.execute('COMMIT')
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            # Listeners only hear about writes that are durable. The write
+            # lock keeps in-process readers out until they have.
+            if events:
+                with self._version_lock:
+                    self._publish(None if missed is None else missed + events, version)
+
+    def _ensure_collection(self, collection: str):
+        if collection in self._tables:
+            return
+        table = _identifier(collection)
+        self._conn().execute(
+            f'CREATE TABLE IF NOT EXISTS "{table}" ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+            '_id TEXT NOT NULL UNIQUE, '
+            'doc TEXT NOT NULL)'
+        )
+        self._tables.add(collection)
+
+    def create_index(self, collection: str, fields: Tuple[str, ...]):
+        self._ensure_collection(collection)
+        fields = tuple(fields)
+        if fields == ('_id',):
+            return
+        name = f'idx_{collection}_' + '_'.join(_identifier(f) for f in fields)
+        columns = ', '.join(_field_expr(f) for f in fields)
+        self._conn().execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{collection}" ({columns})')
+
+    @staticmethod
+    def _where(query: Dict) -> Tuple[str, List[Any]]:
+        clauses = []
+        params = []
+        for key, value in query.items():
+            expr = _field_expr(key)
+            if value is None:
+                if key == '_id':
+                    clauses.append('0')
+                else:
+                    clauses.append(f"json_type(doc, '$.{key}') = 'null'")
+            elif isinstance(value, (dict, list)):
+                clauses.append(f'{expr} = json(?)')
+                params.append(json.dumps(value))
+            else:
+                clauses.append(f'{expr} = ?')
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    @staticmethod
+    def _dumps(document: Dict) -> str:
+        return json.dumps(document, separators=(',', ':'))
+
+    def insert(self, collection: str, document: Dict) -> Dict:
+        self._ensure_collection(collection)
+        if '_id' not in document:
+            document['_id'] = str(uuid.uuid4())
+        document['created_at'] = datetime.now().isoformat()
+        document['updated_at'] = datetime.now().isoformat()
+        with self._transaction() as (conn, events):
+            row = conn.execute(f'SELECT doc FROM "{collection}" WHERE _id = ?', (document['_id'],)).fetchone()
+            conn.execute(
+                f'INSERT INTO "{collection}" (_id, doc) VALUES (?, ?) '
+                'ON CONFLICT(_id) DO UPDATE SET doc = excluded.doc',
+                (document['_id'], self._dumps(document))
+            )
+            events.append(('insert', collection, [json.loads(row[0])] if row else [], [document]))
+        return document
+
+    def _put_many(self, conn: sqlite3.Connection, events: List, collection: str, documents: List[Dict]):
+        existing = {}
+        ids = [document['_id'] for document in documents]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = conn.execute(f'SELECT _id, doc FROM "{collection}" WHERE _id IN ({",".join("?" * len(chunk))})',
+                                chunk).fetchall()
+            existing.update((doc_id, json.loads(raw)) for doc_id, raw in rows)
+        conn.executemany(
+            f'INSERT INTO "{collection}" (_id, doc) VALUES (?, ?) '
+            'ON CONFLICT(_id) DO UPDATE SET doc = excluded.doc',
+            [(document['_id'], self._dumps(document)) for document in documents]
+        )
+        inserted = [document for document in documents if document['_id'] not in existing]
+        replaced = [document for document in documents if document['_id'] in existing]
+        if inserted:
+            events.append(('insert', collection, [], inserted))
+        if replaced:
+            events.append(('update', collection, [existing[document['_id']] for document in replaced], replaced))
+
+    def insert_many(self, collection: str, documents: List[Dict]) -> List[Dict]:
+        self._ensure_collection(collection)
+        now = datetime.now().isoformat()
+        for document in documents:
+            if '_id' not in document:
+                document['_id'] = str(uuid.uuid4())
+            document['created_at'] = now
+            document['updated_at'] = now
+        if documents:
+            with self._transaction() as (conn, events):
+                self._put_many(conn, events, collection, documents)
+        return documents
+
+    def upsert_many(self, collection: str, documents: List[Dict],
+                    key: Tuple[str, ...]) -> Tuple[List[Dict], List[Dict]]:
+        self._ensure_collection(collection)
+        now = datetime.now().isoformat()
+        batch = {}
+        inserted_keys = set()
+        with self._transaction() as (conn, events):
+            for document in documents:
+                values = tuple(document.get(field) for field in key)
+                current = batch.get(values)
+                if current is None:
+                    where, params = self._where(dict(zip(key, values)))
+                    row = conn.execute(f'SELECT doc FROM "{collection}"{where} ORDER BY seq LIMIT 1', params).fetchone()
+                    current = json.loads(row[0]) if row else None
+                if current is None:
+                    current = {'_id': str(uuid.uuid4()), 'created_at': now}
+                    inserted_keys.add(values)
+                merged = dict(current)
+                merged.update({k: v for k, v in document.items() if k not in ('_id', 'created_at')})
+                merged['updated_at'] = now
+                batch[values] = merged
+            if batch:
+                self._put_many(conn, events, collection, list(batch.values()))
+        return ([doc for values, doc in batch.items() if values in inserted_keys],
+                [doc for values, doc in batch.items() if values not in inserted_keys])
+
+    @staticmethod
+    def _after(expr: str, descending: bool, after: Tuple[Any, str]) -> Tuple[str, List[Any]]:
+        value, last_id = after
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, separators=(',', ':'))
+        # NULL sorts first in SQLite, so it is the bottom of the order.
+        if value is None:
+            if descending:
+                return f'({expr} IS NULL AND _id < ?)', [last_id]
+            return f'({expr} IS NOT NULL OR _id > ?)', [last_id]
+        if descending:
+            return f'({expr} < ? OR {expr} IS NULL OR ({expr} = ? AND _id < ?))', [value, value, last_id]
+        return f'({expr} > ? OR ({expr} = ? AND _id > ?))', [value, value, last_id]
+
+    def _select_sql(self, collection: str, query: Dict, sort: Optional[str], limit: Optional[int],
+                    after: Optional[Tuple[Any, str]]) -> Tuple[str, List[Any]]:
+        if after is not None and sort is None:
+            raise ValueError('after requires sort')
+        self._ensure_collection(collection)
+        where, params = self._where(query)
+        order = 'seq'
+        if sort is not None:
+            field, descending = parse_sort(sort)
+            expr = _field_expr(field)
+            direction = 'DESC' if descending else 'ASC'
+            order = f'{expr} {direction}, _id {direction}'
+            if after is not None:
+                clause, after_params = self._after(expr, descending, after)
+                where = f'{where} AND {clause}' if where else f' WHERE {clause}'
+                params = params + after_params
+        sql = f'SELECT doc FROM "{collection}"{where} ORDER BY {order}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params = params + [int(limit)]
+        return sql, params
+
+    def find(self, collection: str, query: Dict, sort: Optional[str] = None, limit: Optional[int] = None,
+             after: Optional[Tuple[Any, str]] = None, projection: Optional[List[str]] = None) -> List[Dict]:
+        sql, params = self._select_sql(collection, query, sort, limit, after)
+        with self._reading() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return project((json.loads(row[0]) for row in rows), projection)
+
+    def iter_find(self, collection: str, query: Dict, sort: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[Tuple[Any, str]] = None, projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        sql, params = self._select_sql(collection, query, sort, limit, after)
+        return iter_project(self._iter_rows(sql, params), projection)
+
+    def _iter_rows(self, sql: str, params: List[Any]) -> Iterator[Dict]:
+        self.refresh()
+        # A private connection keeps the read transaction open for as long as
+        # the consumer iterates without tying up this thread's connection.
+        # WAL mode lets writers commit meanwhile; this cursor keeps its snapshot.
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.loads(row[0])
+        finally:
+            conn.close()
+
+    def _range_sql(self, collection: str, query: Dict, field: str, start: Any, end: Any,
+                   limit: Optional[int], after: Optional[Tuple[Any, str]]) -> Tuple[str, List[Any]]:
+        self._ensure_collection(collection)
+        where, params = self._where(query)
+        expr = _field_expr(field)
+        clauses = [f'{expr} IS NOT NULL']
+        if start is not None:
+            clauses.append(f'{expr} >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append(f'{expr} < ?')
+            params.append(end)
+        if after is not None:
+            clause, after_params = self._after(expr, False, after)
+            clauses.append(clause)
+            params.extend(after_params)
+        # Served by the (group fields..., field) index from SORTED_INDEXES.
+        where = (where + ' AND ' if where else ' WHERE ') + ' AND '.join(clauses)
+        sql = f'SELECT doc FROM "{collection}"{where} ORDER BY {expr} ASC, _id ASC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        return sql, params
+
+    def find_range(self, collection: str, query: Dict, field: str, start: Any = None, end: Any = None,
+                   limit: Optional[int] = None, after: Optional[Tuple[Any, str]] = None,
+                   projection: Optional[List[str]] = None) -> List[Dict]:
+        sql, params = self._range_sql(collection, query, field, start, end, limit, after)
+        with self._reading() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return project((json.loads(row[0]) for row in rows), projection)
+
+    def iter_find_range(self, collection: str, query: Dict, field: str, start: Any = None, end: Any = None,
+                        limit: Optional[int] = None, after: Optional[Tuple[Any, str]] = None,
+                        projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        sql, params = self._range_sql(collection, query, field, start, end, limit, after)
+        return iter_project(self._iter_rows(sql, params), projection)
+
+    def find_one(self, collection: str, query: Dict) -> Optional[Dict]:
+        self._ensure_collection(collection)
+        where, params = self._where(query)
+        with self._reading() as conn:
+            row = conn.execute(f'SELECT doc FROM "{collection}"{where} ORDER BY seq LIMIT 1', params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, collection: str, query: Dict, update: Dict) -> int:
+        self._ensure_collection(collection)
+        update = {k: v for k, v in update.items() if k != '_id'}
+        update['updated_at'] = datetime.now().isoformat()
+        where, params = self._where(query)
+        with self._transaction() as (conn, events):
+            rows = conn.execute(f'SELECT seq, doc FROM "{collection}"{where} ORDER BY seq', params).fetchall()
+            old_docs = []
+            new_docs = []
+            changes = []
+            for seq, raw in rows:
+                old_docs.append(json.loads(raw))
+                doc = json.loads(raw)
+                doc.update(update)
+                new_docs.append(doc)
+                changes.append((self._dumps(doc), seq))
+            conn.executemany(f'UPDATE "{collection}" SET doc = ? WHERE seq = ?', changes)
+            if changes:
+                events.append(('update', collection, old_docs, new_docs))
+        return len(changes)
+
+    def increment(self, collection: str, query: Dict, deltas: Dict[str, float],
+                  defaults: Optional[Dict] = None, derive: Optional[Callable[[Dict], Dict]] = None) -> Optional[Dict]:
+        self._ensure_collection(collection)
+        where, params = self._where(query)
+        now = datetime.now().isoformat()
+        with self._transaction() as (conn, events):
+            row = conn.execute(f'SELECT seq, doc FROM "{collection}"{where} ORDER BY seq LIMIT 1', params).fetchone()
+            if row is not None:
+                old_doc = json.loads(row[1])
+                doc = dict(old_doc)
+                for k, v in deltas.items():
+                    doc[k] = (doc.get(k) or 0) + v
+                if derive is not None:
+                    doc.update(derive(dict(doc)))
+                doc['updated_at'] = now
+                conn.execute(f'UPDATE "{collection}" SET doc = ? WHERE seq = ?', (self._dumps(doc), row[0]))
+                events.append(('update', collection, [old_doc], [doc]))
+                return doc
+            if defaults is None:
+                return None
+            doc = dict(defaults)
+            for k, v in deltas.items():
+                doc[k] = (doc.get(k) or 0) + v
+            if derive is not None:
+                doc.update(derive(dict(doc)))
+            doc.setdefault('_id', str(uuid.uuid4()))
+            doc['created_at'] = now
+            doc['updated_at'] = now
+            conn.execute(f'INSERT INTO "{collection}" (_id, doc) VALUES (?, ?)', (doc['_id'], self._dumps(doc)))
+            events.append(('insert', collection, [], [doc]))
+            return doc
+
+    def delete(self, collection: str, query: Dict) -> int:
+        self._ensure_collection(collection)
+        where, params = self._where(query)
+        with self._transaction() as (conn, events):
+            rows = conn.execute(f'SELECT seq, doc FROM "{collection}"{where} ORDER BY seq', params).fetchall()
+            conn.executemany(f'DELETE FROM "{collection}" WHERE seq = ?', [(seq,) for seq, _ in rows])
+            if rows:
+                events.append(('delete', collection, [json.loads(raw) for _, raw in rows], []))
+        return len(rows)
+
+    def delete_cascade(self, collection: str, query: Dict) -> Dict[str, int]:
+        self._ensure_collection(collection)
+        where, params = self._where(query)
+        with self._transaction() as (conn, events):
+            parents = [json.loads(raw) for (raw,) in
+                       conn.execute(f'SELECT doc FROM "{collection}"{where} ORDER BY seq', params).fetchall()]
+            if not parents:
+                return {}
+
+            def lookup(child, field, ids):
+                # Same json_extract expression as the field's index.
+                docs = []
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    rows = conn.execute(f'SELECT doc FROM "{child}" WHERE {_field_expr(field)} '
+                                        f'IN ({",".join("?" * len(chunk))}) ORDER BY seq', chunk).fetchall()
+                    docs.extend(json.loads(raw) for (raw,) in rows)
+                return docs
+
+            doomed = collect_dependents(collection, parents, lookup)
+            for name, docs in doomed.items():
+                conn.executemany(f'DELETE FROM "{name}" WHERE _id = ?', [(doc['_id'],) for doc in docs])
+                events.append(('delete', name, docs, []))
+        return {name: len(docs) for name, docs in doomed.items()}
+
+    def get_all(self, collection: str) -> List[Dict]:
+        return self.find(collection, {})
+
+    def refresh(self):
+        with self._reading():
+            pass
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
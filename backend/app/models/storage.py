@@ -0,0 +1,213 @@
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = [
+    'users',
+    'subjects',
+    'marks',
+    'assignments',
+    'attendance',
+    'study_sessions',
+    'notifications',
+    'gamification'
+]
+
+DEFAULT_INDEXES = {
+    'users': [('email',)],
+    'subjects': [('user_id',)],
+    'marks': [('user_id',), ('subject_id',), ('user_id', 'subject_id')],
+    'assignments': [('user_id',), ('subject_id',), ('user_id', 'subject_id')],
+    'attendance': [('user_id',), ('subject_id',), ('user_id', 'subject_id'), ('user_id', 'subject_id', 'date')],
+    'study_sessions': [('user_id',), ('subject_id',), ('user_id', 'subject_id')],
+    'notifications': [('user_id',)],
+    'gamification': [('user_id',)]
+}
+
+# (group fields, field): documents are kept ordered by field within each
+# group, so find_range over one user's dates reads only the matching slice.
+SORTED_INDEXES = {
+    'attendance': [(('user_id',), 'date')],
+    'study_sessions': [(('user_id',), 'date')]
+}
+
+# Collections whose documents point at a parent document by id. Deleting
+# parents with delete_cascade removes these dependents too.
+RELATIONS = {
+    'users': [(name, 'user_id') for name in COLLECTIONS if name != 'users'],
+    'subjects': [('marks', 'subject_id'), ('attendance', 'subject_id'),
+                 ('assignments', 'subject_id'), ('study_sessions', 'subject_id')]
+}
+
+def collect_dependents(collection: str, parents: List[Dict],
+                       lookup: Callable[[str, str, List[str]], List[Dict]]) -> Dict[str, List[Dict]]:
+    # Walks RELATIONS from the parents; lookup(child, field, ids) returns the
+    # child documents whose field is one of ids. Every document is visited
+    # once, so the work is proportional to the number of affected rows.
+    found = {collection: {doc['_id']: doc for doc in parents}}
+    pending = [(collection, parents)]
+    while pending:
+        parent_collection, docs = pending.pop()
+        ids = [doc['_id'] for doc in docs]
+        for child, field in RELATIONS.get(parent_collection, []):
+            seen = found.setdefault(child, {})
+            added = []
+            for doc in lookup(child, field, ids):
+                if doc['_id'] not in seen:
+                    seen[doc['_id']] = doc
+                    added.append(doc)
+            if added:
+                pending.append((child, added))
+    return {name: list(docs.values()) for name, docs in found.items() if docs}
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    if sort.startswith('-'):
+        return sort[1:], True
+    return sort.lstrip('+'), False
+
+def sort_key(value: Any) -> Tuple[int, Any]:
+    # Same ordering SQLite applies to json_extract results:
+    # missing/null < numbers < text.
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (2, json.dumps(value, separators=(',', ':')))
+
+def project(docs: Iterable[Dict], fields: Optional[Iterable[str]]) -> List[Dict]:
+    return list(iter_project(docs, fields))
+
+def iter_project(docs: Iterable[Dict], fields: Optional[Iterable[str]]) -> Iterator[Dict]:
+    if fields is None:
+        return iter(docs)
+    fields = ['_id'] + [f for f in fields if f != '_id']
+    return ({f: doc[f] for f in fields if f in doc} for doc in docs)
+
+class StorageBackend:
+    def __init__(self):
+        self._listeners: List[Callable] = []
+        self._emitting = threading.local()
+
+    def add_listener(self, callback: Callable):
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _emit(self, op: str, collection: Optional[str], old: List[Dict], new: List[Dict]):
+        # Listeners receive (op, collection, old_docs, new_docs). A 'reset' op
+        # means the data changed in ways that were not observed one by one
+        # (e.g. another process rewrote it) and derived state must be dropped.
+        for callback in self._listeners:
+            try:
+                callback(op, collection, old, new)
+            except Exception:
+                logger.exception('Database change listener failed')
+
+    def _emit_at(self, version: str, events: List):
+        self._emitting.version = version
+        try:
+            for event in events:
+                self._emit(*event)
+        finally:
+            self._emitting.version = None
+
+    def version(self) -> str:
+        # Names the committed state the same way in every process sharing the
+        # files, so it can back cross-process ETags. Inside a listener it
+        # names the state the reported change leads to.
+        version = getattr(self._emitting, 'version', None)
+        if version is not None:
+            return version
+        with self._reading():
+            return self._state_version()
+
+    def _state_version(self) -> str:
+        raise NotImplementedError
+
+    def insert(self, collection: str, document: Dict) -> Dict:
+        raise NotImplementedError
+
+    def insert_many(self, collection: str, documents: List[Dict]) -> List[Dict]:
+        # Inserts the whole batch in one write (one journal entry or one
+        # transaction) and notifies listeners once.
+        raise NotImplementedError
+
+    def upsert_many(self, collection: str, documents: List[Dict],
+                    key: Tuple[str, ...]) -> Tuple[List[Dict], List[Dict]]:
+        # Matches each document to a stored one by the key fields: matches are
+        # updated with the document's fields, the rest inserted. Later
+        # documents in the batch win over earlier ones with the same key.
+        # Returns (inserted, updated), all in one write.
+        raise NotImplementedError
+
+    def find(self, collection: str, query: Dict, sort: Optional[str] = None, limit: Optional[int] = None,
+             after: Optional[Tuple[Any, str]] = None, projection: Optional[List[str]] = None) -> List[Dict]:
+        # sort is a field name, prefixed with '-' for descending; ties are
+        # broken by _id. after=(sort_value, _id) resumes just past that
+        # document, so sort is required with it. projection keeps only the
+        # listed fields (plus _id) in the returned documents.
+        raise NotImplementedError
+
+    def iter_find(self, collection: str, query: Dict, sort: Optional[str] = None, limit: Optional[int] = None,
+                  after: Optional[Tuple[Any, str]] = None, projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        # Same arguments and order as find, but yields documents lazily so
+        # large results can be streamed without materializing them all.
+        return iter(self.find(collection, query, sort=sort, limit=limit, after=after, projection=projection))
+
+    def find_range(self, collection: str, query: Dict, field: str, start: Any = None, end: Any = None,
+                   limit: Optional[int] = None, after: Optional[Tuple[Any, str]] = None,
+                   projection: Optional[List[str]] = None) -> List[Dict]:
+        # Documents matching query whose field lies in [start, end), either
+        # bound optional, ordered by field then _id. Documents without the
+        # field (or with null) are never returned. after and projection work
+        # as in find, with field as the sort.
+        raise NotImplementedError
+
+    def iter_find_range(self, collection: str, query: Dict, field: str, start: Any = None, end: Any = None,
+                        limit: Optional[int] = None, after: Optional[Tuple[Any, str]] = None,
+                        projection: Optional[List[str]] = None) -> Iterator[Dict]:
+        # Same arguments and order as find_range, yielding lazily like iter_find.
+        return iter(self.find_range(collection, query, field, start=start, end=end, limit=limit,
+                                    after=after, projection=projection))
+
+    def find_one(self, collection: str, query: Dict) -> Optional[Dict]:
+        results = self.find(collection, query)
+        return results[0] if results else None
+
+    def update(self, collection: str, query: Dict, update: Dict) -> int:
+        raise NotImplementedError
+
+    def increment(self, collection: str, query: Dict, deltas: Dict[str, float],
+                  defaults: Optional[Dict] = None, derive: Optional[Callable[[Dict], Dict]] = None) -> Optional[Dict]:
+        # Atomically adds deltas to numeric fields of the first matching
+        # document (missing fields count as 0) and returns the new version.
+        # If nothing matches, defaults plus the deltas are inserted instead;
+        # without defaults, None is returned. derive, if given, is called with
+        # the incremented document and the fields it returns are stored in
+        # the same write, so they are computed from the latest values.
+        raise NotImplementedError
+
+    def delete(self, collection: str, query: Dict) -> int:
+        raise NotImplementedError
+
+    def delete_cascade(self, collection: str, query: Dict) -> Dict[str, int]:
+        # Deletes the matching documents and, following RELATIONS, everything
+        # that depends on them, in a single write. Returns the number of
+        # documents removed per collection.
+        raise NotImplementedError
+
+    def get_all(self, collection: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def create_index(self, collection: str, fields: Tuple[str, ...]):
+        raise NotImplementedError
+
+    def refresh(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,82 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.models.database import db
+from app.utils.ai_helpers import fit_trends, trend_prediction
+
+class TrendStore:
+    def __init__(self, database, max_entries: int = 10000):
+        self.db = database
+        self.max_entries = max_entries
+        # (user_id, subject_id) -> (slope, intercept, count), least recently used first
+        self._coefficients: "OrderedDict[Tuple, Tuple[float, float, int]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        database.subscribe(self.on_change)
+
+    def on_change(self, op, collection, old, new):
+        if op == 'reset':
+            with self._lock:
+                self._coefficients.clear()
+                self._generation += 1
+            return
+        if collection != 'marks':
+            return
+        with self._lock:
+            for doc in old + new:
+                user_id = doc.get('user_id')
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                self._coefficients.pop((user_id, doc.get('subject_id')), None)
+
+    def _fit(self, user_id, subject_ids: Optional[List] = None) -> Dict:
+        self.db.refresh()
+        with self._lock:
+            keys = [(user_id, s) for s in subject_ids] if subject_ids is not None else None
+            if keys is not None and all(key in self._coefficients for key in keys):
+                for key in keys:
+                    self._coefficients.move_to_end(key)
+                return {key[1]: self._coefficients[key] for key in keys}
+            version = self._versions.get(user_id, 0)
+            generation = self._generation
+
+        if subject_ids is not None and len(subject_ids) == 1:
+            marks = self.db.find('marks', {'user_id': user_id, 'subject_id': subject_ids[0]})
+        else:
+            marks = self.db.find('marks', {'user_id': user_id})
+        histories = {subject_id: [] for subject_id in subject_ids or ()}
+        for mark in marks:
+            if subject_ids is None or mark.get('subject_id') in histories:
+                histories.setdefault(mark.get('subject_id'), []).append(mark['percentage'])
+
+        slopes, intercepts = fit_trends(list(histories.values()))
+        fitted = {}
+        for (subject_id, history), slope, intercept in zip(histories.items(), slopes, intercepts):
+            fitted[subject_id] = (float(slope), float(intercept), len(history))
+
+        with self._lock:
+            # Only cache the fit if no mark for this user was written while it
+            # was reading; otherwise it may be stale and is returned uncached.
+            if self._versions.get(user_id, 0) == version and self._generation == generation:
+                for subject_id, coefficients in fitted.items():
+                    self._coefficients[(user_id, subject_id)] = coefficients
+                    self._coefficients.move_to_end((user_id, subject_id))
+                while len(self._coefficients) > self.max_entries:
+                    self._coefficients.popitem(last=False)
+        return fitted
+
+    def predict(self, user_id: str, subject_id: str) -> Optional[Dict]:
+        slope, intercept, count = self._fit(user_id, [subject_id])[subject_id]
+        if count < 2:
+            return None
+        return trend_prediction(slope, intercept, count)
+
+    def predict_all(self, user_id: str, subject_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        predictions = {}
+        for subject_id, (slope, intercept, count) in self._fit(user_id, subject_ids).items():
+            if count >= 2:
+                predictions[subject_id] = trend_prediction(slope, intercept, count)
+        return predictions
+
+trends = TrendStore(db, max_entries=int(os.getenv('TREND_CACHE_SIZE', 10000)))
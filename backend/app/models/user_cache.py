@@ -0,0 +1,63 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from app.models.database import db
+
+class UserCache:
+    def __init__(self, database, max_entries: int = 10000):
+        self.db = database
+        self.max_entries = max_entries
+        self._users: "OrderedDict[str, Dict]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        database.subscribe(self.on_change)
+
+    def on_change(self, op, collection, old, new):
+        with self._lock:
+            if op == 'reset':
+                self._users.clear()
+                self._generation += 1
+                return
+            if collection != 'users':
+                return
+            self._generation += 1
+            for doc in old + new:
+                if self._users.pop(doc['_id'], None) is not None:
+                    self.invalidations += 1
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return user
+            self.misses += 1
+            generation = self._generation
+        user = self.db.find_one('users', {'_id': user_id})
+        with self._lock:
+            # Skip caching if a users write landed during the lookup; it may
+            # have been missed by the read.
+            if user is not None and self._generation == generation:
+                self._users[user_id] = user
+                while len(self._users) > self.max_entries:
+                    self._users.popitem(last=False)
+        return user
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._users),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'invalidations': self.invalidations
+            }
+
+user_cache = UserCache(db, max_entries=int(os.getenv('USER_CACHE_SIZE', 10000)))
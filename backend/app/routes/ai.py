@@ -1,12 +1,23 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.database import db
-from app.utils.ai_helpers import predict_grade, get_weak_subjects, generate_study_plan, chat_with_mentor
-from app.utils.ocr_helper import extract_marks_from_image
+from app.utils.ai_helpers import FINAL_EXAM_FEATURES, percentage_to_grade, get_weak_subjects, generate_study_plan, chat_with_mentor
+from app.utils.ocr_helper import PDF_SUPPORT, combine_results, extract_marks_from_image, is_pdf, pdf_page_count, split_pdf
+from app.utils.cache import response_cache
+from app.models.trends import trends
+from app.models.feature_store import feature_store
+from app.utils.model_registry import model_registry
+from app.utils.batching import grade_batcher
+from app.utils.jobs import QueueFull, ocr_jobs
+import hashlib
 import os
+from functools import partial
 
 bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 
+PREDICT_TIMEOUT = float(os.getenv('PREDICT_TIMEOUT', 10))
+OCR_MAX_WAIT = 30
+
 @bp.route('/predict-grade', methods=['POST'])
 @jwt_required()
 def predict_student_grade():
@@ -14,21 +25,71 @@ def predict_student_grade():
     data = request.json
     
     subject_id = data.get('subject_id')
-    marks = db.find('marks', {'user_id': user_id, 'subject_id': subject_id})
+    prediction = trends.predict(user_id, subject_id)
     
-    if len(marks) < 2:
+    if prediction is None:
         return jsonify({'error': 'Need at least 2 marks entries for prediction'}), 400
     
-    prediction = predict_grade(marks)
-    
     return jsonify({
         'predicted_grade': prediction['grade'],
         'predicted_percentage': prediction['percentage'],
         'confidence': prediction['confidence']
     }), 200
 
+@bp.route('/predict-grades', methods=['GET'])
+@jwt_required()
+def predict_all_grades():
+    user_id = get_jwt_identity()
+    
+    subjects = db.find('subjects', {'user_id': user_id})
+    predictions = trends.predict_all(user_id, [subject['_id'] for subject in subjects])
+    
+    results = []
+    for subject in subjects:
+        prediction = predictions.get(subject['_id'])
+        if prediction:
+            results.append({
+                'subject_id': subject['_id'],
+                'subject_name': subject['name'],
+                'predicted_grade': prediction['grade'],
+                'predicted_percentage': prediction['percentage'],
+                'confidence': prediction['confidence']
+            })
+    
+    return jsonify(results), 200
+
+@bp.route('/predict-final', methods=['GET'])
+@jwt_required()
+def predict_final_scores():
+    user_id = get_jwt_identity()
+    
+    if model_registry.get('grade') is None:
+        return jsonify({'error': 'Grade prediction model is not available. Train it with ml/train_model.py'}), 503
+    
+    subjects = {subject['_id']: subject for subject in db.find('subjects', {'user_id': user_id})}
+    subject_ids, rows = feature_store.rows(user_id, list(subjects))
+    
+    results = []
+    if len(rows):
+        try:
+            scores = grade_batcher.predict(rows, timeout=PREDICT_TIMEOUT)
+        except Exception as e:
+            return jsonify({'error': f'Prediction failed: {e}'}), 503
+        for subject_id, features, score in zip(subject_ids, rows, scores):
+            score = float(score)
+            results.append({
+                'subject_id': subject_id,
+                'subject_name': subjects[subject_id]['name'],
+                'features': {name: round(float(value), 2) for name, value in zip(FINAL_EXAM_FEATURES, features)},
+                'predicted_score': round(score, 2),
+                'predicted_grade': percentage_to_grade(score)
+            })
+    
+    return jsonify(results), 200
+
 @bp.route('/weak-subjects', methods=['GET'])
 @jwt_required()
+@response_cache.cached
 def get_weak_subjects_api():
     user_id = get_jwt_identity()
     
@@ -74,32 +135,85 @@ def ocr_marks():
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'}), 400
     
-    file = request.files['file']
+    files = [file for file in request.files.getlist('file') if file.filename != '']
     
-    if file.filename == '':
+    if not files:
         return jsonify({'error': 'No file selected'}), 400
     
-    upload_folder = 'uploads'
-    os.makedirs(upload_folder, exist_ok=True)
+    # Uploads stay in memory and are sent to the workers as bytes. Every image
+    # and every PDF page is its own task, keyed by a hash of its content so a
+    # re-upload of the same sheet is answered from the result cache.
+    uploads = []
+    for file in files:
+        data = file.read()
+        pages = None
+        if is_pdf(data):
+            if not PDF_SUPPORT:
+                return jsonify({'error': 'PDF uploads are not supported on this server; upload images instead'}), 415
+            try:
+                pages = pdf_page_count(data)
+            except Exception as e:
+                return jsonify({'error': f'Could not read {file.filename}: {str(e)}'}), 400
+        uploads.append((file.filename, data, pages))
+    
+    tasks = sum(pages or 1 for _, _, pages in uploads)
+    if tasks > ocr_jobs.max_pending:
+        return jsonify({'error': f'Upload has {tasks} pages; at most {ocr_jobs.max_pending} can be read at once'}), 413
+    
+    parts = []
+    labels = []
+    for filename, data, pages in uploads:
+        digest = hashlib.sha256(data).hexdigest()
+        if pages is None:
+            parts.append((digest, (data,)))
+            labels.append((filename, None))
+            continue
+        try:
+            for page, page_data in enumerate(split_pdf(data), 1):
+                parts.append((f'{digest}:{page}', (page_data,)))
+                labels.append((filename, page))
+        except Exception as e:
+            return jsonify({'error': f'Could not read {filename}: {str(e)}'}), 400
     
-    file_path = os.path.join(upload_folder, file.filename)
-    file.save(file_path)
+    try:
+        job = ocr_jobs.submit(user_id, ', '.join(file.filename for file in files), extract_marks_from_image,
+                              parts, combine=partial(combine_results, labels=labels))
+    except QueueFull as e:
+        return jsonify({'error': f'OCR queue is full, try again shortly ({e})'}), 503
     
+    return _ocr_job_response(job.id, user_id)
+
+@bp.route('/ocr-jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_ocr_job(job_id):
+    return _ocr_job_response(job_id, get_jwt_identity())
+
+def _ocr_job_response(job_id, user_id):
+    # ?wait=N holds the request for up to N seconds until the job finishes,
+    # so clients can long-poll instead of polling in a tight loop.
     try:
-        extracted_data = extract_marks_from_image(file_path)
-        os.remove(file_path)
-        
-        return jsonify({
-            'message': 'Marks extracted successfully',
-            'data': extracted_data
-        }), 200
-    except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        return jsonify({'error': str(e)}), 500
+        wait = min(float(request.args.get('wait', 0)), OCR_MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    
+    job = ocr_jobs.get(job_id, user_id, wait=wait)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job['status'] == 'done':
+        job['message'] = 'Marks extracted successfully'
+        job['data'] = job.pop('result')
+        return jsonify(job), 200
+    if job['status'] in ('failed', 'timeout'):
+        return jsonify(job), 500
+    
+    response = jsonify(job)
+    response.headers['Location'] = url_for('ai.get_ocr_job', job_id=job_id)
+    return response, 202
 
 @bp.route('/insights', methods=['GET'])
 @jwt_required()
+@response_cache.cached
 def get_insights():
     user_id = get_jwt_identity()
     
@@ -1,22 +1,34 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.database import db
+from app.models.gamification import gamification
+from app.utils.etags import data_versions
+from app.utils.pagination import paginated_find, with_cursor
 from datetime import datetime
 
 bp = Blueprint('assignments', __name__, url_prefix='/api/assignments')
 
 @bp.route('/', methods=['GET'])
 @jwt_required()
+@data_versions.conditional('assignments')
 def get_assignments():
     user_id = get_jwt_identity()
-    assignments = db.find('assignments', {'user_id': user_id})
+    assignments, next_cursor = paginated_find('assignments', {'user_id': user_id})
+    now = datetime.now()
+    next_change = None
     
-    for assignment in assignments:
-        if assignment['deadline']:
+    for i, assignment in enumerate(assignments):
+        if assignment.get('deadline'):
             deadline = datetime.fromisoformat(assignment['deadline'].replace('Z', '+00:00'))
-            assignment['is_overdue'] = deadline < datetime.now()
+            # Copy rather than annotate: the storage engine may hand out shared documents.
+            assignments[i] = assignment = dict(assignment, is_overdue=deadline < now)
+            if not assignment['is_overdue'] and (next_change is None or deadline < next_change):
+                next_change = deadline
     
-    return jsonify(assignments), 200
+    if next_change is not None:
+        g.etag_expires = next_change.timestamp()
+    
+    return with_cursor(jsonify(assignments), next_cursor), 200
 
 @bp.route('/', methods=['POST'])
 @jwt_required()
@@ -51,9 +63,7 @@ def update_assignment(assignment_id):
     db.update('assignments', {'_id': assignment_id}, data)
     
     if data.get('status') == 'completed':
-        user = db.find_one('users', {'_id': user_id})
-        new_xp = user.get('xp', 0) + 25
-        db.update('users', {'_id': user_id}, {'xp': new_xp})
+        gamification.award(user_id, xp=25, assignments_completed=1)
     
     updated_assignment = db.find_one('assignments', {'_id': assignment_id})
     return jsonify(updated_assignment), 200
@@ -1,15 +1,24 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.database import db
+from app.utils.etags import data_versions
+from app.utils.bulk import bulk_rows, validate_rows
+from app.utils.pagination import heatmap_range, paginated_find, streamed_find, with_cursor
+from app.utils.streaming import stream_format, stream_response
+from app.models.aggregates import aggregates
 
 bp = Blueprint('attendance', __name__, url_prefix='/api/attendance')
 
 @bp.route('/', methods=['GET'])
 @jwt_required()
+@data_versions.conditional('attendance')
 def get_attendance():
     user_id = get_jwt_identity()
-    attendance = db.find('attendance', {'user_id': user_id})
-    return jsonify(attendance), 200
+    if stream_format():
+        return stream_response(streamed_find('attendance', {'user_id': user_id}, range_field='date'))
+    
+    attendance, next_cursor = paginated_find('attendance', {'user_id': user_id}, range_field='date')
+    return with_cursor(jsonify(attendance), next_cursor), 200
 
 @bp.route('/', methods=['POST'])
 @jwt_required()
@@ -38,20 +47,36 @@ def mark_attendance():
     created_record = db.insert('attendance', attendance_record)
     return jsonify(created_record), 201
 
-@bp.route('/stats/<subject_id>', methods=['GET'])
+@bp.route('/bulk', methods=['POST'])
 @jwt_required()
-def get_attendance_stats(subject_id):
+def mark_attendance_bulk():
     user_id = get_jwt_identity()
-    records = db.find('attendance', {'user_id': user_id, 'subject_id': subject_id})
     
-    total = len(records)
-    present = len([r for r in records if r['status'] == 'present'])
+    def build(row):
+        if not row.get('subject_id') or not row.get('date') or not row.get('status'):
+            raise ValueError('subject_id, date and status are required')
+        return {
+            'user_id': user_id,
+            'subject_id': row.get('subject_id'),
+            'date': row.get('date'),
+            'status': row.get('status')
+        }
     
-    percentage = (present / total * 100) if total > 0 else 0
+    # One record per subject and day: existing ones get the new status.
+    created, updated = db.upsert_many('attendance', validate_rows(bulk_rows('records'), build),
+                                      ('user_id', 'subject_id', 'date'))
     
-    return jsonify({
-        'total': total,
-        'present': present,
-        'absent': total - present,
-        'percentage': round(percentage, 2)
-    }), 200
+    return jsonify({'created': created, 'updated': updated}), 201 if created else 200
+
+@bp.route('/stats/<subject_id>', methods=['GET'])
+@jwt_required()
+def get_attendance_stats(subject_id):
+    user_id = get_jwt_identity()
+    return jsonify(aggregates.attendance_stats(user_id, subject_id)), 200
+
+@bp.route('/heatmap', methods=['GET'])
+@jwt_required()
+def get_attendance_heatmap():
+    user_id = get_jwt_identity()
+    start, end, period = heatmap_range()
+    return jsonify(aggregates.attendance_rollup(user_id, start, end, period)), 200
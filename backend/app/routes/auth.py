@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import bcrypt
+from flask_jwt_extended import create_access_token, jwt_required, current_user
+from concurrent.futures import TimeoutError
 from app.models.database import db
+from app.models.gamification import gamification
+from app.utils.passwords import HasherBusy, password_hasher
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -18,11 +20,14 @@ def signup():
     if db.find_one('users', {'email': email}):
         return jsonify({'error': 'User already exists'}), 400
     
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    try:
+        hashed_password = password_hasher.hash(password)
+    except (HasherBusy, TimeoutError):
+        return jsonify({'error': 'Server is busy, try again shortly'}), 503
     
     user = {
         'email': email,
-        'password': hashed_password.decode('utf-8'),
+        'password': hashed_password,
         'name': name,
         'xp': 0,
         'level': 1,
@@ -57,10 +62,20 @@ def login():
     
     user = db.find_one('users', {'email': email})
     
-    if not user or not bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
-        return jsonify({'error': 'Invalid credentials'}), 401
+    try:
+        if not user or not password_hasher.verify(password, user['password']):
+            return jsonify({'error': 'Invalid credentials'}), 401
+        
+        # Hashes made with an older BCRYPT_ROUNDS are upgraded (or downgraded)
+        # while the plain password is at hand.
+        if password_hasher.needs_rehash(user['password']):
+            db.update('users', {'_id': user['_id']}, {'password': password_hasher.hash(password)})
+            password_hasher.record_rehash()
+    except (HasherBusy, TimeoutError):
+        return jsonify({'error': 'Server is busy, try again shortly'}), 503
     
     access_token = create_access_token(identity=user['_id'])
+    user = gamification.merged(user)
     
     return jsonify({
         'message': 'Login successful',
@@ -78,11 +93,7 @@ def login():
 @bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
-    user_id = get_jwt_identity()
-    user = db.find_one('users', {'_id': user_id})
-    
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
+    user = gamification.merged(current_user)
     
     return jsonify({
         '_id': user['_id'],
@@ -1,8 +1,11 @@
-from flask import Blueprint, send_file, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, send_file, jsonify, request, make_response
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 from app.models.database import db
-from app.utils.pdf_generator import generate_report_card
-import os
+from app.models.gamification import gamification
+from app.utils.pdf_generator import report_card_digest, report_cards
+from app.utils.admin import admin_required
+from app.utils.bulk_export import ExportBusy, bulk_exporter, load_cohort
+import io
 
 bp = Blueprint('export', __name__, url_prefix='/api/export')
 
@@ -11,14 +14,54 @@ bp = Blueprint('export', __name__, url_prefix='/api/export')
 def export_report_card():
     user_id = get_jwt_identity()
     
-    user = db.find_one('users', {'_id': user_id})
+    db.refresh()
+    user = gamification.merged(current_user)
     subjects = db.find('subjects', {'user_id': user_id})
     marks = db.find('marks', {'user_id': user_id})
     attendance = db.find('attendance', {'user_id': user_id})
     
-    pdf_path = generate_report_card(user, subjects, marks, attendance)
+    digest = report_card_digest(user, subjects, marks, attendance)
     
-    if os.path.exists(pdf_path):
-        return send_file(pdf_path, as_attachment=True, download_name='report_card.pdf')
-    else:
-        return jsonify({'error': 'Failed to generate report card'}), 500
+    if digest in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(digest)
+        return response
+    
+    try:
+        pdf = report_cards.get_or_render(digest, user, subjects, marks, attendance)
+    except Exception as e:
+        return jsonify({'error': f'Failed to generate report card: {str(e)}'}), 500
+    
+    return send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                     download_name='report_card.pdf', etag=digest)
+
+@bp.route('/report-cards', methods=['GET'])
+@jwt_required()
+@admin_required
+def export_report_cards():
+    gamification.flush()
+    db.refresh()
+    user_ids = [user_id for user_id in request.args.get('user_ids', '').split(',') if user_id]
+    records = load_cohort(db, user_ids or None)
+    try:
+        progress = bulk_exporter.start(records)
+    except ExportBusy as e:
+        return jsonify({'error': f'Export workers are busy, try again shortly ({e})'}), 503
+    
+    response = Response(bulk_exporter.stream_zip(records, progress), mimetype='application/zip')
+    # Frees the slot even if the client goes away before the stream starts.
+    response.call_on_close(lambda: bulk_exporter.finish(progress))
+    response.headers['Content-Disposition'] = 'attachment; filename=report_cards.zip'
+    response.headers['X-Export-Id'] = progress.id
+    return response
+
+@bp.route('/report-cards/<export_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_export_progress(export_id):
+    progress = bulk_exporter.get(export_id)
+    
+    if progress is None:
+        return jsonify({'error': 'Export not found'}), 404
+    
+    return jsonify(progress), 200
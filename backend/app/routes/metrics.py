@@ -0,0 +1,68 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+from app.utils.admin import admin_required
+from app.utils.cache import response_cache
+from app.utils.model_registry import model_registry
+from app.utils.batching import grade_batcher
+from app.utils.jobs import ocr_jobs
+from app.utils.pdf_generator import report_cards
+from app.utils.bulk_export import bulk_exporter
+from app.utils.passwords import password_hasher
+from app.models.user_cache import user_cache
+from app.models.gamification import gamification
+
+bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
+
+@bp.route('/cache', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_cache_metrics():
+    return jsonify(response_cache.stats()), 200
+
+@bp.route('/models', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_model_metrics():
+    return jsonify(model_registry.stats()), 200
+
+@bp.route('/inference', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_inference_metrics():
+    return jsonify(grade_batcher.stats()), 200
+
+@bp.route('/ocr', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_ocr_metrics():
+    return jsonify(ocr_jobs.stats()), 200
+
+@bp.route('/reports', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_report_metrics():
+    return jsonify(report_cards.stats()), 200
+
+@bp.route('/exports', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_export_metrics():
+    return jsonify(bulk_exporter.stats()), 200
+
+@bp.route('/auth', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_auth_metrics():
+    return jsonify(password_hasher.stats()), 200
+
+@bp.route('/users', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_user_cache_metrics():
+    return jsonify(user_cache.stats()), 200
+
+@bp.route('/gamification', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_gamification_metrics():
+    return jsonify(gamification.stats()), 200
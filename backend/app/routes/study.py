@@ -1,16 +1,26 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.database import db
-from datetime import datetime, timedelta
+from app.models.gamification import gamification
+from app.utils.bulk import bulk_rows, validate_rows
+from app.utils.etags import data_versions
+from app.utils.pagination import heatmap_range, paginated_find, streamed_find, with_cursor
+from app.utils.streaming import stream_format, stream_response
+from app.models.aggregates import aggregates
+from datetime import datetime
 
 bp = Blueprint('study', __name__, url_prefix='/api/study')
 
 @bp.route('/sessions', methods=['GET'])
 @jwt_required()
+@data_versions.conditional('study_sessions')
 def get_study_sessions():
     user_id = get_jwt_identity()
-    sessions = db.find('study_sessions', {'user_id': user_id})
-    return jsonify(sessions), 200
+    if stream_format():
+        return stream_response(streamed_find('study_sessions', {'user_id': user_id}, range_field='date'))
+    
+    sessions, next_cursor = paginated_find('study_sessions', {'user_id': user_id}, range_field='date')
+    return with_cursor(jsonify(sessions), next_cursor), 200
 
 @bp.route('/sessions', methods=['POST'])
 @jwt_required()
@@ -28,31 +38,45 @@ def create_study_session():
     
     created_session = db.insert('study_sessions', session)
     
-    user = db.find_one('users', {'_id': user_id})
-    new_xp = user.get('xp', 0) + (data.get('duration', 25) // 5)
-    db.update('users', {'_id': user_id}, {'xp': new_xp})
+    duration = data.get('duration', 25)
+    gamification.award(user_id, xp=duration // 5, study_sessions=1, study_minutes=duration)
     
     return jsonify(created_session), 201
 
-@bp.route('/stats', methods=['GET'])
+@bp.route('/sessions/bulk', methods=['POST'])
 @jwt_required()
-def get_study_stats():
+def create_study_sessions_bulk():
     user_id = get_jwt_identity()
-    sessions = db.find('study_sessions', {'user_id': user_id})
     
-    total_time = sum(s.get('duration', 0) for s in sessions)
+    def build(row):
+        duration = row.get('duration', 25)
+        if isinstance(duration, bool) or not isinstance(duration, int) or duration < 0:
+            raise ValueError('duration must be a non-negative whole number of minutes')
+        return {
+            'user_id': user_id,
+            'subject_id': row.get('subject_id'),
+            'duration': duration,
+            'date': row.get('date', datetime.now().isoformat()),
+            'type': row.get('type', 'pomodoro')
+        }
     
-    today = datetime.now().date().isoformat()
-    today_sessions = [s for s in sessions if s.get('date', '').startswith(today)]
-    today_time = sum(s.get('duration', 0) for s in today_sessions)
+    created_sessions = db.insert_many('study_sessions', validate_rows(bulk_rows('sessions'), build))
     
-    week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-    week_sessions = [s for s in sessions if s.get('date', '') >= week_ago]
+    minutes = sum(session['duration'] for session in created_sessions)
+    gamification.award(user_id, xp=sum(session['duration'] // 5 for session in created_sessions),
+                       study_sessions=len(created_sessions), study_minutes=minutes)
     
-    return jsonify({
-        'total_time': total_time,
-        'total_sessions': len(sessions),
-        'today_time': today_time,
-        'today_sessions': len(today_sessions),
-        'week_sessions': len(week_sessions)
-    }), 200
+    return jsonify(created_sessions), 201
+
+@bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_study_stats():
+    user_id = get_jwt_identity()
+    return jsonify(aggregates.study_stats(user_id)), 200
+
+@bp.route('/heatmap', methods=['GET'])
+@jwt_required()
+def get_study_heatmap():
+    user_id = get_jwt_identity()
+    start, end, period = heatmap_range()
+    return jsonify(aggregates.study_rollup(user_id, start, end, period)), 200
@@ -1,11 +1,17 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.database import db
+from app.models.gamification import gamification
+from app.utils.bulk import bulk_rows, validate_rows
+from app.utils.etags import data_versions
+from app.utils.pagination import paginated_find, streamed_find, with_cursor
+from app.utils.streaming import stream_format, stream_response
 
 bp = Blueprint('subjects', __name__, url_prefix='/api/subjects')
 
 @bp.route('/', methods=['GET'])
 @jwt_required()
+@data_versions.conditional('subjects')
 def get_subjects():
     user_id = get_jwt_identity()
     subjects = db.find('subjects', {'user_id': user_id})
@@ -49,20 +55,23 @@ def update_subject(subject_id):
 def delete_subject(subject_id):
     user_id = get_jwt_identity()
     
-    deleted = db.delete('subjects', {'_id': subject_id, 'user_id': user_id})
-    if deleted == 0:
+    # Marks, attendance, assignments and study sessions of the subject go
+    # with it, in the same write.
+    deleted = db.delete_cascade('subjects', {'_id': subject_id, 'user_id': user_id})
+    if not deleted:
         return jsonify({'error': 'Subject not found'}), 404
     
-    db.delete('marks', {'subject_id': subject_id})
-    
-    return jsonify({'message': 'Subject deleted'}), 200
+    return jsonify({'message': 'Subject deleted', 'deleted': deleted}), 200
 
 @bp.route('/<subject_id>/marks', methods=['GET'])
 @jwt_required()
 def get_subject_marks(subject_id):
     user_id = get_jwt_identity()
-    marks = db.find('marks', {'user_id': user_id, 'subject_id': subject_id})
-    return jsonify(marks), 200
+    if stream_format():
+        return stream_response(streamed_find('marks', {'user_id': user_id, 'subject_id': subject_id}))
+    
+    marks, next_cursor = paginated_find('marks', {'user_id': user_id, 'subject_id': subject_id})
+    return with_cursor(jsonify(marks), next_cursor), 200
 
 @bp.route('/<subject_id>/marks', methods=['POST'])
 @jwt_required()
@@ -82,8 +91,34 @@ def add_marks(subject_id):
     
     created_mark = db.insert('marks', mark)
     
-    user = db.find_one('users', {'_id': user_id})
-    new_xp = user.get('xp', 0) + 10
-    db.update('users', {'_id': user_id}, {'xp': new_xp})
+    gamification.award(user_id, xp=10, marks_added=1)
     
     return jsonify(created_mark), 201
+
+@bp.route('/<subject_id>/marks/bulk', methods=['POST'])
+@jwt_required()
+def add_marks_bulk(subject_id):
+    user_id = get_jwt_identity()
+    
+    def build(row):
+        marks_obtained = row.get('marks_obtained')
+        total_marks = row.get('total_marks')
+        if any(isinstance(x, bool) or not isinstance(x, (int, float)) for x in (marks_obtained, total_marks)):
+            raise ValueError('marks_obtained and total_marks must be numbers')
+        if total_marks <= 0:
+            raise ValueError('total_marks must be positive')
+        return {
+            'user_id': user_id,
+            'subject_id': subject_id,
+            'exam_type': row.get('exam_type'),
+            'marks_obtained': marks_obtained,
+            'total_marks': total_marks,
+            'date': row.get('date'),
+            'percentage': (marks_obtained / total_marks) * 100
+        }
+    
+    created_marks = db.insert_many('marks', validate_rows(bulk_rows('marks'), build))
+    
+    gamification.award(user_id, xp=10 * len(created_marks), marks_added=len(created_marks))
+    
+    return jsonify(created_marks), 201
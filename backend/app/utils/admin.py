@@ -0,0 +1,18 @@
+import os
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import current_user
+
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+
+def is_admin(user):
+    return user.get('email', '').lower() in ADMIN_EMAILS
+
+def admin_required(view):
+    # Goes below jwt_required, which resolves current_user.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
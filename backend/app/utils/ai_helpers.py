@@ -1,9 +1,54 @@
 import numpy as np
-from sklearn.linear_model import LinearRegression
 from datetime import datetime, timedelta
 import joblib
 import os
 
+def fit_trends(histories):
+    # Least-squares line through each history of percentages, indexed 0..n-1,
+    # solved in closed form for all histories at once. Returns slope and
+    # intercept arrays; a single point gets a flat line through it.
+    counts = np.array([len(h) for h in histories], dtype=float)
+    if not len(counts):
+        return np.zeros(0), np.zeros(0)
+    y = np.concatenate([np.asarray(h, dtype=float) for h in histories])
+    group = np.repeat(np.arange(len(counts)), counts.astype(int))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    x = np.arange(len(y)) - np.repeat(starts, counts.astype(int))
+    
+    sum_x = counts * (counts - 1) / 2
+    sum_xx = (counts - 1) * counts * (2 * counts - 1) / 6
+    sum_y = np.bincount(group, weights=y, minlength=len(counts))
+    sum_xy = np.bincount(group, weights=x * y, minlength=len(counts))
+    
+    denominator = counts * sum_xx - sum_x ** 2
+    slope = np.divide(counts * sum_xy - sum_x * sum_y, denominator,
+                      out=np.zeros_like(denominator), where=denominator > 0)
+    intercept = np.divide(sum_y - slope * sum_x, counts, out=np.zeros_like(counts), where=counts > 0)
+    return slope, intercept
+
+def percentage_to_grade(percentage):
+    if percentage >= 90:
+        return 'A+'
+    elif percentage >= 80:
+        return 'A'
+    elif percentage >= 70:
+        return 'B'
+    elif percentage >= 60:
+        return 'C'
+    elif percentage >= 50:
+        return 'D'
+    else:
+        return 'F'
+
+def trend_prediction(slope, intercept, count):
+    predicted_percentage = float(max(0, min(100, intercept + slope * count)))
+    
+    return {
+        'grade': percentage_to_grade(predicted_percentage),
+        'percentage': round(predicted_percentage, 2),
+        'confidence': min(count * 15, 95)
+    }
+
 def predict_grade(marks_history):
     if len(marks_history) < 2:
         return {
@@ -12,37 +57,33 @@ def predict_grade(marks_history):
             'confidence': 0
         }
     
-    X = np.array([[i] for i in range(len(marks_history))])
-    y = np.array([m['percentage'] for m in marks_history])
-    
-    model = LinearRegression()
-    model.fit(X, y)
-    
-    next_index = len(marks_history)
-    predicted_percentage = model.predict([[next_index]])[0]
-    
-    predicted_percentage = max(0, min(100, predicted_percentage))
-    
-    if predicted_percentage >= 90:
-        grade = 'A+'
-    elif predicted_percentage >= 80:
-        grade = 'A'
-    elif predicted_percentage >= 70:
-        grade = 'B'
-    elif predicted_percentage >= 60:
-        grade = 'C'
-    elif predicted_percentage >= 50:
-        grade = 'D'
-    else:
-        grade = 'F'
-    
-    confidence = min(len(marks_history) * 15, 95)
-    
-    return {
-        'grade': grade,
-        'percentage': round(predicted_percentage, 2),
-        'confidence': confidence
-    }
+    slope, intercept = fit_trends([[m['percentage'] for m in marks_history]])
+    return trend_prediction(slope[0], intercept[0], len(marks_history))
+
+FINAL_EXAM_FEATURES = ('midterm1', 'midterm2', 'assignments', 'attendance_pct', 'quizzes')
+
+def final_exam_features(subject_marks, attendance_pct=None):
+    # Feature row for the RandomForest final-exam model. Marks are grouped by
+    # exam_type; anything the student has not recorded yet falls back to the
+    # subject average so a partial history still gets a prediction.
+    if not subject_marks:
+        return None
+    average = sum(m['percentage'] for m in subject_marks) / len(subject_marks)
+    
+    def of_type(word):
+        return [m['percentage'] for m in subject_marks if word in (m.get('exam_type') or '').lower()]
+    
+    def mean(values):
+        return sum(values) / len(values) if values else average
+    
+    midterms = of_type('mid')
+    return [
+        midterms[0] if midterms else average,
+        midterms[1] if len(midterms) > 1 else mean(midterms),
+        mean(of_type('assign')),
+        attendance_pct if attendance_pct is not None else average,
+        mean(of_type('quiz'))
+    ]
 
 def get_weak_subjects(subjects, all_marks):
     weak_subjects = []
@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from app.utils.model_registry import model_registry
+
+class MicroBatcher:
+    def __init__(self, predict, max_batch_size=64, max_wait=0.005):
+        self.predict_fn = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.failures = 0
+        self.largest_batch = 0
+        self.queue_wait = 0.0
+        self.predict_time = 0.0
+
+    def _ensure_worker(self):
+        with self._lock:
+            # Threads do not survive fork, so each worker process starts its own.
+            if self._worker is None or self._worker_pid != os.getpid():
+                if self._worker_pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def submit(self, rows):
+        rows = np.atleast_2d(np.asarray(rows, dtype=float))
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((rows, future, time.monotonic()))
+        return future
+
+    def predict(self, rows, timeout=None):
+        return self.submit(rows).result(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            size = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._score(batch)
+
+    def _score(self, batch):
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.monotonic()
+        matrix = np.vstack([rows for rows, _, _ in batch])
+        try:
+            scores = self.predict_fn(matrix)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            with self._lock:
+                self.failures += len(batch)
+            return
+        finished = time.monotonic()
+        offset = 0
+        for rows, future, _ in batch:
+            future.set_result(scores[offset:offset + len(rows)])
+            offset += len(rows)
+        with self._lock:
+            self.requests += len(batch)
+            self.rows += len(matrix)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(matrix))
+            self.queue_wait += sum(started - queued for _, _, queued in batch)
+            self.predict_time += finished - started
+
+    def stats(self):
+        with self._lock:
+            uptime = time.time() - self.started_at
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'requests': self.requests,
+                'rows': self.rows,
+                'batches': self.batches,
+                'failures': self.failures,
+                'largest_batch': self.largest_batch,
+                'mean_batch_rows': round(self.rows / self.batches, 2) if self.batches else 0,
+                'mean_queue_wait_ms': round(self.queue_wait / self.requests * 1000, 3) if self.requests else 0,
+                'mean_predict_ms': round(self.predict_time / self.batches * 1000, 3) if self.batches else 0,
+                'rows_per_second': round(self.rows / uptime, 2) if uptime > 0 else 0,
+                'predict_rows_per_second': round(self.rows / self.predict_time, 2) if self.predict_time else 0
+            }
+
+def _predict_grades(matrix):
+    model = model_registry.get('grade')
+    if model is None:
+        raise RuntimeError('Grade prediction model is not available')
+    return model.predict(matrix)
+
+grade_batcher = MicroBatcher(
+    _predict_grades,
+    max_batch_size=int(os.getenv('PREDICT_BATCH_SIZE', 64)),
+    max_wait=float(os.getenv('PREDICT_BATCH_WAIT_MS', 5)) / 1000
+)
@@ -0,0 +1,35 @@
+import os
+from flask import request
+
+MAX_BULK_ROWS = int(os.getenv('BULK_MAX_ROWS', 1000))
+
+class BulkError(ValueError):
+    def __init__(self, message, rows=None):
+        super().__init__(message)
+        self.rows = rows or []
+
+def bulk_rows(field):
+    # Accepts either a JSON list or an object holding the list under field.
+    data = request.get_json(silent=True)
+    rows = data.get(field) if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not rows:
+        raise BulkError(f'Expected a non-empty list of {field}')
+    if len(rows) > MAX_BULK_ROWS:
+        raise BulkError(f'At most {MAX_BULK_ROWS} {field} per request')
+    return rows
+
+def validate_rows(rows, build):
+    # build turns one row into a document or raises ValueError. Every row is
+    # checked first, so a batch is either stored whole or not at all.
+    documents = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError('Expected an object')
+            documents.append(build(row))
+        except (ValueError, TypeError, ZeroDivisionError) as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        raise BulkError('Invalid rows', errors)
+    return documents
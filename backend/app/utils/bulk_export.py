@@ -0,0 +1,281 @@
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from app.models.storage import sort_key
+from app.utils.pdf_generator import generate_report_card
+
+USER_FIELDS = ('_id', 'name', 'email', 'level', 'xp')
+
+class ExportBusy(Exception):
+    pass
+
+def _report_user(user, progress):
+    # Only the fields the report prints are kept, so password hashes are
+    # never shipped to the workers. XP and level live in the gamification
+    # collection; the user document only holds their starting values.
+    user = {field: user[field] for field in USER_FIELDS if field in user}
+    if progress is not None:
+        user['xp'] = progress.get('xp', 0)
+        user['level'] = progress.get('level', user.get('level', 1))
+    return user
+
+def load_cohort(database, user_ids=None):
+    # One read per collection for the whole cohort instead of four queries
+    # per student; a subset is read through the user_id indexes instead.
+    if user_ids:
+        users = [user for user in (database.find_one('users', {'_id': user_id}) for user_id in set(user_ids))
+                 if user is not None]
+        users.sort(key=lambda user: (sort_key(user.get('name')), user['_id']))
+        return [(_report_user(user, database.find_one('gamification', {'user_id': user['_id']})),
+                 database.find('subjects', {'user_id': user['_id']}),
+                 database.find('marks', {'user_id': user['_id']}),
+                 database.find('attendance', {'user_id': user['_id']})) for user in users]
+    progress = {doc.get('user_id'): doc for doc in database.find('gamification', {})}
+    users = [_report_user(user, progress.get(user['_id'])) for user in database.find('users', {}, sort='name')]
+    grouped = {}
+    for collection in ('subjects', 'marks', 'attendance'):
+        by_user = defaultdict(list)
+        for doc in database.find(collection, {}):
+            by_user[doc.get('user_id')].append(doc)
+        grouped[collection] = by_user
+    return [(user, grouped['subjects'].get(user['_id'], []), grouped['marks'].get(user['_id'], []),
+             grouped['attendance'].get(user['_id'], [])) for user in users]
+
+def _render_chunk(records):
+    results = []
+    for user, subjects, marks, attendance in records:
+        try:
+            results.append((user, generate_report_card(user, subjects, marks, attendance), None))
+        except Exception as e:
+            results.append((user, None, str(e)))
+    return results
+
+def report_card_filename(user):
+    name = re.sub(r'[^A-Za-z0-9]+', '_', user.get('name') or '').strip('_') or 'student'
+    return f'{name}_{user["_id"]}.pdf'
+
+class ExportProgress:
+    def __init__(self, total):
+        self.id = str(uuid.uuid4())
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.status = 'running'
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'export_id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'bytes': self.bytes,
+            'elapsed': round(elapsed, 3),
+            'reports_per_second': round(self.done / elapsed, 2) if elapsed > 0 else 0
+        }
+
+class BulkExporter:
+    def __init__(self, workers=None, chunk_size=20, max_running=2, history=20):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_running = max_running
+        self.history = history
+        self._exports = OrderedDict()
+        self._running = set()
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _pool(self):
+        # One pool for every export, started on first use: processes are
+        # spawned once rather than per request, and concurrent exports share
+        # the same workers instead of multiplying them.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _discard_pool(self, executor):
+        # A worker died and broke the pool; the next export starts a new one.
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def start(self, records):
+        progress = ExportProgress(len(records))
+        with self._lock:
+            if len(self._running) >= self.max_running:
+                self.rejected += 1
+                raise ExportBusy(f'{len(self._running)} exports are already running')
+            self._running.add(progress.id)
+            self._exports[progress.id] = progress
+            while len(self._exports) > self.history:
+                self._exports.popitem(last=False)
+        return progress
+
+    def finish(self, progress):
+        # Frees the export's slot. Safe to call more than once, and also
+        # called when a response is closed before it was ever read.
+        with self._lock:
+            self._running.discard(progress.id)
+            if progress.finished_at is None:
+                progress.finished_at = time.time()
+                if progress.status == 'running':
+                    progress.status = 'cancelled'
+
+    def get(self, export_id):
+        with self._lock:
+            progress = self._exports.get(export_id)
+            return progress.to_dict() if progress is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'chunk_size': self.chunk_size,
+                'max_running': self.max_running,
+                'running': len(self._running),
+                'rejected': self.rejected,
+                'exports': [progress.to_dict() for progress in self._exports.values()]
+            }
+
+    def render(self, records, progress):
+        # Yields (user, pdf, error) as chunks finish. Only a few chunks per
+        # worker are in flight, so a slow consumer holds back rendering
+        # instead of piling finished PDFs up in memory.
+        chunks = [records[i:i + self.chunk_size] for i in range(0, len(records), self.chunk_size)]
+        executor = self._pool() if chunks else None
+        workers = min(self.workers, len(chunks))
+        pending = set()
+        try:
+            remaining = iter(chunks)
+            for chunk in remaining:
+                pending.add(executor.submit(_render_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    break
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    for user, pdf, error in future.result():
+                        with self._lock:
+                            if error is None:
+                                progress.done += 1
+                                progress.bytes += len(pdf)
+                            else:
+                                progress.failed += 1
+                        yield user, pdf, error
+                    chunk = next(remaining, None)
+                    if chunk is not None:
+                        pending.add(executor.submit(_render_chunk, chunk))
+            progress.status = 'done'
+        except GeneratorExit:
+            progress.status = 'cancelled'
+            raise
+        except BaseException as e:
+            progress.status = 'failed'
+            if isinstance(e, BrokenProcessPool):
+                self._discard_pool(executor)
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+            self.finish(progress)
+
+    def stream_zip(self, records, progress):
+        # ZipFile can write to a non-seekable stream; each member is handed
+        # to the client as soon as it is added.
+        buffer = _ZipBuffer()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+            errors = []
+            for user, pdf, error in self.render(records, progress):
+                if error is not None:
+                    errors.append(f'{user["_id"]}\t{user.get("name", "")}\t{error}')
+                    continue
+                archive.writestr(report_card_filename(user), pdf)
+                yield buffer.take()
+            if errors:
+                archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+        yield buffer.take()
+
+class _ZipBuffer:
+    def __init__(self):
+        self._chunks = []
+        self._written = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+bulk_exporter = BulkExporter(
+    workers=int(os.getenv('EXPORT_WORKERS', 0)) or None,
+    chunk_size=int(os.getenv('EXPORT_CHUNK_SIZE', 20)),
+    max_running=int(os.getenv('EXPORT_MAX_RUNNING', 2))
+)
+
+def main():
+    parser = argparse.ArgumentParser(description='Export report cards for every student into a ZIP file.')
+    parser.add_argument('output', help='ZIP file to write')
+    parser.add_argument('--users', help='comma-separated user ids (default: all users)')
+    parser.add_argument('--workers', type=int, default=bulk_exporter.workers, help='rendering processes')
+    parser.add_argument('--chunk-size', type=int, default=bulk_exporter.chunk_size,
+                        help='report cards sent to a worker at a time')
+    args = parser.parse_args()
+
+    from app.models.database import db
+
+    exporter = BulkExporter(workers=args.workers, chunk_size=args.chunk_size)
+    records = load_cohort(db, args.users.split(',') if args.users else None)
+    progress = exporter.start(records)
+    tmp_path = args.output + '.tmp'
+    last_report = 0
+    with open(tmp_path, 'wb') as f:
+        for data in exporter.stream_zip(records, progress):
+            f.write(data)
+            if time.time() - last_report >= 1:
+                last_report = time.time()
+                stats = progress.to_dict()
+                print(f"{stats['done'] + stats['failed']}/{stats['total']} report cards "
+                      f"({stats['reports_per_second']}/s)", file=sys.stderr)
+    exporter.shutdown()
+    os.replace(tmp_path, args.output)
+    stats = progress.to_dict()
+    print(f"Wrote {stats['done']} report cards to {args.output} in {stats['elapsed']}s "
+          f"({stats['reports_per_second']}/s, {stats['failed']} failed)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response
+from flask_jwt_extended import get_jwt_identity
+from app.models.database import db
+
+class ResponseCache:
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._generations = {}
+        self._epoch = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry['expires'] <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, user_id, generation, body, status, mimetype):
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # A write for this user landed while the response was being built.
+            if (self._epoch, self._generations.get(user_id, 0)) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                'user_id': user_id,
+                'expires': time.monotonic() + self.ttl,
+                'body': body,
+                'status': status,
+                'mimetype': mimetype
+            }
+            self._by_user.setdefault(user_id, set()).add(key)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def generation(self, user_id):
+        with self._lock:
+            return (self._epoch, self._generations.get(user_id, 0))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry['body'])
+        keys = self._by_user.get(entry['user_id'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry['user_id']]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_user.clear()
+            self._bytes = 0
+
+    def on_change(self, op, collection, old, new):
+        if op == 'reset':
+            self.clear()
+            return
+        user_ids = set()
+        for doc in old + new:
+            user_ids.add(doc['_id'] if collection == 'users' else doc.get('user_id'))
+        for user_id in user_ids:
+            if user_id is not None:
+                self.invalidate_user(user_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = get_jwt_identity()
+            # Pick up writes made by other worker processes before trusting the cache.
+            db.refresh()
+            key = (user_id, request.endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+            entry = self.get(key)
+            if entry is not None:
+                response = make_response(entry['body'], entry['status'])
+                response.mimetype = entry['mimetype']
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            generation = self.generation(user_id)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                self.set(key, user_id, generation, response.get_data(), response.status_code, response.mimetype)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024)),
+    max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', 300))
+)
+db.subscribe(response_cache.on_change)
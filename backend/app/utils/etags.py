@@ -0,0 +1,88 @@
+import threading
+import time
+import zlib
+from functools import wraps
+from flask import g, request, make_response
+from flask_jwt_extended import get_jwt_identity
+from app.models.database import db
+
+class DataVersions:
+    def __init__(self):
+        # (user_id, collection) -> storage version of its last change. Storage
+        # versions name the same state in every worker, so tags match across
+        # them. Keys not changed since the last reset use the version current
+        # at that point (_base), which their data has not moved from.
+        self._versions = {}
+        self._base = None
+        self._resets = 0
+        self._lock = threading.Lock()
+
+    def on_change(self, op, collection, old, new):
+        version = db.version()
+        with self._lock:
+            if op == 'reset':
+                self._versions.clear()
+                self._base = None
+                self._resets += 1
+                return
+            user_ids = set()
+            for doc in old + new:
+                user_ids.add(doc['_id'] if collection == 'users' else doc.get('user_id'))
+            for user_id in user_ids:
+                self._versions[(user_id, collection)] = version
+
+    def version(self, user_id, collection):
+        with self._lock:
+            version = self._versions.get((user_id, collection))
+            if version is not None:
+                return version
+            if self._base is not None:
+                return self._base
+            resets = self._resets
+        base = db.version()
+        with self._lock:
+            if self._resets == resets and self._base is None:
+                self._base = base
+            return self._versions.get((user_id, collection), base)
+
+    @staticmethod
+    def _matches(tag, base, now):
+        if tag == base:
+            return True
+        if tag.startswith(base + '-'):
+            try:
+                return now < int(tag[len(base) + 1:])
+            except ValueError:
+                return False
+        return False
+
+    def conditional(self, collection):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                user_id = get_jwt_identity()
+                db.refresh()
+                # The same URL can be served as JSON or NDJSON depending on
+                # Accept, so the negotiated representation is part of the tag.
+                variant = zlib.crc32(request.query_string + b'|' + request.headers.get('Accept', '').encode('utf-8'))
+                base = f'{self.version(user_id, collection)}-{variant:08x}'
+                now = time.time()
+                for tag in request.if_none_match.as_set(include_weak=True):
+                    if self._matches(tag, base, now):
+                        response = make_response('', 304)
+                        response.set_etag(tag)
+                        response.vary.add('Accept')
+                        return response
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    # Views whose output changes with the clock (e.g. overdue
+                    # flags) set g.etag_expires to when the tag must stop matching.
+                    expires = g.pop('etag_expires', None)
+                    response.set_etag(f'{base}-{int(expires)}' if expires else base)
+                response.vary.add('Accept')
+                return response
+            return wrapper
+        return decorator
+
+data_versions = DataVersions()
+db.subscribe(data_versions.on_change)
@@ -0,0 +1,250 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, user_id, name, parts=1, combine=None):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.name = name
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.futures = []
+        self.results = [None] * parts
+        self.remaining = parts
+        self.combine = combine
+        self.done = threading.Event()
+
+    def to_dict(self):
+        status = self.status
+        if status == 'queued' and any(future.running() for future in self.futures):
+            status = 'running'
+        data = {
+            'job_id': self.id,
+            'status': status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.finished_at is not None:
+            data['duration'] = round(self.finished_at - (self.started_at or self.created_at), 3)
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.error is not None:
+            data['error'] = self.error
+        return data
+
+def _timed_call(fn, args):
+    started = time.time()
+    return started, fn(*args)
+
+class JobQueue:
+    def __init__(self, workers=2, max_pending=32, timeout=120.0, ttl=600.0, cache_size=256):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._jobs = {}
+        self._results = OrderedDict()
+        self._pending = 0
+        # Futures still counted in _pending; overdue ones leave early.
+        self._live = set()
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.recycled = 0
+        self.cache_hits = 0
+        self.tasks_run = 0
+        self.run_time = 0.0
+        self.wait_time = 0.0
+
+    def _pool(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            # Spawned rather than forked: the server process is multi-threaded
+            # and forking it could copy held locks into the workers.
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def submit(self, user_id, name, fn, parts, combine=None):
+        # parts is a list of (cache_key, args); each runs as its own task so a
+        # multi-page upload is spread over the pool. A part whose key already
+        # has a result (e.g. the same file uploaded again) is not rerun.
+        job = Job(user_id, name, len(parts), combine)
+        self._cancel(self._reap())
+        with self._lock:
+            self._expire()
+            todo = []
+            for i, (key, args) in enumerate(parts):
+                if key is not None and key in self._results:
+                    self._results.move_to_end(key)
+                    job.results[i] = self._results[key]
+                    job.remaining -= 1
+                    self.cache_hits += 1
+                else:
+                    todo.append((i, key, args))
+            if self._pending + len(todo) > self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f'{self._pending} tasks are already waiting')
+            futures = []
+            try:
+                for i, key, args in todo:
+                    futures.append((i, key, self._pool().submit(_timed_call, fn, args)))
+            except Exception:
+                # A worker died and broke the pool; start a fresh one next time.
+                self._executor = None
+                for _, _, future in futures:
+                    future.cancel()
+                raise
+            job.futures = [future for _, _, future in futures]
+            self._jobs[job.id] = job
+            self._pending += len(todo)
+            self._live.update(job.futures)
+            self.submitted += 1
+            if not todo:
+                self._complete(job, time.time())
+        for i, key, future in futures:
+            future.add_done_callback(lambda f, i=i, key=key: self._finish(job, i, key, f))
+        return job
+
+    def _finish(self, job, index, key, future):
+        finished = time.time()
+        with self._lock:
+            if future in self._live:
+                self._live.discard(future)
+                self._pending -= 1
+            job.remaining -= 1
+            try:
+                started, result = future.result()
+            except Exception as e:
+                if job.error is None:
+                    job.error = str(e)
+            else:
+                self.tasks_run += 1
+                self.run_time += finished - started
+                self.wait_time += started - job.created_at
+                job.started_at = min(started, job.started_at or started)
+                job.results[index] = result
+                if key is not None:
+                    self._results[key] = result
+                    while len(self._results) > self.cache_size:
+                        self._results.popitem(last=False)
+            # A job that timed out is already complete; its late results
+            # only go to the cache.
+            if job.remaining == 0 and not job.done.is_set():
+                self._complete(job, finished)
+
+    def _complete(self, job, finished):
+        if job.error is not None:
+            self.failed += 1
+            if job.status != 'timeout':
+                job.status = 'failed'
+        else:
+            self.completed += 1
+            if job.status != 'timeout':
+                job.status = 'done'
+                job.result = job.combine(job.results) if job.combine else job.results
+        job.finished_at = job.finished_at or finished
+        job.done.set()
+
+    def get(self, job_id, user_id, wait=0):
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        if wait > 0:
+            job.done.wait(min(wait, max(0.0, job.created_at + self.timeout - time.time()) + 0.1))
+        self._cancel(self._reap())
+        with self._lock:
+            return job.to_dict()
+
+    def _reap(self):
+        # Fails jobs that outlived the timeout and releases their queue slots
+        # at once. Returns their unfinished futures for _cancel.
+        now = time.time()
+        overdue = []
+        with self._lock:
+            for job in self._jobs.values():
+                if job.done.is_set() or now - job.created_at <= self.timeout:
+                    continue
+                job.status = 'timeout'
+                job.error = f'Job did not finish within {self.timeout:g} seconds'
+                job.finished_at = now
+                self.failed += 1
+                self.timed_out += 1
+                job.done.set()
+                for future in job.futures:
+                    if future in self._live:
+                        self._live.discard(future)
+                        self._pending -= 1
+                        overdue.append(future)
+        return overdue
+
+    def _cancel(self, overdue):
+        # Called without the lock: cancelling runs the done callbacks inline.
+        # A task that is already running can't be interrupted, so its worker
+        # is written off: the pool is replaced, and the old one winds down
+        # once its remaining tasks return.
+        stuck = [future for future in overdue if not future.cancel()]
+        if not stuck:
+            return
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.recycled += 1
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and now - job.finished_at > self.ttl]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'pools_recycled': self.recycled,
+                'cache_entries': len(self._results),
+                'cache_hits': self.cache_hits,
+                'tasks_run': self.tasks_run,
+                'mean_wait_ms': round(self.wait_time / self.tasks_run * 1000, 1) if self.tasks_run else 0,
+                'mean_run_ms': round(self.run_time / self.tasks_run * 1000, 1) if self.tasks_run else 0
+            }
+
+ocr_jobs = JobQueue(
+    workers=int(os.getenv('OCR_WORKERS', 2)),
+    max_pending=int(os.getenv('OCR_QUEUE_DEPTH', 32)),
+    timeout=float(os.getenv('OCR_JOB_TIMEOUT', 120)),
+    ttl=float(os.getenv('OCR_JOB_TTL', 600)),
+    cache_size=int(os.getenv('OCR_CACHE_SIZE', 256))
+)
@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+import time
+import joblib
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_GRADE_MODEL_PATH = os.path.join(BACKEND_DIR, 'ml', 'grade_prediction_model.pkl')
+
+class ModelEntry:
+    def __init__(self, path):
+        self.path = path
+        self.model = None
+        self.signature = None
+        self.checked = None
+        self.loaded_at = None
+        self.loads = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+class ModelRegistry:
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._entries = {}
+
+    def register(self, name, path):
+        self._entries[name] = ModelEntry(path)
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self, name):
+        entry = self._entries[name]
+        if entry.model is not None and time.monotonic() - entry.checked < self.check_interval:
+            return entry.model
+        # Callers that already have a model keep using it while another
+        # thread checks for (and possibly loads) a newer file.
+        if not entry.lock.acquire(blocking=entry.model is None):
+            return entry.model
+        try:
+            now = time.monotonic()
+            if entry.checked is not None and now - entry.checked < self.check_interval:
+                return entry.model
+            entry.checked = now
+            signature = self._signature(entry.path)
+            if signature is not None and signature != entry.signature:
+                try:
+                    # Tree arrays are memory-mapped rather than copied, so
+                    # worker processes share the pages of one model file.
+                    model = joblib.load(entry.path, mmap_mode='r')
+                except Exception:
+                    entry.failures += 1
+                    logger.exception('Failed to load model %s from %s', name, entry.path)
+                else:
+                    entry.model = model
+                    entry.signature = signature
+                    entry.loaded_at = time.time()
+                    entry.loads += 1
+            return entry.model
+        finally:
+            entry.lock.release()
+
+    def stats(self):
+        return {
+            name: {
+                'path': entry.path,
+                'loaded': entry.model is not None,
+                'loaded_at': entry.loaded_at,
+                'loads': entry.loads,
+                'failures': entry.failures
+            }
+            for name, entry in self._entries.items()
+        }
+
+model_registry = ModelRegistry(check_interval=float(os.getenv('MODEL_RELOAD_INTERVAL', 5)))
+model_registry.register('grade', os.getenv('GRADE_MODEL_PATH', DEFAULT_GRADE_MODEL_PATH))
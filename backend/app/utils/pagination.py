@@ -0,0 +1,151 @@
+import base64
+import json
+import re
+from datetime import date, datetime, timedelta
+from flask import request
+from app.models.database import db
+
+MAX_PAGE_SIZE = 500
+FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+class PaginationError(ValueError):
+    pass
+
+def encode_cursor(sort, doc):
+    field = sort.lstrip('-+')
+    payload = json.dumps([sort, doc.get(field), doc['_id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    # Checked here so a hand-made cursor can't reach the storage comparisons
+    # with types they don't order.
+    if not isinstance(payload, list) or len(payload) != 3:
+        raise PaginationError('Invalid cursor')
+    cursor_sort, value, last_id = payload
+    if not isinstance(last_id, str) or not (value is None or isinstance(value, (str, int, float))):
+        raise PaginationError('Invalid cursor')
+    if cursor_sort != sort:
+        raise PaginationError('Cursor does not match sort order')
+    return value, last_id
+
+def _field(name):
+    if not FIELD_NAME.match(name):
+        raise PaginationError(f'Invalid field name: {name}')
+    return name
+
+def parse_fields(fields):
+    if fields is None:
+        return None
+    return [_field(f.strip()) for f in fields.split(',') if f.strip()]
+
+def _bound(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise PaginationError(f'{name} must be an ISO date')
+    return value
+
+def date_range():
+    # from is inclusive and to exclusive; either may be left out. Returns
+    # None when neither is given.
+    start, end = _bound('from'), _bound('to')
+    if start is None and end is None:
+        return None
+    return start, end
+
+def heatmap_range(default_days=365):
+    # Whole days for rollups, defaulting to the last default_days up to today.
+    period = request.args.get('period', 'day')
+    if period not in ('day', 'week'):
+        raise PaginationError('period must be day or week')
+    start, end = _bound('from'), _bound('to')
+    end = end[:10] if end else (date.today() + timedelta(days=1)).isoformat()
+    start = start[:10] if start else (date.fromisoformat(end) - timedelta(days=default_days)).isoformat()
+    return start, end, period
+
+def paginated_find(collection, query, default_sort='created_at', range_field=None):
+    args = request.args
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    sort = args.get('sort')
+    fields = args.get('fields')
+    bounds = date_range() if range_field else None
+
+    if limit is None and cursor is None and sort is None and fields is None:
+        if bounds is not None:
+            return db.find_range(collection, query, range_field, *bounds), None
+        return db.find(collection, query), None
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise PaginationError('limit must be an integer')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise PaginationError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    if bounds is not None:
+        # Range queries walk the sorted date index, so they are always in
+        # date order.
+        if sort not in (None, range_field):
+            raise PaginationError(f'from and to can only be combined with sort={range_field}')
+        sort = range_field
+    sort = sort or default_sort
+    sort_field = _field(sort.lstrip('-+'))
+    after = decode_cursor(cursor, sort) if cursor else None
+
+    projection = parse_fields(fields)
+
+    # The cursor is built from the sort field, so fetch it even when the
+    # caller did not ask for it and strip it again afterwards.
+    fetch_projection = projection
+    if projection is not None and sort_field != '_id' and sort_field not in projection:
+        fetch_projection = projection + [sort_field]
+
+    if bounds is not None:
+        docs = db.find_range(collection, query, range_field, *bounds, limit=limit + 1 if limit else None,
+                             after=after, projection=fetch_projection)
+    else:
+        docs = db.find(collection, query, sort=sort, limit=limit + 1 if limit else None,
+                       after=after, projection=fetch_projection)
+
+    next_cursor = None
+    if limit is not None and len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(sort, docs[-1])
+
+    if fetch_projection is not projection:
+        for doc in docs:
+            doc.pop(sort_field, None)
+
+    return docs, next_cursor
+
+def streamed_find(collection, query, default_sort='created_at', range_field=None):
+    # Always sorted, like paginated_find, so the engines can read the result
+    # a page at a time instead of collecting it first.
+    args = request.args
+    if args.get('limit') is not None or args.get('cursor') is not None:
+        raise PaginationError('limit and cursor cannot be combined with stream')
+    sort = args.get('sort')
+    if sort is not None:
+        _field(sort.lstrip('-+'))
+    projection = parse_fields(args.get('fields'))
+    bounds = date_range() if range_field else None
+    if bounds is not None:
+        if sort not in (None, range_field):
+            raise PaginationError(f'from and to can only be combined with sort={range_field}')
+        return db.iter_find_range(collection, query, range_field, *bounds, projection=projection)
+    return db.iter_find(collection, query, sort=sort or default_sort, projection=projection)
+
+def with_cursor(response, next_cursor):
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt
+
+class HasherBusy(Exception):
+    pass
+
+def hash_rounds(hashed):
+    # bcrypt hashes look like $2b$12$<salt+digest>; the second field is the cost.
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=4, max_pending=64, timeout=10.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.hashes = 0
+        self.verifications = 0
+        self.rehashes = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.hash_time = 0.0
+
+    def _pool(self):
+        # bcrypt releases the GIL, so a few threads hash in parallel while the
+        # fixed pool size caps how many cores login traffic can take.
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy(f'{self._pending} password checks are already waiting')
+            self._pending += 1
+            executor = self._pool()
+        queued = time.perf_counter()
+        try:
+            future = executor.submit(self._timed, fn, queued, *args)
+        except Exception:
+            self._release()
+            raise
+        # The slot is held until the work is really done (or cancelled), not
+        # just until this caller gives up, so timeouts can't push the actual
+        # backlog past max_pending.
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _timed(self, fn, queued, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.queue_wait += started - queued
+                self.max_queue_wait = max(self.max_queue_wait, started - queued)
+                self.hash_time += finished - started
+
+    def hash(self, password):
+        hashed = self._run(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)))
+        with self._lock:
+            self.hashes += 1
+        return hashed.decode('utf-8')
+
+    def verify(self, password, hashed):
+        valid = self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+        with self._lock:
+            self.verifications += 1
+        return valid
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+    def record_rehash(self):
+        with self._lock:
+            self.rehashes += 1
+
+    def stats(self):
+        with self._lock:
+            operations = self.hashes + self.verifications
+            return {
+                'rounds': self.rounds,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'hashes': self.hashes,
+                'verifications': self.verifications,
+                'rehashes': self.rehashes,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'mean_queue_wait_ms': round(self.queue_wait / operations * 1000, 1) if operations else 0,
+                'max_queue_wait_ms': round(self.max_queue_wait * 1000, 1),
+                'mean_hash_ms': round(self.hash_time / operations * 1000, 1) if operations else 0
+            }
+
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv('BCRYPT_ROUNDS', 12)),
+    workers=int(os.getenv('HASH_WORKERS', 4)),
+    max_pending=int(os.getenv('HASH_QUEUE_DEPTH', 64)),
+    timeout=float(os.getenv('HASH_TIMEOUT', 10))
+)
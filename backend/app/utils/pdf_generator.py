@@ -4,35 +4,73 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from collections import OrderedDict
 from datetime import datetime
+import hashlib
+import io
+import json
 import os
+import threading
+import time
+
+# Styles never change, so they are built once rather than per report.
+styles = getSampleStyleSheet()
+
+title_style = ParagraphStyle(
+    'CustomTitle',
+    parent=styles['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#1E40AF'),
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+heading_style = ParagraphStyle(
+    'CustomHeading',
+    parent=styles['Heading2'],
+    fontSize=16,
+    textColor=colors.HexColor('#1E40AF'),
+    spaceAfter=12,
+    spaceBefore=12
+)
+
+footer_style = ParagraphStyle('Footer', parent=styles['Normal'], alignment=TA_CENTER)
+
+info_table_style = TableStyle([
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
+    ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 10),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+
+subject_table_style = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1E40AF')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
+])
+
+summary_table_style = TableStyle([
+    ('FONT', (0, 0), (-1, -1), 'Helvetica-Bold', 12),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1E40AF')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
 
 def generate_report_card(user, subjects, marks, attendance):
-    os.makedirs('reports', exist_ok=True)
-    filename = f'reports/report_card_{user["_id"]}.pdf'
-    
-    doc = SimpleDocTemplate(filename, pagesize=A4)
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
     elements = []
     
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1E40AF'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#1E40AF'),
-        spaceAfter=12,
-        spaceBefore=12
-    )
-    
     title = Paragraph("EduTrackX - Student Report Card", title_style)
     elements.append(title)
     elements.append(Spacer(1, 0.2*inch))
@@ -46,14 +84,7 @@ def generate_report_card(user, subjects, marks, attendance):
     ]
     
     info_table = Table(student_info, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
-        ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 10),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    info_table.setStyle(info_table_style)
     
     elements.append(info_table)
     elements.append(Spacer(1, 0.3*inch))
@@ -93,19 +124,7 @@ def generate_report_card(user, subjects, marks, attendance):
         ])
     
     subject_table = Table(subject_data, colWidths=[2.5*inch, 1.5*inch, 1.5*inch, 1*inch])
-    subject_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1E40AF')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
-    ]))
+    subject_table.setStyle(subject_table_style)
     
     elements.append(subject_table)
     elements.append(Spacer(1, 0.3*inch))
@@ -121,12 +140,7 @@ def generate_report_card(user, subjects, marks, attendance):
         ]
         
         summary_table = Table(summary_data, colWidths=[2*inch, 2*inch])
-        summary_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica-Bold', 12),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1E40AF')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
+        summary_table.setStyle(summary_table_style)
         
         elements.append(summary_table)
     
@@ -134,11 +148,73 @@ def generate_report_card(user, subjects, marks, attendance):
     
     footer = Paragraph(
         "This is an auto-generated report from EduTrackX Academic Dashboard System",
-        styles['Normal']
+        footer_style
     )
-    footer.alignment = TA_CENTER
     elements.append(footer)
     
     doc.build(elements)
     
-    return filename
+    return buffer.getvalue()
+
+def report_card_digest(user, subjects, marks, attendance):
+    # Covers exactly what the report prints, plus the date it is stamped
+    # with, so any change to the underlying data yields a new digest.
+    content = {
+        'date': datetime.now().strftime('%Y-%m-%d'),
+        'user': [user['_id'], user['name'], user['email'], user.get('level', 1), user.get('xp', 0)],
+        'subjects': [[s['_id'], s['name']] for s in subjects],
+        'marks': sorted([m['_id'], m['subject_id'], m['percentage']] for m in marks),
+        'attendance': sorted([a['_id'], a['subject_id'], a['status']] for a in attendance)
+    }
+    return hashlib.sha256(json.dumps(content, default=str).encode()).hexdigest()
+
+class ReportCardCache:
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+        self.render_time = 0.0
+
+    def get_or_render(self, digest, user, subjects, marks, attendance):
+        with self._lock:
+            pdf = self._entries.get(digest)
+            if pdf is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return pdf
+        started = time.perf_counter()
+        pdf = generate_report_card(user, subjects, marks, attendance)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.renders += 1
+            self.render_time += elapsed
+            if digest not in self._entries and len(pdf) <= self.max_bytes:
+                self._entries[digest] = pdf
+                self._bytes += len(pdf)
+                while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return pdf
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.renders
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'renders': self.renders,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'mean_render_ms': round(self.render_time / self.renders * 1000, 1) if self.renders else 0
+            }
+
+report_cards = ReportCardCache(
+    max_entries=int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 256)),
+    max_bytes=int(os.getenv('REPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+)
@@ -0,0 +1,47 @@
+import os
+from flask import Response, current_app, request
+from app.utils.pagination import PaginationError
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 64 * 1024))
+
+def stream_format():
+    value = request.args.get('stream')
+    if value is None:
+        if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+            return 'ndjson'
+        return None
+    if value == 'ndjson':
+        return 'ndjson'
+    if value in ('1', 'true', 'json'):
+        return 'json'
+    raise PaginationError("stream must be 'json' or 'ndjson'")
+
+def _chunks(docs, fmt, dumps):
+    if fmt == 'ndjson':
+        opening, separator, closing, end = '', '', '', '\n'
+    else:
+        opening, separator, closing, end = '[', ',', ']\n', ''
+    buffer = [opening]
+    size = len(opening)
+    first = True
+    for doc in docs:
+        piece = ('' if first else separator) + dumps(doc, separators=(',', ':')) + end
+        buffer.append(piece)
+        size += len(piece)
+        # Send the first document straight away so clients see bytes early,
+        # then batch the rest into chunks of roughly STREAM_CHUNK_SIZE.
+        if first or size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+        first = False
+    buffer.append(closing)
+    yield ''.join(buffer)
+
+def stream_response(docs, fmt=None):
+    fmt = fmt or stream_format() or 'json'
+    mimetype = NDJSON_MIMETYPE if fmt == 'ndjson' else 'application/json'
+    # The generator runs after the view returns, outside the app context.
+    dumps = current_app.json.dumps
+    return Response(_chunks(docs, fmt, dumps), mimetype=mimetype)
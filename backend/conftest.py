@@ -0,0 +1 @@
+# Lets pytest import the app package when run from the repository root too.
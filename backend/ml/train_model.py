@@ -3,8 +3,25 @@ import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
+from datetime import datetime
+import argparse
+import glob
+import json
 import joblib
 import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(ML_DIR)
+FEATURES = ['midterm1', 'midterm2', 'assignments', 'attendance_pct', 'quizzes']
+MODEL_PATH = os.path.join(ML_DIR, 'grade_prediction_model.pkl')
+ARTIFACT_DIR = os.path.join(ML_DIR, 'models')
 
 def generate_synthetic_data(n_samples=1000):
     np.random.seed(42)
@@ -31,21 +48,90 @@ def generate_synthetic_data(n_samples=1000):
     df = pd.DataFrame(data)
     return df
 
-def train_grade_prediction_model():
-    print("Generating synthetic training data...")
-    df = generate_synthetic_data(1000)
+def _feature_frame(columns):
+    # Only subjects with both a final exam (the label) and earlier marks.
+    df = pd.DataFrame({name: np.asarray(columns[name]) for name in FEATURES + ['final_exam', 'marks_count']})
+    df = df[df['final_exam'].notna() & (df['marks_count'] > 0)]
+    return df[FEATURES + ['final_exam']].reset_index(drop=True)
+
+def load_database_records(engine=None, path=None):
+    # Materializes the same per-(user, subject) feature rows the API predicts
+    # from, straight from the marks and attendance collections.
+    sys.path.insert(0, BACKEND_DIR)
+    from app.models.database import Database, create_storage
+    from app.models.feature_store import FeatureStore
+    
+    database = Database(create_storage(engine or os.getenv('DB_ENGINE', 'json'), path or os.getenv('DB_PATH')))
+    try:
+        columns = FeatureStore(database, directory=None).columns()
+    finally:
+        database.backend.close()
+    return _feature_frame(columns)
+
+def load_feature_snapshot(directory=None):
+    # Reads the columns the API's feature store last flushed; they are memory
+    # mapped, so nothing is parsed or copied until the rows are filtered.
+    sys.path.insert(0, BACKEND_DIR)
+    from app.models.feature_store import DEFAULT_FEATURE_DIR, read_columns
     
-    df.to_csv('ml/training_data.csv', index=False)
-    print(f"Training data saved to ml/training_data.csv")
+    return _feature_frame(read_columns(directory or os.getenv('FEATURE_STORE_DIR', DEFAULT_FEATURE_DIR)))
+
+def load_training_data(source='synthetic', n_samples=1000, csv_path=None, features_dir=None):
+    if source == 'synthetic':
+        df = generate_synthetic_data(n_samples)
+        df.to_csv(os.path.join(ML_DIR, 'training_data.csv'), index=False)
+        print(f"Training data saved to {os.path.join(ML_DIR, 'training_data.csv')}")
+        return df
+    if source == 'csv':
+        return pd.read_csv(csv_path or os.path.join(ML_DIR, 'training_data.csv'))
+    if source == 'db':
+        return load_database_records()
+    if source == 'features':
+        return load_feature_snapshot(features_dir)
+    raise ValueError(f"Unknown training data source '{source}'")
+
+def latest_artifact():
+    paths = sorted(glob.glob(os.path.join(ARTIFACT_DIR, 'grade_model_*.pkl')))
+    return paths[-1] if paths else None
+
+def _peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _save_atomic(obj, path):
+    tmp_path = path + '.tmp'
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+def train_grade_prediction_model(source='synthetic', n_samples=1000, csv_path=None, n_estimators=100,
+                                 n_jobs=-1, warm_start_from=None, add_trees=50, features_dir=None):
+    print(f"Loading training data ({source})...")
+    df = load_training_data(source, n_samples, csv_path, features_dir)
+    if len(df) < 5:
+        raise ValueError(f"Need at least 5 training rows, got {len(df)}")
     
-    X = df[['midterm1', 'midterm2', 'assignments', 'attendance_pct', 'quizzes']]
-    y = df['final_exam']
+    # Plain arrays rather than a DataFrame, so the model does not record
+    # feature names and the API can score NumPy rows without warnings.
+    X = df[FEATURES].to_numpy(dtype=float)
+    y = df['final_exam'].to_numpy(dtype=float)
     
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    print("\nTraining Random Forest model...")
-    model = RandomForestRegressor(n_estimators=100, random_state=42, max_depth=10)
+    if warm_start_from:
+        # Keep the existing trees and grow add_trees more on the new data.
+        model = joblib.load(warm_start_from)
+        model.set_params(warm_start=True, n_jobs=n_jobs, n_estimators=model.n_estimators + add_trees)
+        print(f"\nWarm-starting from {warm_start_from}: {len(model.estimators_)} -> {model.n_estimators} trees...")
+    else:
+        model = RandomForestRegressor(n_estimators=n_estimators, random_state=42, max_depth=10, n_jobs=n_jobs)
+        print(f"\nTraining Random Forest model ({n_estimators} trees, n_jobs={n_jobs})...")
+    
+    started = time.perf_counter()
     model.fit(X_train, y_train)
+    training_seconds = time.perf_counter() - started
     
     y_pred = model.predict(X_test)
     
@@ -55,22 +141,77 @@ def train_grade_prediction_model():
     print(f"\nModel Performance:")
     print(f"Mean Squared Error: {mse:.2f}")
     print(f"R² Score: {r2:.4f}")
+    print(f"Training Time: {training_seconds:.2f}s")
+    
+    # Inference runs inside the API's batching thread; don't fan out there.
+    model.set_params(n_jobs=None, warm_start=False)
     
-    model_path = 'ml/grade_prediction_model.pkl'
-    joblib.dump(model, model_path)
-    print(f"\nModel saved to {model_path}")
+    version = datetime.now().strftime('%Y%m%d%H%M%S')
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    artifact_path = os.path.join(ARTIFACT_DIR, f'grade_model_{version}.pkl')
+    _save_atomic(model, artifact_path)
     
     feature_importance = pd.DataFrame({
-        'feature': X.columns,
+        'feature': FEATURES,
         'importance': model.feature_importances_
     }).sort_values('importance', ascending=False)
     
+    metadata = {
+        'version': version,
+        'created_at': datetime.now().isoformat(),
+        'source': source,
+        'rows': int(len(df)),
+        'n_estimators': int(model.n_estimators),
+        'warm_started_from': warm_start_from,
+        'n_jobs': n_jobs,
+        'training_seconds': round(training_seconds, 3),
+        'peak_memory_mb': _peak_memory_mb(),
+        'training_data_mb': round(X.nbytes / (1024 * 1024), 3),
+        'model_size_mb': round(os.path.getsize(artifact_path) / (1024 * 1024), 3),
+        'mse': round(float(mse), 4),
+        'r2': round(float(r2), 4),
+        'feature_importance': dict(zip(FEATURES, [round(float(v), 4) for v in model.feature_importances_]))
+    }
+    with open(os.path.join(ARTIFACT_DIR, f'grade_model_{version}.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    
+    # Replace the served model in one step so the API's registry never
+    # picks up a half-written file.
+    _save_atomic(model, MODEL_PATH)
+    print(f"\nModel saved to {artifact_path} and {MODEL_PATH}")
+    
     print("\nFeature Importance:")
     print(feature_importance)
     
     return model
 
+def main():
+    parser = argparse.ArgumentParser(description='Train the final exam grade prediction model.')
+    parser.add_argument('--source', choices=['synthetic', 'csv', 'db', 'features'], default='synthetic',
+                        help='synthetic data, a CSV export, marks/attendance from the app database, '
+                             'or the feature store snapshot flushed by the API')
+    parser.add_argument('--csv', help='CSV file for --source csv (default ml/training_data.csv)')
+    parser.add_argument('--features-dir', help='feature store directory for --source features '
+                                               '(default FEATURE_STORE_DIR or ml/features)')
+    parser.add_argument('--samples', type=int, default=1000, help='rows to generate for --source synthetic')
+    parser.add_argument('--trees', type=int, default=100, help='number of trees for a fresh model')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='cores to train on (-1 for all)')
+    parser.add_argument('--warm-start', nargs='?', const='latest', metavar='MODEL',
+                        help='add trees to an existing model (default: the latest versioned artifact)')
+    parser.add_argument('--add-trees', type=int, default=50, help='trees to add when warm-starting')
+    args = parser.parse_args()
+    
+    warm_start_from = args.warm_start
+    if warm_start_from == 'latest':
+        warm_start_from = latest_artifact()
+        if warm_start_from is None:
+            parser.error('no versioned model found to warm-start from')
+    
+    train_grade_prediction_model(source=args.source, n_samples=args.samples, csv_path=args.csv,
+                                 n_estimators=args.trees, n_jobs=args.n_jobs,
+                                 warm_start_from=warm_start_from, add_trees=args.add_trees,
+                                 features_dir=args.features_dir)
+
 if __name__ == '__main__':
-    os.makedirs('ml', exist_ok=True)
-    model = train_grade_prediction_model()
+    main()
     print("\nModel training completed successfully!")
@@ -0,0 +1,36 @@
+import os
+
+# Cheap hashes keep signups fast; set before the app modules read it.
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret-key-of-at-least-32-bytes')
+
+import pytest
+
+from app import create_app
+
+@pytest.fixture(params=['json', 'sqlite'])
+def app(request, tmp_path, monkeypatch):
+    monkeypatch.setenv('DB_ENGINE', request.param)
+    monkeypatch.setenv('DB_PATH', str(tmp_path / f'database.{request.param}'))
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def signup(client, email='student@example.com', password='secret', name='Student'):
+    response = client.post('/api/auth/signup', json={'email': email, 'password': password, 'name': name})
+    assert response.status_code == 201
+    return {'Authorization': 'Bearer ' + response.json['token']}
+
+@pytest.fixture
+def auth(client):
+    return signup(client)
+
+@pytest.fixture
+def subject(client, auth):
+    response = client.post('/api/subjects/', json={'name': 'Maths', 'code': 'M1'}, headers=auth)
+    assert response.status_code == 201
+    return response.json
@@ -0,0 +1,63 @@
+import pytest
+
+from app.models.aggregates import aggregates
+from app.models.database import db
+
+VIEWS = ['/api/dashboard/summary', '/api/study/stats', '/api/study/heatmap?from=2024-01-01&to=2024-02-01',
+         '/api/attendance/heatmap?from=2024-01-01&to=2024-02-01']
+
+@pytest.fixture
+def history(client, auth, subject):
+    attendance = [{'subject_id': subject['_id'], 'date': f'2024-01-{day:02d}', 'status': 'absent' if day == 3 else 'present'}
+                  for day in range(1, 6)]
+    assert client.post('/api/attendance/bulk', json=attendance, headers=auth).status_code == 201
+    marks = [{'exam_type': 'quiz', 'marks_obtained': score, 'total_marks': 20, 'date': '2024-01-10'} for score in (12, 18)]
+    assert client.post(f'/api/subjects/{subject["_id"]}/marks/bulk', json=marks, headers=auth).status_code == 201
+    sessions = [{'subject_id': subject['_id'], 'duration': 30, 'date': f'2024-01-0{day}'} for day in (1, 2)]
+    assert client.post('/api/study/sessions/bulk', json=sessions, headers=auth).status_code == 201
+    return subject
+
+def snapshot(client, auth, subject):
+    views = VIEWS + [f'/api/attendance/stats/{subject["_id"]}']
+    return {view: client.get(view, headers=auth).json for view in views}
+
+def test_incremental_updates_match_a_rebuild(client, auth, history):
+    snapshot(client, auth, history)
+    client.post('/api/attendance/', json={'subject_id': history['_id'], 'date': '2024-01-03', 'status': 'present'}, headers=auth)
+    client.post(f'/api/subjects/{history["_id"]}/marks', json={'exam_type': 'exam', 'marks_obtained': 50, 'total_marks': 100,
+                                                                'date': '2024-01-20'}, headers=auth)
+    other = client.post('/api/subjects/', json={'name': 'Physics', 'code': 'P1'}, headers=auth).json
+    client.post('/api/attendance/', json={'subject_id': other['_id'], 'date': '2024-01-04', 'status': 'absent'}, headers=auth)
+    client.delete(f'/api/subjects/{other["_id"]}', headers=auth)
+
+    incremental = snapshot(client, auth, history)
+    assert incremental[f'/api/attendance/stats/{history["_id"]}'] == {'total': 5, 'present': 5, 'absent': 0, 'percentage': 100.0}
+    aggregates.rebuild()
+    assert snapshot(client, auth, history) == incremental
+
+def test_rebuild_of_one_user(client, auth, history):
+    user_id = history['user_id']
+    before = snapshot(client, auth, history)
+    aggregates.rebuild(user_id)
+    assert user_id in aggregates._states
+    assert snapshot(client, auth, history) == before
+
+def test_a_build_that_races_a_write_is_not_kept(client, auth, history, monkeypatch):
+    user_id = history['user_id']
+    aggregates.rebuild()
+    build = aggregates._build
+    calls = []
+
+    def racing_build(user_id):
+        state = build(user_id)
+        if not calls:
+            # Lands after the build has read the attendance collection.
+            db.insert('attendance', {'user_id': user_id, 'subject_id': history['_id'], 'date': '2024-01-06',
+                                     'status': 'absent'})
+        calls.append(user_id)
+        return state
+    monkeypatch.setattr(aggregates, '_build', racing_build)
+
+    stats = aggregates.attendance_stats(user_id, history['_id'])
+    assert len(calls) == 2
+    assert stats == {'total': 6, 'present': 4, 'absent': 2, 'percentage': 66.67}
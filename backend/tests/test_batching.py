@@ -0,0 +1,56 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.utils.batching import MicroBatcher
+
+class RecordingModel:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, matrix):
+        self.calls.append(matrix.shape)
+        return matrix.sum(axis=1)
+
+def test_concurrent_requests_share_one_predict_call():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=64, max_wait=0.2)
+    barrier = threading.Barrier(4)
+    results = {}
+
+    def request(i):
+        barrier.wait()
+        results[i] = batcher.predict([[i, 1.0], [i, 2.0]], timeout=5)
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    assert model.calls == [(8, 2)]
+    for i in range(4):
+        assert list(results[i]) == [i + 1.0, i + 2.0]
+    stats = batcher.stats()
+    assert (stats['requests'], stats['rows'], stats['batches'], stats['largest_batch']) == (4, 8, 1, 8)
+
+def test_batches_stop_at_max_batch_size():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=3, max_wait=0.2)
+    futures = [batcher.submit([[i, 0.0]]) for i in range(7)]
+    assert [float(future.result(5)[0]) for future in futures] == [float(i) for i in range(7)]
+    assert all(rows <= 3 for rows, _ in model.calls)
+    assert sum(rows for rows, _ in model.calls) == 7
+
+def test_a_failed_batch_fails_every_caller():
+    def broken(matrix):
+        raise RuntimeError('model unavailable')
+    batcher = MicroBatcher(broken, max_wait=0.05)
+    futures = [batcher.submit(np.ones((1, 5))) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(5)
+    assert batcher.stats()['failures'] == 2
+
+def test_predict_final_without_a_model_is_503(client, auth, subject, monkeypatch):
+    from app.routes import ai
+    monkeypatch.setattr(ai.model_registry, 'get', lambda name: None)
+    assert client.get('/api/ai/predict-final', headers=auth).status_code == 503
@@ -0,0 +1,61 @@
+import pytest
+
+from app.models.database import db
+
+def rows(subject, statuses):
+    return [{'subject_id': subject['_id'], 'date': date, 'status': status} for date, status in statuses.items()]
+
+def test_attendance_bulk_is_201_for_inserts_and_200_for_updates(client, auth, subject):
+    first = client.post('/api/attendance/bulk', json=rows(subject, {'2024-03-01': 'present', '2024-03-02': 'absent'}),
+                        headers=auth)
+    assert first.status_code == 201
+    assert (len(first.json['created']), len(first.json['updated'])) == (2, 0)
+
+    again = client.post('/api/attendance/bulk', json={'records': rows(subject, {'2024-03-02': 'present'})}, headers=auth)
+    assert again.status_code == 200
+    assert again.json['created'] == []
+    assert again.json['updated'][0]['_id'] == first.json['created'][1]['_id']
+    assert again.json['updated'][0]['created_at'] == first.json['created'][1]['created_at']
+
+    mixed = client.post('/api/attendance/bulk', json=rows(subject, {'2024-03-01': 'absent', '2024-03-03': 'present'}),
+                        headers=auth)
+    assert mixed.status_code == 201
+    assert (len(mixed.json['created']), len(mixed.json['updated'])) == (1, 1)
+    stored = {doc['date']: doc['status'] for doc in db.find('attendance', {'subject_id': subject['_id']})}
+    assert stored == {'2024-03-01': 'absent', '2024-03-02': 'present', '2024-03-03': 'present'}
+
+def test_repeated_keys_in_one_batch_keep_the_last_row(client, auth, subject):
+    response = client.post('/api/attendance/bulk', json=rows(subject, {'2024-03-01': 'present'}) +
+                           rows(subject, {'2024-03-01': 'absent'}), headers=auth)
+    assert response.status_code == 201
+    assert [doc['status'] for doc in response.json['created']] == ['absent']
+    assert len(db.find('attendance', {'subject_id': subject['_id']})) == 1
+
+def test_marks_and_sessions_bulk_insert(client, auth, subject):
+    marks = [{'exam_type': 'quiz', 'marks_obtained': score, 'total_marks': 20} for score in (5, 10)]
+    response = client.post(f'/api/subjects/{subject["_id"]}/marks/bulk', json={'marks': marks}, headers=auth)
+    assert response.status_code == 201
+    assert [doc['percentage'] for doc in response.json] == [25.0, 50.0]
+    sessions = client.post('/api/study/sessions/bulk', json=[{'subject_id': subject['_id'], 'duration': 25}], headers=auth)
+    assert sessions.status_code == 201 and len(sessions.json) == 1
+
+@pytest.mark.parametrize('url, body', [
+    ('/api/attendance/bulk', []),
+    ('/api/attendance/bulk', {'records': 'x'}),
+    ('/api/attendance/bulk', [{'date': '2024-03-01', 'status': 'present'}]),
+    ('/api/study/sessions/bulk', [{'duration': True}]),
+    ('/api/study/sessions/bulk', [{'duration': -5}]),
+    ('/api/study/sessions/bulk', ['not a row'])
+])
+def test_invalid_batches_are_400(client, auth, url, body):
+    response = client.post(url, json=body, headers=auth)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+def test_one_bad_row_rejects_the_whole_batch(client, auth, subject):
+    marks = [{'marks_obtained': 10, 'total_marks': 20}, {'marks_obtained': 10, 'total_marks': 0},
+             {'marks_obtained': False, 'total_marks': 20}]
+    response = client.post(f'/api/subjects/{subject["_id"]}/marks/bulk', json=marks, headers=auth)
+    assert response.status_code == 400
+    assert [row['index'] for row in response.json['rows']] == [1, 2]
+    assert len(db.find('marks', {'subject_id': subject['_id']})) == 0
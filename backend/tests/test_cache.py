@@ -0,0 +1,51 @@
+from app.utils.cache import ResponseCache, response_cache
+
+def add_mark(client, auth, subject, score):
+    response = client.post(f'/api/subjects/{subject["_id"]}/marks',
+                           json={'exam_type': 'quiz', 'marks_obtained': score, 'total_marks': 20, 'date': '2024-01-10'},
+                           headers=auth)
+    assert response.status_code == 201
+
+def test_second_read_is_a_hit_until_a_write(client, auth, subject):
+    add_mark(client, auth, subject, 10)
+    first = client.get('/api/dashboard/charts/performance', headers=auth)
+    second = client.get('/api/dashboard/charts/performance', headers=auth)
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert second.json == first.json
+
+    add_mark(client, auth, subject, 20)
+    third = client.get('/api/dashboard/charts/performance', headers=auth)
+    assert third.headers['X-Cache'] == 'MISS'
+    assert third.json != first.json
+
+def test_entries_are_per_user(client, auth, subject):
+    token = client.post('/api/auth/signup', json={'email': 'other@example.com', 'password': 'secret', 'name': 'Other'}).json['token']
+    other = {'Authorization': 'Bearer ' + token}
+    client.get('/api/dashboard/charts/attendance', headers=auth)
+    assert client.get('/api/dashboard/charts/attendance', headers=other).headers['X-Cache'] == 'MISS'
+    # A write by one user leaves the other's entry alone.
+    client.post('/api/subjects/', json={'name': 'Physics', 'code': 'P1'}, headers=other)
+    assert client.get('/api/dashboard/charts/attendance', headers=auth).headers['X-Cache'] == 'HIT'
+    assert response_cache.stats()['hits'] >= 1
+
+def test_a_response_built_across_a_write_is_not_stored():
+    cache = ResponseCache()
+    generation = cache.generation('u1')
+    cache.invalidate_user('u1')
+    cache.set('key', 'u1', generation, b'stale', 200, 'application/json')
+    assert cache.get('key') is None
+    cache.set('key', 'u1', cache.generation('u1'), b'fresh', 200, 'application/json')
+    assert cache.get('key')['body'] == b'fresh'
+
+def test_size_limits_and_expiry():
+    cache = ResponseCache(max_entries=2, max_bytes=10, ttl=60)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, 'u1', cache.generation('u1'), b'1234', 200, 'application/json')
+    assert cache.get('a') is None and cache.get('c') is not None
+    cache.set('big', 'u1', cache.generation('u1'), b'x' * 11, 200, 'application/json')
+    assert cache.get('big') is None
+    assert cache.stats()['evictions'] == 1
+
+    expired = ResponseCache(ttl=0)
+    expired.set('a', 'u1', expired.generation('u1'), b'1', 200, 'application/json')
+    assert expired.get('a') is None
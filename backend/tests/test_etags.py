@@ -0,0 +1,44 @@
+from app.utils.etags import DataVersions
+
+def get(client, auth, url, etag=None, **headers):
+    if etag is not None:
+        headers['If-None-Match'] = etag
+    return client.get(url, headers=dict(auth, **headers))
+
+def test_unchanged_list_is_304(client, auth, subject):
+    first = get(client, auth, '/api/subjects/')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert 'Accept' in first.headers['Vary']
+    again = get(client, auth, '/api/subjects/', first.headers['ETag'])
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+
+def test_a_write_changes_only_its_collection(client, auth, subject):
+    subjects = get(client, auth, '/api/subjects/').headers['ETag']
+    sessions = get(client, auth, '/api/study/sessions').headers['ETag']
+    client.post('/api/subjects/', json={'name': 'Physics', 'code': 'P1'}, headers=auth)
+    changed = get(client, auth, '/api/subjects/', subjects)
+    assert changed.status_code == 200 and len(changed.json) == 2
+    assert get(client, auth, '/api/study/sessions', sessions).status_code == 304
+
+def test_tags_depend_on_query_and_accept(client, auth, subject):
+    plain = get(client, auth, '/api/attendance/').headers['ETag']
+    assert get(client, auth, '/api/attendance/?limit=5', plain).status_code == 200
+    streamed = get(client, auth, '/api/attendance/', plain, Accept='application/x-ndjson')
+    assert streamed.status_code == 200
+    assert streamed.headers['ETag'] != plain
+
+def test_tags_are_per_user(client, auth, subject):
+    tag = get(client, auth, '/api/subjects/').headers['ETag']
+    token = client.post('/api/auth/signup', json={'email': 'other@example.com', 'password': 'secret', 'name': 'Other'}).json['token']
+    other = {'Authorization': 'Bearer ' + token}
+    client.post('/api/subjects/', json={'name': 'Physics', 'code': 'P1'}, headers=other)
+    assert get(client, auth, '/api/subjects/', tag).status_code == 304
+
+def test_expiring_tags_stop_matching():
+    assert DataVersions._matches('7-00ab', '7-00ab', 100)
+    assert DataVersions._matches('7-00ab-200', '7-00ab', 100)
+    assert not DataVersions._matches('7-00ab-200', '7-00ab', 200)
+    assert not DataVersions._matches('7-00ab-soon', '7-00ab', 100)
+    assert not DataVersions._matches('8-00ab', '7-00ab', 100)
@@ -0,0 +1,44 @@
+import io
+import zipfile
+
+import pytest
+
+from app.utils import admin
+from app.utils.bulk_export import bulk_exporter
+
+@pytest.fixture
+def admin_auth(client, auth, subject, monkeypatch):
+    monkeypatch.setattr(admin, 'ADMIN_EMAILS', {'student@example.com'})
+    return auth
+
+def test_export_streams_a_zip_and_frees_its_slot(client, admin_auth):
+    response = client.get('/api/export/report-cards', headers=admin_auth)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+    assert any(name.endswith('.pdf') for name in archive.namelist())
+    response.close()
+    assert bulk_exporter.stats()['running'] == 0
+    progress = client.get(f'/api/export/report-cards/{response.headers["X-Export-Id"]}', headers=admin_auth).json
+    assert progress['status'] == 'done'
+
+def test_exports_share_one_pool(client, admin_auth):
+    client.get('/api/export/report-cards', headers=admin_auth).get_data()
+    pool = bulk_exporter._executor
+    client.get('/api/export/report-cards', headers=admin_auth).get_data()
+    assert pool is not None and bulk_exporter._executor is pool
+
+def test_export_is_503_when_all_slots_are_taken(client, admin_auth, monkeypatch):
+    monkeypatch.setattr(bulk_exporter, 'max_running', 1)
+    first = client.get('/api/export/report-cards', headers=admin_auth)
+    assert first.status_code == 200
+    busy = client.get('/api/export/report-cards', headers=admin_auth)
+    assert busy.status_code == 503
+    assert 'error' in busy.json
+    # Closing without reading the stream still gives the slot back.
+    first.close()
+    again = client.get('/api/export/report-cards', headers=admin_auth)
+    assert again.status_code == 200
+    again.close()
+
+def test_export_requires_an_admin(client, auth):
+    assert client.get('/api/export/report-cards', headers=auth).status_code == 403
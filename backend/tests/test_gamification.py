@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+
+from app.models.database import db
+from app.models.gamification import GamificationEngine, extend_streak, earned_badges, level_for
+from app.utils.bulk_export import load_cohort
+
+@pytest.fixture
+def engine(app):
+    # A long interval, so nothing is written until the test flushes.
+    return GamificationEngine(db, flush_interval=3600, max_entries=2)
+
+def new_user(name='Student', xp=0):
+    return db.insert('users', {'email': f'{name}@example.com', 'name': name, 'xp': xp, 'level': 1,
+                               'streak': 0, 'badges': []})
+
+def test_level_streak_and_badges():
+    assert [level_for(xp) for xp in (0, 99, 100, 250)] == [1, 1, 2, 3]
+    state = {}
+    for day in ('2024-01-01', '2024-01-02', '2024-01-02', '2024-01-03'):
+        extend_streak(state, day)
+    assert (state['streak'], state['best_streak'], state['last_active']) == (3, 3, '2024-01-03')
+    extend_streak(state, '2024-01-05')
+    assert (state['streak'], state['best_streak']) == (1, 3)
+    assert earned_badges({'study_sessions': 1, 'xp': 1000, 'badges': ['marks_tracker']}) == \
+        ['marks_tracker', 'first_study_session', 'xp_1000']
+
+def test_awards_are_batched_into_one_increment(engine):
+    user = new_user(xp=5)
+    for _ in range(3):
+        engine.award(user['_id'], xp=40, study_sessions=1)
+    assert db.find_one('gamification', {'user_id': user['_id']}) is None
+    # Unflushed awards already show up in the profile.
+    assert engine.profile(user)['xp'] == 125
+
+    engine.flush()
+    stored = db.find_one('gamification', {'user_id': user['_id']})
+    assert (stored['xp'], stored['study_sessions'], stored['level']) == (125, 3, 2)
+    assert (stored['streak'], stored['last_active']) == (1, date.today().isoformat())
+    assert stored['badges'] == ['first_study_session']
+    assert engine.profile(user) == {'xp': 125, 'level': 2, 'streak': 1, 'badges': ['first_study_session']}
+    assert engine.stats()['flushed_users'] == 1
+
+def test_flushes_from_two_engines_add_up(app, engine):
+    # Two engines stand in for two worker processes sharing the database.
+    other = GamificationEngine(db, flush_interval=3600)
+    user = new_user()
+    engine.award(user['_id'], xp=60, study_sessions=1)
+    other.award(user['_id'], xp=60, marks_added=1)
+    engine.flush()
+    other.flush()
+    stored = db.find_one('gamification', {'user_id': user['_id']})
+    assert (stored['xp'], stored['study_sessions'], stored['marks_added'], stored['level']) == (120, 1, 1, 2)
+    assert stored['badges'] == ['first_study_session']
+    assert stored['streak'] == 1
+    assert engine.profile(user)['xp'] == other.profile(user)['xp'] == 120
+
+def test_state_cache_is_bounded(engine):
+    users = [new_user(f'user{i}') for i in range(4)]
+    for user in users:
+        engine.award(user['_id'], xp=10)
+    engine.flush()
+    for user in users:
+        assert engine.profile(user)['xp'] == 10
+    assert engine.stats()['cached_users'] == 2
+
+def test_deleted_user_drops_pending_awards(engine):
+    user = new_user()
+    engine.award(user['_id'], xp=10)
+    db.delete_cascade('users', {'_id': user['_id']})
+    engine.flush()
+    assert db.find('gamification', {}) == []
+
+def test_bulk_export_reads_xp_from_gamification(engine):
+    user = new_user(xp=5)
+    engine.award(user['_id'], xp=200)
+    engine.flush()
+    assert db.find_one('users', {'_id': user['_id']})['xp'] == 5
+    for cohort in (load_cohort(db), load_cohort(db, [user['_id']])):
+        (report_user, _, _, _), = cohort
+        assert (report_user['xp'], report_user['level']) == (205, 3)
+        assert 'password' not in report_user
@@ -0,0 +1,54 @@
+import operator
+import time
+
+import pytest
+
+from app.utils.jobs import JobQueue, QueueFull
+
+@pytest.fixture
+def queue():
+    # Builtins only, so the spawned workers can unpickle every task.
+    jobs = JobQueue(workers=1, max_pending=2, timeout=30)
+    yield jobs
+    if jobs._executor is not None:
+        jobs._executor.shutdown(cancel_futures=True)
+
+def test_parts_are_combined_and_cached(queue):
+    job = queue.submit('u1', 'sheet', operator.mul, [('a', (2, 3)), ('b', (4, 5))], combine=sum)
+    result = queue.get(job.id, 'u1', wait=30)
+    assert (result['status'], result['result']) == ('done', 26)
+    assert queue.get(job.id, 'u2') is None
+
+    again = queue.submit('u1', 'sheet', operator.mul, [('a', (2, 3)), ('b', (4, 5))], combine=sum)
+    assert queue.get(again.id, 'u1')['result'] == 26
+    stats = queue.stats()
+    assert (stats['tasks_run'], stats['cache_hits'], stats['pending']) == (2, 2, 0)
+
+def test_a_failed_part_fails_the_job(queue):
+    job = queue.submit('u1', 'sheet', int, [(None, ('12',)), (None, ('twelve',))])
+    result = queue.get(job.id, 'u1', wait=30)
+    assert result['status'] == 'failed'
+    assert 'twelve' in result['error']
+
+def test_full_queue_rejects_the_whole_upload(queue):
+    with pytest.raises(QueueFull):
+        queue.submit('u1', 'sheet', operator.mul, [(None, (1, 1))] * 3)
+    assert queue.stats()['rejected'] == 1
+    assert queue.stats()['pending'] == 0
+
+def test_overdue_job_times_out_and_frees_its_slots(queue):
+    warm = queue.submit('u1', 'warm', operator.mul, [(None, (1, 1))])
+    assert queue.get(warm.id, 'u1', wait=30)['status'] == 'done'
+
+    queue.timeout = 0.5
+    stuck = queue.submit('u1', 'stuck', time.sleep, [(None, (2,)), (None, (2,))])
+    result = queue.get(stuck.id, 'u1', wait=5)
+    assert result['status'] == 'timeout'
+    stats = queue.stats()
+    assert (stats['pending'], stats['timed_out'], stats['pools_recycled']) == (0, 1, 1)
+
+    # The worker is still asleep in the old pool; new work goes to a fresh one.
+    queue.timeout = 30
+    job = queue.submit('u1', 'next', operator.mul, [(None, (6, 7))])
+    assert queue.get(job.id, 'u1', wait=30)['result'] == [42]
+    assert queue.get(stuck.id, 'u1')['status'] == 'timeout'
@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from app.routes import ai
+from app.utils.jobs import ocr_jobs
+
+PDF = b'%PDF-1.4 three pages'
+PNG = b'\x89PNG\r\n\x1a\n image'
+
+@pytest.fixture
+def submitted(monkeypatch):
+    # Captures what would be sent to the worker pool instead of running OCR.
+    calls = []
+
+    def submit(user_id, name, fn, parts, combine=None):
+        calls.append(parts)
+        raise ai.QueueFull('captured')
+    monkeypatch.setattr(ocr_jobs, 'submit', submit)
+    return calls
+
+def upload(client, auth, *files):
+    data = {'file': [(io.BytesIO(content), name) for name, content in files]}
+    return client.post('/api/ai/ocr-marks', data=data, headers=auth, content_type='multipart/form-data')
+
+def test_pdf_upload_without_pdf_support_is_415(client, auth, submitted, monkeypatch):
+    monkeypatch.setattr(ai, 'PDF_SUPPORT', False)
+    response = upload(client, auth, ('sheet.pdf', PDF))
+    assert response.status_code == 415
+    assert 'PDF' in response.json['error']
+    assert submitted == []
+
+def test_upload_with_more_pages_than_the_queue_is_413(client, auth, submitted, monkeypatch):
+    monkeypatch.setattr(ai, 'PDF_SUPPORT', True)
+    monkeypatch.setattr(ai, 'pdf_page_count', lambda data: ocr_jobs.max_pending)
+    response = upload(client, auth, ('sheet.pdf', PDF), ('extra.png', PNG))
+    assert response.status_code == 413
+    assert submitted == []
+
+def test_each_pdf_task_carries_only_its_page(client, auth, submitted, monkeypatch):
+    monkeypatch.setattr(ai, 'PDF_SUPPORT', True)
+    monkeypatch.setattr(ai, 'pdf_page_count', lambda data: 3)
+    monkeypatch.setattr(ai, 'split_pdf', lambda data: iter([b'%PDF-page1', b'%PDF-page2', b'%PDF-page3']))
+    response = upload(client, auth, ('sheet.pdf', PDF), ('photo.png', PNG))
+    assert response.status_code == 503
+    (parts,) = submitted
+    assert [args for _, args in parts] == [(b'%PDF-page1',), (b'%PDF-page2',), (b'%PDF-page3',), (PNG,)]
+    assert len({key for key, _ in parts}) == 4
+
+def test_unreadable_pdf_is_400(client, auth, submitted, monkeypatch):
+    def broken(data):
+        raise ValueError('not a PDF')
+    monkeypatch.setattr(ai, 'PDF_SUPPORT', True)
+    monkeypatch.setattr(ai, 'pdf_page_count', broken)
+    response = upload(client, auth, ('sheet.pdf', PDF))
+    assert response.status_code == 400
+    assert submitted == []
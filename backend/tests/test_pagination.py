@@ -0,0 +1,67 @@
+import base64
+import json
+
+import pytest
+
+def cursor(*payload):
+    raw = json.dumps(list(payload) if len(payload) != 1 else payload[0]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+@pytest.fixture
+def sessions(client, auth, subject):
+    rows = [{'subject_id': subject['_id'], 'duration': 10 + i, 'date': f'2024-01-{i % 5 + 1:02d}'} for i in range(12)]
+    response = client.post('/api/study/sessions/bulk', json=rows, headers=auth)
+    assert response.status_code == 201
+    return response.json
+
+def test_pages_follow_the_cursor_without_gaps(client, auth, sessions):
+    seen = []
+    url = '/api/study/sessions?limit=5&sort=-date'
+    while True:
+        response = client.get(url, headers=auth)
+        assert response.status_code == 200
+        assert len(response.json) <= 5
+        seen.extend(doc['_id'] for doc in response.json)
+        next_cursor = response.headers.get('X-Next-Cursor')
+        if not next_cursor:
+            break
+        url = f'/api/study/sessions?limit=5&sort=-date&cursor={next_cursor}'
+    full = client.get('/api/study/sessions?sort=-date', headers=auth).json
+    assert seen == [doc['_id'] for doc in full]
+    assert [doc['date'] for doc in full] == sorted((doc['date'] for doc in full), reverse=True)
+
+def test_projection_returns_only_requested_fields(client, auth, sessions):
+    response = client.get('/api/study/sessions?limit=3&fields=duration', headers=auth)
+    assert response.status_code == 200
+    assert all(set(doc) == {'_id', 'duration'} for doc in response.json)
+
+@pytest.mark.parametrize('value', [
+    cursor('-date', None, 5),
+    cursor('-date', None, None),
+    cursor('-date', ['2024-01-01'], 'x'),
+    cursor('-date', {'a': 1}, 'x'),
+    cursor({'-date': 1, 'b': 2, 'c': 3}),
+    cursor('-date', 'x'),
+    cursor('date', '2024-01-01', 'x'),
+    'not-a-cursor!'
+])
+def test_malformed_cursor_is_400(client, auth, sessions, value):
+    response = client.get(f'/api/study/sessions?limit=5&sort=-date&cursor={value}', headers=auth)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=abc', 'limit=501', 'sort=bad-field', 'fields=a;b',
+                                   'from=yesterday', 'from=2024-01-01&sort=duration'])
+def test_invalid_parameters_are_400(client, auth, sessions, query):
+    assert client.get(f'/api/study/sessions?{query}', headers=auth).status_code == 400
+
+def test_date_range_pages_in_date_order(client, auth, sessions):
+    response = client.get('/api/study/sessions?from=2024-01-02&to=2024-01-04&limit=3', headers=auth)
+    assert response.status_code == 200
+    first = response.json
+    rest = client.get(f'/api/study/sessions?from=2024-01-02&to=2024-01-04&limit=3&cursor={response.headers["X-Next-Cursor"]}',
+                      headers=auth).json
+    dates = [doc['date'] for doc in first + rest]
+    assert dates == sorted(dates)
+    assert set(dates) == {'2024-01-02', '2024-01-03'}
+    assert len(dates) == 5
@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import TimeoutError
+
+import bcrypt
+import pytest
+
+from app.models.database import db
+from app.utils.passwords import HasherBusy, PasswordHasher, hash_rounds, password_hasher
+
+def login(client, password='secret'):
+    return client.post('/api/auth/login', json={'email': 'student@example.com', 'password': password})
+
+def test_login_rehashes_an_old_cost(client, auth):
+    user = db.find_one('users', {'email': 'student@example.com'})
+    old = bcrypt.hashpw(b'secret', bcrypt.gensalt(password_hasher.rounds + 1)).decode('utf-8')
+    db.update('users', {'_id': user['_id']}, {'password': old})
+
+    assert login(client, 'wrong').status_code == 401
+    assert db.find_one('users', {'_id': user['_id']})['password'] == old
+
+    rehashes = password_hasher.stats()['rehashes']
+    assert login(client).status_code == 200
+    stored = db.find_one('users', {'_id': user['_id']})['password']
+    assert hash_rounds(stored) == password_hasher.rounds
+    assert login(client).status_code == 200
+    assert db.find_one('users', {'_id': user['_id']})['password'] == stored
+    assert password_hasher.stats()['rehashes'] == rehashes + 1
+
+def test_full_hasher_is_503(client, auth, monkeypatch):
+    monkeypatch.setattr(password_hasher, 'max_pending', 0)
+    assert login(client).status_code == 503
+    response = client.post('/api/auth/signup', json={'email': 'new@example.com', 'password': 'secret', 'name': 'New'})
+    assert response.status_code == 503
+    assert db.find_one('users', {'email': 'new@example.com'}) is None
+
+def test_a_timed_out_check_holds_its_slot_until_it_finishes():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+    with pytest.raises(TimeoutError):
+        hasher._run(release.wait)
+    with pytest.raises(HasherBusy):
+        hasher.hash('secret')
+    release.set()
+    hasher._pool().shutdown(wait=True)
+    assert hasher.stats()['pending'] == 0
+    assert (hasher.stats()['timeouts'], hasher.stats()['rejected']) == (1, 1)
+
+def test_hash_rounds():
+    assert hash_rounds(bcrypt.hashpw(b'x', bcrypt.gensalt(5)).decode('utf-8')) == 5
+    assert hash_rounds('not-a-hash') is None
@@ -0,0 +1,224 @@
+import pytest
+
+from app.models.json_storage import JSONStorage
+from app.models.sqlite_storage import SQLiteStorage
+
+# Both backends must behave the same behind the Database facade, so every
+# test here runs against each of them.
+
+@pytest.fixture(params=['json', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'json':
+        backend = JSONStorage(str(tmp_path / 'database.json'))
+    else:
+        backend = SQLiteStorage(str(tmp_path / 'database.sqlite3'))
+    yield backend
+    backend.close()
+
+@pytest.fixture
+def events(storage):
+    received = []
+    storage.add_listener(lambda op, collection, old, new: received.append((op, collection, old, new)))
+    return received
+
+def ids(docs):
+    return [doc['_id'] for doc in docs]
+
+def test_find_sorts_mixed_values_like_sqlite(storage):
+    storage.insert_many('marks', [
+        {'_id': 'a', 'user_id': 'u', 'score': 'text'},
+        {'_id': 'b', 'user_id': 'u', 'score': 10},
+        {'_id': 'c', 'user_id': 'u'},
+        {'_id': 'd', 'user_id': 'u', 'score': 2.5},
+        {'_id': 'e', 'user_id': 'u', 'score': None},
+        {'_id': 'f', 'user_id': 'u', 'score': 10}
+    ])
+    assert ids(storage.find('marks', {'user_id': 'u'}, sort='score')) == ['c', 'e', 'd', 'b', 'f', 'a']
+    assert ids(storage.find('marks', {'user_id': 'u'}, sort='-score')) == ['a', 'f', 'b', 'd', 'e', 'c']
+
+def test_find_after_pages_through_every_document_once(storage):
+    storage.insert_many('marks', [{'_id': f'm{i:02d}', 'user_id': 'u', 'score': i % 4 if i % 5 else None}
+                                  for i in range(20)])
+    expected = ids(storage.find('marks', {'user_id': 'u'}, sort='-score'))
+    seen = []
+    after = None
+    while True:
+        page = storage.find('marks', {'user_id': 'u'}, sort='-score', limit=3, after=after)
+        if not page:
+            break
+        seen.extend(ids(page))
+        after = (page[-1].get('score'), page[-1]['_id'])
+    assert seen == expected
+    assert len(set(seen)) == 20
+
+def test_find_projection_keeps_id(storage):
+    storage.insert('marks', {'_id': 'a', 'user_id': 'u', 'score': 1, 'note': 'x'})
+    assert storage.find('marks', {'user_id': 'u'}, projection=['score']) == [{'_id': 'a', 'score': 1}]
+
+def test_find_range_bounds_and_missing_field(storage):
+    storage.insert_many('attendance', [
+        {'_id': 'a', 'user_id': 'u', 'date': '2024-01-03'},
+        {'_id': 'b', 'user_id': 'u', 'date': '2024-01-01'},
+        {'_id': 'c', 'user_id': 'u', 'date': '2024-01-05'},
+        {'_id': 'd', 'user_id': 'u'},
+        {'_id': 'e', 'user_id': 'u', 'date': None},
+        {'_id': 'f', 'user_id': 'v', 'date': '2024-01-02'},
+        {'_id': 'g', 'user_id': 'u', 'date': '2024-01-03'}
+    ])
+    assert ids(storage.find_range('attendance', {'user_id': 'u'}, 'date')) == ['b', 'a', 'g', 'c']
+    assert ids(storage.find_range('attendance', {'user_id': 'u'}, 'date', '2024-01-02', '2024-01-05')) == ['a', 'g']
+    assert ids(storage.find_range('attendance', {'user_id': 'u'}, 'date', start='2024-01-03')) == ['a', 'g', 'c']
+    assert ids(storage.find_range('attendance', {'user_id': 'u'}, 'date', end='2024-01-03')) == ['b']
+
+def test_find_range_pages_with_after(storage):
+    storage.insert_many('study_sessions', [{'_id': f's{i:02d}', 'user_id': 'u', 'date': f'2024-01-{i % 7 + 1:02d}'}
+                                           for i in range(15)])
+    expected = ids(storage.find_range('study_sessions', {'user_id': 'u'}, 'date', '2024-01-02'))
+    seen = []
+    after = None
+    while True:
+        page = storage.find_range('study_sessions', {'user_id': 'u'}, 'date', '2024-01-02', limit=4, after=after)
+        if not page:
+            break
+        seen.extend(ids(page))
+        after = (page[-1]['date'], page[-1]['_id'])
+    assert seen == expected
+    assert len(seen) == 12
+
+def test_find_range_without_sorted_index_matches(storage):
+    storage.insert_many('marks', [
+        {'_id': 'a', 'user_id': 'u', 'score': 5},
+        {'_id': 'b', 'user_id': 'u', 'score': 1},
+        {'_id': 'c', 'user_id': 'u', 'score': 9}
+    ])
+    assert ids(storage.find_range('marks', {'user_id': 'u'}, 'score', 1, 9)) == ['b', 'a']
+
+def test_upsert_many_inserts_and_updates(storage):
+    storage.insert('attendance', {'_id': 'a', 'user_id': 'u', 'date': '2024-01-01', 'status': 'present'})
+    inserted, updated = storage.upsert_many('attendance', [
+        {'user_id': 'u', 'date': '2024-01-01', 'status': 'absent'},
+        {'user_id': 'u', 'date': '2024-01-02', 'status': 'present'},
+        {'user_id': 'u', 'date': '2024-01-02', 'status': 'late'}
+    ], key=('user_id', 'date'))
+    assert [doc['date'] for doc in inserted] == ['2024-01-02']
+    assert inserted[0]['status'] == 'late'
+    assert ids(updated) == ['a']
+    assert updated[0]['status'] == 'absent'
+    stored = storage.find('attendance', {'user_id': 'u'})
+    assert [(doc['date'], doc['status']) for doc in stored] == [('2024-01-01', 'absent'), ('2024-01-02', 'late')]
+
+def test_upsert_many_keeps_document_order(storage):
+    storage.insert_many('attendance', [{'_id': f'a{i}', 'user_id': 'u', 'date': f'2024-01-0{i}'} for i in range(1, 5)])
+    storage.upsert_many('attendance', [{'user_id': 'u', 'date': '2024-01-02', 'status': 'absent'}],
+                        key=('user_id', 'date'))
+    assert ids(storage.find('attendance', {'user_id': 'u'})) == ['a1', 'a2', 'a3', 'a4']
+
+def test_delete_cascade_counts(storage):
+    storage.insert('users', {'_id': 'u1', 'email': 'a@example.com'})
+    storage.insert('users', {'_id': 'u2', 'email': 'b@example.com'})
+    storage.insert_many('subjects', [{'_id': 's1', 'user_id': 'u1'}, {'_id': 's2', 'user_id': 'u2'}])
+    storage.insert_many('marks', [{'_id': 'm1', 'user_id': 'u1', 'subject_id': 's1'},
+                                  {'_id': 'm2', 'user_id': 'u1', 'subject_id': 's1'},
+                                  {'_id': 'm3', 'user_id': 'u2', 'subject_id': 's2'}])
+    storage.insert('attendance', {'_id': 'a1', 'user_id': 'u1', 'subject_id': 's1', 'date': '2024-01-01'})
+
+    assert storage.delete_cascade('subjects', {'_id': 's2'}) == {'subjects': 1, 'marks': 1}
+    assert storage.delete_cascade('users', {'_id': 'u1'}) == {'users': 1, 'subjects': 1, 'marks': 2, 'attendance': 1}
+    assert storage.delete_cascade('users', {'_id': 'missing'}) == {}
+    assert ids(storage.get_all('users')) == ['u2']
+    assert storage.get_all('marks') == []
+    assert storage.find_range('attendance', {'user_id': 'u1'}, 'date') == []
+
+def test_listeners_see_each_change(storage, events):
+    doc = storage.insert('marks', {'_id': 'a', 'user_id': 'u', 'score': 1})
+    storage.update('marks', {'_id': 'a'}, {'score': 2})
+    storage.delete('marks', {'_id': 'a'})
+
+    assert [(op, collection) for op, collection, _, _ in events] == [
+        ('insert', 'marks'), ('update', 'marks'), ('delete', 'marks')]
+    _, _, old, new = events[0]
+    assert old == [] and ids(new) == ['a']
+    _, _, old, new = events[1]
+    assert [d['score'] for d in old] == [1] and [d['score'] for d in new] == [2]
+    _, _, old, new = events[2]
+    assert ids(old) == ['a'] and new == []
+    assert doc['_id'] == 'a'
+
+def test_listeners_get_one_event_per_batch(storage, events):
+    storage.insert('attendance', {'user_id': 'u', 'date': '2024-01-01'})
+    del events[:]
+    storage.upsert_many('attendance', [{'user_id': 'u', 'date': '2024-01-01', 'status': 'absent'},
+                                       {'user_id': 'u', 'date': '2024-01-02'},
+                                       {'user_id': 'u', 'date': '2024-01-03'}], key=('user_id', 'date'))
+    assert sorted((op, len(old), len(new)) for op, _, old, new in events) == [('insert', 0, 2), ('update', 1, 1)]
+
+def test_listeners_see_cascade_deletes(storage, events):
+    storage.insert('subjects', {'_id': 's1', 'user_id': 'u'})
+    storage.insert_many('marks', [{'user_id': 'u', 'subject_id': 's1'}, {'user_id': 'u', 'subject_id': 's1'}])
+    del events[:]
+    storage.delete_cascade('subjects', {'_id': 's1'})
+    deleted = {collection: len(old) for op, collection, old, new in events if op == 'delete'}
+    assert deleted == {'subjects': 1, 'marks': 2}
+
+def test_listeners_run_after_the_write_is_visible(storage):
+    seen = []
+    storage.add_listener(lambda op, collection, old, new: seen.append(
+        (op, ids(storage.find(collection, {'user_id': 'u'})), storage.version())))
+    before = storage.version()
+    storage.insert('marks', {'_id': 'a', 'user_id': 'u'})
+    assert seen[0][:2] == ('insert', ['a'])
+    assert seen[0][2] != before
+    assert seen[0][2] == storage.version()
+
+def test_failed_listener_does_not_break_writes(storage, events):
+    def broken(op, collection, old, new):
+        raise RuntimeError('listener failed')
+    storage.add_listener(broken)
+    storage.insert('marks', {'_id': 'a', 'user_id': 'u'})
+    assert ids(storage.find('marks', {'user_id': 'u'})) == ['a']
+    assert len(events) == 1
+
+@pytest.mark.parametrize('sort', ['score', '-score', 'created_at'])
+def test_iter_find_reads_in_pages_and_matches_find(storage, sort):
+    storage.fetch_size = 3
+    storage.insert_many('marks', [{'_id': f'm{i:02d}', 'user_id': 'u', 'score': i % 4 if i % 5 else None}
+                                  for i in range(20)])
+    expected = storage.find('marks', {'user_id': 'u'}, sort=sort, projection=['score'])
+    assert list(storage.iter_find('marks', {'user_id': 'u'}, sort=sort, projection=['score'])) == expected
+    assert list(storage.iter_find('marks', {'user_id': 'u'}, sort=sort, limit=7)) == \
+        storage.find('marks', {'user_id': 'u'}, sort=sort, limit=7)
+
+def test_iter_find_range_reads_in_pages_and_matches_find_range(storage):
+    storage.fetch_size = 4
+    storage.insert_many('study_sessions', [{'_id': f's{i:02d}', 'user_id': 'u', 'date': f'2024-01-{i % 9 + 1:02d}'}
+                                           for i in range(30)])
+    expected = storage.find_range('study_sessions', {'user_id': 'u'}, 'date', '2024-01-02', '2024-01-08')
+    assert list(storage.iter_find_range('study_sessions', {'user_id': 'u'}, 'date', '2024-01-02', '2024-01-08')) == expected
+    assert list(storage.iter_find_range('study_sessions', {'user_id': 'u'}, 'date', limit=5)) == \
+        storage.find_range('study_sessions', {'user_id': 'u'}, 'date', limit=5)
+
+def test_iter_find_range_survives_writes_between_pages(storage):
+    storage.fetch_size = 2
+    storage.insert_many('attendance', [{'_id': f'a{i}', 'user_id': 'u', 'date': f'2024-01-0{i}'} for i in range(1, 7)])
+    docs = storage.iter_find_range('attendance', {'user_id': 'u'}, 'date')
+    first = [next(docs)['_id'] for _ in range(2)]
+    storage.insert('attendance', {'_id': 'new', 'user_id': 'u', 'date': '2024-01-01'})
+    storage.delete('attendance', {'_id': 'a5'})
+    rest = [doc['_id'] for doc in docs]
+    assert first == ['a1', 'a2']
+    # Whether later writes show up depends on the engine (SQLite keeps its
+    # snapshot), but every original document is read exactly once.
+    assert 'new' not in rest
+    assert [doc_id for doc_id in rest if doc_id != 'a5'] == ['a3', 'a4', 'a6']
+
+def test_increment_inserts_then_adds_and_derives_in_the_same_write(storage, events):
+    derive = lambda doc: {'level': doc['xp'] // 100 + 1}
+    first = storage.increment('gamification', {'user_id': 'u'}, {'xp': 150}, {'user_id': 'u', 'xp': 5}, derive)
+    assert (first['xp'], first['level']) == (155, 2)
+    second = storage.increment('gamification', {'user_id': 'u'}, {'xp': 50, 'sessions': 1}, derive=derive)
+    assert (second['xp'], second['sessions'], second['level']) == (205, 1, 3)
+    assert storage.increment('gamification', {'user_id': 'missing'}, {'xp': 1}) is None
+    assert [op for op, _, _, _ in events] == ['insert', 'update']
+    assert events[1][3][0]['level'] == 3
+    (stored,) = storage.find('gamification', {'user_id': 'u'})
+    assert (stored['xp'], stored['level']) == (205, 3)
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from app.models.database import db
+
+@pytest.fixture
+def attendance(client, auth, subject):
+    rows = [{'subject_id': subject['_id'], 'date': f'2024-02-{day:02d}', 'status': 'present' if day % 3 else 'absent'}
+            for day in range(1, 21)]
+    response = client.post('/api/attendance/bulk', json=rows, headers=auth)
+    assert response.status_code == 201
+    return response.json
+
+@pytest.fixture
+def small_pages(app):
+    # Forces several storage pages per response.
+    db.backend.fetch_size = 3
+
+def test_stream_json_matches_the_listing(client, auth, attendance, small_pages):
+    response = client.get('/api/attendance/?stream=json', headers=auth)
+    assert response.is_streamed
+    assert response.mimetype == 'application/json'
+    listed = client.get('/api/attendance/?sort=created_at&limit=500', headers=auth).json
+    assert response.json == listed
+
+def test_stream_ndjson_with_sort_and_fields(client, auth, attendance, small_pages):
+    response = client.get('/api/attendance/?sort=-date&fields=date,status', headers=dict(auth, Accept='application/x-ndjson'))
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [doc['date'] for doc in lines] == [f'2024-02-{day:02d}' for day in range(20, 0, -1)]
+    assert all(set(doc) == {'_id', 'date', 'status'} for doc in lines)
+
+def test_stream_date_range(client, auth, attendance, small_pages):
+    response = client.get('/api/attendance/?stream=ndjson&from=2024-02-05&to=2024-02-15', headers=auth)
+    dates = [json.loads(line)['date'] for line in response.get_data(as_text=True).splitlines()]
+    assert dates == [f'2024-02-{day:02d}' for day in range(5, 15)]
+
+def test_empty_stream(client, auth):
+    assert client.get('/api/study/sessions?stream=1', headers=auth).get_data() == b'[]\n'
+    assert client.get('/api/study/sessions?stream=ndjson', headers=auth).get_data() == b''
+
+@pytest.mark.parametrize('query', ['stream=1&limit=3', 'stream=1&cursor=abc', 'stream=xml', 'stream=1&from=2024-01-01&sort=status'])
+def test_invalid_stream_requests_are_400(client, auth, query):
+    assert client.get(f'/api/attendance/?{query}', headers=auth).status_code == 400
@@ -0,0 +1,27 @@
+from app.models.database import db
+
+def test_delete_subject_removes_its_dependents(client, auth, subject):
+    other = client.post('/api/subjects/', json={'name': 'Physics', 'code': 'P1'}, headers=auth).json
+    for subject_id in (subject['_id'], other['_id']):
+        client.post(f'/api/subjects/{subject_id}/marks/bulk',
+                    json=[{'marks_obtained': 5, 'total_marks': 10}, {'marks_obtained': 8, 'total_marks': 10}], headers=auth)
+        client.post('/api/attendance/bulk', json=[{'subject_id': subject_id, 'date': '2024-01-01', 'status': 'present'}],
+                    headers=auth)
+        client.post('/api/study/sessions/bulk', json=[{'subject_id': subject_id, 'duration': 25}], headers=auth)
+    client.post('/api/assignments/', json={'subject_id': subject['_id'], 'title': 'Essay', 'deadline': '2030-01-01T00:00:00'},
+                headers=auth)
+
+    response = client.delete(f'/api/subjects/{subject["_id"]}', headers=auth)
+    assert response.status_code == 200
+    assert response.json['deleted'] == {'subjects': 1, 'marks': 2, 'attendance': 1, 'assignments': 1, 'study_sessions': 1}
+    for collection in ('marks', 'attendance', 'assignments', 'study_sessions'):
+        assert db.find(collection, {'subject_id': subject['_id']}) == []
+    assert len(db.find('marks', {'subject_id': other['_id']})) == 2
+    assert [doc['_id'] for doc in client.get('/api/subjects/', headers=auth).json] == [other['_id']]
+
+def test_delete_unknown_or_foreign_subject_is_404(client, auth, subject):
+    token = client.post('/api/auth/signup', json={'email': 'other@example.com', 'password': 'secret', 'name': 'Other'}).json['token']
+    other = {'Authorization': 'Bearer ' + token}
+    assert client.delete(f'/api/subjects/{subject["_id"]}', headers=other).status_code == 404
+    assert client.delete('/api/subjects/missing', headers=auth).status_code == 404
+    assert db.find_one('subjects', {'_id': subject['_id']}) is not None
@@ -46,15 +46,11 @@ const Dashboard = () => {
 
   const fetchDashboardData = async () => {
     try {
-      const [statsRes, perfRes, attRes] = await Promise.all([
-        api.get('/dashboard/stats'),
-        api.get('/dashboard/charts/performance'),
-        api.get('/dashboard/charts/attendance')
-      ])
+      const response = await api.get('/dashboard/summary')
 
-      setStats(statsRes.data)
-      setPerformanceData(perfRes.data)
-      setAttendanceData(attRes.data)
+      setStats(response.data.stats)
+      setPerformanceData(response.data.performance)
+      setAttendanceData(response.data.attendance)
     } catch (error) {
       console.error('Error fetching dashboard data:', error)
     } finally {